@@ -58,7 +58,7 @@ from tastypie.constants import ALL, ALL_WITH_RELATIONS
 from tastypie.utils import trailing_slash
 
 from geonode.utils import check_ogc_backend
-from geonode.security.utils import get_visible_resources
+from geonode.security.utils import get_visible_resources, get_resources_counts
 
 FILTER_TYPES = {
     'dataset': Dataset,
@@ -71,7 +71,7 @@ FILTER_TYPES = {
 class CountJSONSerializer(Serializer):
     """Custom serializer to post process the api and add counts"""
 
-    def get_resources_counts(self, options):
+    def get_resources_counts(self, options, values=None):
         if settings.SKIP_PERMS_FILTER:
             resources = ResourceBase.objects.all()
         else:
@@ -87,42 +87,37 @@ class CountJSONSerializer(Serializer):
             unpublished_not_visible=settings.RESOURCE_PUBLISHING,
             private_groups_not_visibile=settings.GROUP_PRIVATE_RESOURCES)
 
-        subtypes = []
-        if resources and resources.count() > 0:
-            if options['title_filter']:
-                resources = resources.filter(title__icontains=options['title_filter'])
-            if options['type_filter']:
-                _type_filter = options['type_filter']
-
-                for label, app in apps.app_configs.items():
-                    if hasattr(app, 'type') and app.type == 'GEONODE_APP':
-                        if hasattr(app, 'default_model'):
-                            _model = apps.get_model(label, app.default_model)
-                            if issubclass(_model, _type_filter):
-                                subtypes.append(
-                                    resources.filter(
-                                        polymorphic_ctype__model=_model.__name__.lower()))
-
+        if options['title_filter']:
+            resources = resources.filter(title__icontains=options['title_filter'])
+        if options['type_filter']:
+            _type_filter = options['type_filter']
+
+            subtypes = []
+            for label, app in apps.app_configs.items():
+                if hasattr(app, 'type') and app.type == 'GEONODE_APP':
+                    if hasattr(app, 'default_model'):
+                        _model = apps.get_model(label, app.default_model)
+                        if issubclass(_model, _type_filter):
+                            subtypes.append(_model.__name__.lower())
+
+            if subtypes:
+                resources = resources.filter(polymorphic_ctype__model__in=subtypes)
+            else:
                 if not isinstance(_type_filter, str):
                     _type_filter = _type_filter.__name__.lower()
                 resources = resources.filter(polymorphic_ctype__model=_type_filter)
 
-        counts = list()
-        if subtypes:
-            for subtype in subtypes:
-                counts.extend(
-                    list(subtype.values(options['count_type']).annotate(count=Count(options['count_type'])))
-                )
-        else:
-            counts = list(resources.values(options['count_type']).annotate(count=Count(options['count_type'])))
-
-        return {
-            c[options['count_type']]: c['count'] for c in counts if c and c['count'] and options['count_type']}
+        if not options['count_type']:
+            return {}
+        return get_resources_counts(resources, options['count_type'], values=values, user=options['user'])
 
     def to_json(self, data, options=None):
         options = options or {}
         data = self.to_simple(data, options)
-        counts = self.get_resources_counts(options)
+        values = None
+        if 'objects' in data:
+            values = [item['id'] for item in data['objects'] if item.get('id') is not None]
+        counts = self.get_resources_counts(options, values=values)
         if 'objects' in data:
             for item in data['objects']:
                 item['count'] = counts.get(item['id'], 0)
@@ -20,6 +20,7 @@ import json
 from urllib.parse import urljoin
 
 from django.conf import settings
+from django.db.models import Manager
 from django.contrib.auth.models import Group
 from django.forms.models import model_to_dict
 from django.contrib.auth import get_user_model
@@ -50,13 +51,27 @@ from geonode.groups.models import (
     GroupProfile)
 
 from geonode.utils import build_absolute_uri
-from geonode.security.utils import get_resources_with_perms
+from geonode.security.models import get_user_perms_for
+from geonode.security.utils import get_resources_with_perms, get_resources_counts
 
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+def get_serialized_page(serializer, instance, model=None):
+    """
+    Returns the instances serialized along with the given one, e.g. the current page of results
+    """
+    page = getattr(serializer.parent, 'instance', None) if isinstance(serializer.parent, serializers.ListSerializer) else None
+    if isinstance(page, Manager):
+        page = page.all()
+    if page is None or isinstance(page, dict):
+        return [instance]
+    page = [_i for _i in page if isinstance(_i, model or instance.__class__)]
+    return page if instance in page else [instance]
+
+
 class BaseDynamicModelSerializer(DynamicModelSerializer):
 
     def to_representation(self, instance):
@@ -74,34 +89,55 @@ class BaseDynamicModelSerializer(DynamicModelSerializer):
 
 class ResourceBaseToRepresentationSerializerMixin(DynamicModelSerializer):
 
+    LINK_TYPES = ['OGC:WMS', 'OGC:WFS', 'OGC:WCS', 'image']
+    LINK_FIELDS = [
+        'extension',
+        'link_type',
+        'name',
+        'mime',
+        'url'
+    ]
+
+    def _prefetch(self, instances, request):
+        """
+        Loads the permissions, favorites and links of many resources with a fixed number of queries.
+
+        :return: {resource pk: {'perms': set, 'favorite': bool, 'links': list}}
+        """
+        pks = [_i.pk for _i in instances]
+        prefetched = {_pk: {'links': []} for _pk in pks}
+        if request:
+            for _pk, _perms in get_user_perms_for(request.user, instances).items():
+                prefetched[_pk]['perms'] = _perms
+            if not request.user.is_anonymous and getattr(settings, "FAVORITE_ENABLED", False):
+                favorites = set(Favorite.objects.filter(user=request.user, object_id__in=pks).values_list('object_id', flat=True))
+                for _pk in pks:
+                    prefetched[_pk]['favorite'] = _pk in favorites
+        for lnk in Link.objects.filter(resource_id__in=pks, link_type__in=self.LINK_TYPES):
+            prefetched[lnk.resource_id]['links'].append(model_to_dict(lnk, fields=self.LINK_FIELDS))
+        return prefetched
+
+    def _get_prefetched(self, instance, request):
+        # the prefetched data are shared by all the serializers of the page through the context
+        prefetched = self.context.setdefault('resources_prefetched', {}) if isinstance(self.context, dict) else {}
+        if instance.pk not in prefetched:
+            prefetched.update(self._prefetch(get_serialized_page(self, instance, ResourceBase), request))
+        return prefetched[instance.pk]
+
     def to_representation(self, instance):
         request = self.context.get('request')
         data = super(ResourceBaseToRepresentationSerializerMixin, self).to_representation(instance)
+        prefetched = self._get_prefetched(instance, request)
         if request:
-            data['perms'] = instance.get_user_perms(request.user).union(
-                instance.get_self_resource().get_user_perms(request.user)
-            )
-            if not request.user.is_anonymous and getattr(settings, "FAVORITE_ENABLED", False):
-                favorite = Favorite.objects.filter(user=request.user, object_id=instance.pk).count()
-                data['favorite'] = favorite > 0
+            data['perms'] = set(prefetched['perms'])
+            if 'favorite' in prefetched:
+                data['favorite'] = prefetched['favorite']
         # Adding links to resource_base api
         obj_id = data.get('pk', None)
         if obj_id:
-            dehydrated = []
-            link_fields = [
-                'extension',
-                'link_type',
-                'name',
-                'mime',
-                'url'
-            ]
-
-            links = Link.objects.filter(resource_id=int(obj_id), link_type__in=['OGC:WMS', 'OGC:WFS', 'OGC:WCS', 'image'])
-            for lnk in links:
-                formatted_link = model_to_dict(lnk, fields=link_fields)
-                dehydrated.append(formatted_link)
+            dehydrated = prefetched['links']
             if len(dehydrated) > 0:
-                data['links'] = dehydrated
+                data['links'] = list(dehydrated)
         return data
 
 
@@ -457,9 +493,15 @@ class BaseResourceCountSerializer(BaseDynamicModelSerializer):
                 'title_filter': request.query_params.get('title__icontains')
             }
         data = super().to_representation(instance)
-        count_filter = {self.Meta.count_type: instance}
-        data['count'] = get_resources_with_perms(
-            request.user, filter_options).filter(**count_filter).count()
+        # the counts are computed at once for all the items of the page
+        counts = self.context.setdefault('resources_counts', {}) if isinstance(self.context, dict) else {}
+        if (self.Meta.count_type, instance.pk) not in counts:
+            values = [_i.pk for _i in get_serialized_page(self, instance, self.Meta.model)]
+            _counts = get_resources_counts(
+                get_resources_with_perms(request.user, filter_options), self.Meta.count_type,
+                values=values, user=request.user)
+            counts.update({(self.Meta.count_type, _v): _counts.get(_v, 0) for _v in values})
+        data['count'] = counts[(self.Meta.count_type, instance.pk)]
         return data
 
 
@@ -27,8 +27,11 @@ from uuid import uuid1, uuid4
 from unittest.mock import patch
 from urllib.parse import urljoin
 
+from django.db import connection
 from django.urls import reverse
 from django.core.files import File
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import Group
 from django.contrib.auth import get_user_model
 
@@ -42,6 +45,7 @@ from geonode.thumbs.exceptions import ThumbnailError
 from geonode.base.models import (
     CuratedThumbnail,
     HierarchicalKeyword,
+    Link,
     Region,
     ResourceBase,
     TopicCategory,
@@ -965,6 +969,12 @@ class BaseApiTests(APITestCase):
             }
         )
 
+        # counts of the resources visible to anonymous users
+        r_type_counts = {r_type['name']: r_type['count'] for r_type in r_types}
+        resources = get_resources_with_perms(get_anonymous_user())
+        for r_type_name in ('dataset', 'map', 'document',):
+            self.assertEqual(r_type_counts[r_type_name], resources.filter(resource_type=r_type_name).count())
+
     def test_get_favorites(self):
         """
         Ensure we get user's favorite resources.
@@ -1047,6 +1057,56 @@ class BaseApiTests(APITestCase):
         self.assertEqual(response.data['total'], 1)
         self.assertEqual(len(response.data['resources']), 1)
 
+    @override_settings(FAVORITE_ENABLED=True)
+    def test_resources_list_prefetched_data(self):
+        """
+        Ensure perms, favorites and links of a page of resources are the same returned for each single resource.
+        """
+        url = reverse('base-resources-list')
+        admin = get_user_model().objects.get(username='admin')
+        dataset = Dataset.objects.first()
+        Favorite.objects.create_favorite(dataset, admin)
+        Link.objects.create(resource=dataset, link_type='OGC:WMS', name='test', mime='image/png',
+                            extension='png', url='http://localhost/wms')
+
+        self.assertTrue(self.client.login(username='admin', password='admin'))
+        response = self.client.get(f"{url}?page_size=26", format='json')
+        self.assertEqual(response.status_code, 200)
+        resources = response.data['resources']
+        self.assertEqual(len(resources), 26)
+        for resource in resources:
+            detail = self.client.get(reverse('base-resources-detail', kwargs={'pk': resource['pk']}), format='json')
+            self.assertEqual(detail.status_code, 200)
+            detail = detail.data['resource']
+            self.assertSetEqual(set(resource['perms']), set(detail['perms']))
+            self.assertEqual(resource['favorite'], detail['favorite'])
+            self.assertEqual(resource.get('links'), detail.get('links'))
+            self.assertEqual(resource['favorite'], int(resource['pk']) == dataset.pk)
+
+    @override_settings(FAVORITE_ENABLED=True)
+    def test_resources_list_queries_do_not_grow_with_page_size(self):
+        """
+        Ensure the perms, favorites and links of a page of resources are fetched with a fixed number of queries.
+        """
+        url = reverse('base-resources-list')
+        bobby = get_user_model().objects.get(username='bobby')
+        for resource in ResourceBase.objects.all()[:5]:
+            Favorite.objects.create_favorite(resource, bobby)
+
+        self.assertTrue(self.client.login(username='bobby', password='bob'))
+        # warm up the caches filled by the first request
+        self.assertEqual(self.client.get(f"{url}?page_size=10", format='json').status_code, 200)
+
+        queries = {}
+        for page_size in (10, 20):
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(f"{url}?page_size={page_size}", format='json')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['resources']), page_size)
+            queries[page_size] = len(context.captured_queries)
+        # any query per row would add at least 10 queries to the larger page
+        self.assertLess(queries[20], queries[10] + 10, msg=f"Queries per page size: {queries}")
+
     @patch('PIL.Image.open', return_value=test_image)
     def test_thumbnail_urls(self, img):
         """
@@ -1164,6 +1224,13 @@ class BaseApiTests(APITestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.data['total'], 1)
 
+        # Categories counts
+        response = self.client.get(f"{url}?page_size=100", format='json')
+        self.assertEqual(response.status_code, 200)
+        resources = get_resources_with_perms(get_user_model().objects.get(username='bobby'))
+        for category in response.data['categories']:
+            self.assertEqual(category['count'], resources.filter(category__id=category['id']).count())
+
     def test_regions_list(self):
         """
         Ensure we can access the list of regions.
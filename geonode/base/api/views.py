@@ -20,9 +20,9 @@ import ast
 import json
 
 from uuid import uuid1
+from functools import lru_cache
 from urllib.parse import urljoin
 
-from django.apps import apps
 from django.urls import reverse
 from django.conf import settings
 from django.db.models import Subquery
@@ -59,6 +59,7 @@ from geonode.security.permissions import (
     get_compact_perms_list)
 from geonode.security.utils import (
     get_visible_resources,
+    get_resources_counts,
     get_resources_with_perms,
     get_user_visible_groups)
 
@@ -93,6 +94,71 @@ import logging
 logger = logging.getLogger(__name__)
 
 
+def _to_compact_perms_list(allowed_perms: dict, resource_type: str, resource_subtype: str) -> dict:
+    _compact_perms_list = {}
+    for _k, _v in allowed_perms.items():
+        _is_owner = _k not in ["anonymous", groups_settings.REGISTERED_MEMBERS_GROUP_NAME]
+        _is_none_allowed = not _is_owner
+        _compact_perms_list[_k] = get_compact_perms_list(_v, resource_type, resource_subtype, _is_owner, _is_none_allowed)
+    return _compact_perms_list
+
+
+@lru_cache()
+def _get_static_resource_types_info() -> tuple:
+    """
+    Returns the resource types and their allowed perms which don't depend on the stored resources,
+    and whether the GeoApps types have to be added; computed only once per process.
+    """
+    _types = []
+    _allowed_perms = {}
+    for _m in ResourceBase.__subclasses__():
+        if _m.__name__.lower() not in ['service']:
+            _types.append(_m.__name__.lower())
+            _allowed_perms[_m.__name__.lower()] = {
+                "perms": _m.allowed_permissions,
+                "compact": _to_compact_perms_list(_m.allowed_permissions, _m.__name__.lower(), _m.__name__.lower())
+            }
+
+    _geoapps = settings.GEONODE_APPS_ENABLE and 'geoapp' in _types
+    if _geoapps:
+        _types.remove('geoapp')
+        if hasattr(settings, 'CLIENT_APP_LIST') and settings.CLIENT_APP_LIST:
+            _types += settings.CLIENT_APP_LIST
+
+        if hasattr(settings, 'CLIENT_APP_ALLOWED_PERMS') and settings.CLIENT_APP_ALLOWED_PERMS:
+            for _type in settings.CLIENT_APP_ALLOWED_PERMS:
+                for _type_name, _type_perms in _type.items():
+                    _allowed_perms[_type_name] = {
+                        "perms": _type_perms,
+                        "compact": _to_compact_perms_list(_type_perms, _type_name, _type_name)
+                    }
+    return tuple(_types), _allowed_perms, _geoapps
+
+
+def get_resource_types_info() -> tuple:
+    """
+    Returns the list of the resource types names, and their allowed perms.
+
+    Only the GeoApps types not configured through 'CLIENT_APP_LIST' and 'CLIENT_APP_ALLOWED_PERMS'
+    are looked up from the stored GeoApps.
+    """
+    _static_types, _static_allowed_perms, _geoapps = _get_static_resource_types_info()
+    _types = list(_static_types)
+    _allowed_perms = dict(_static_allowed_perms)
+    if _geoapps:
+        from geonode.geoapps.models import GeoApp
+        if not (hasattr(settings, 'CLIENT_APP_LIST') and settings.CLIENT_APP_LIST):
+            _types += [x for x in GeoApp.objects.values_list('resource_type', flat=True).all().distinct()]
+        if not (hasattr(settings, 'CLIENT_APP_ALLOWED_PERMS') and settings.CLIENT_APP_ALLOWED_PERMS):
+            for _m in GeoApp.objects.filter(resource_type__in=_types).iterator():
+                if hasattr(_m, 'resource_type') and _m.resource_type and _m.resource_type not in _allowed_perms:
+                    _allowed_perms[_m.resource_type] = {
+                        "perms": _m.allowed_permissions,
+                        "compact": _to_compact_perms_list(_m.allowed_permissions, _m.resource_type, _m.subtype)
+                    }
+    return _types, _allowed_perms
+
+
 class UserViewSet(DynamicModelViewSet):
     """
     API endpoint that allows users to be viewed or edited.
@@ -373,57 +439,15 @@ class ResourceBaseViewSet(DynamicModelViewSet):
         """)
     @action(detail=False, methods=['get'])
     def resource_types(self, request):
-
-        def _to_compact_perms_list(allowed_perms: dict, resource_type: str, resource_subtype: str) -> list:
-            _compact_perms_list = {}
-            for _k, _v in allowed_perms.items():
-                _is_owner = _k not in ["anonymous", groups_settings.REGISTERED_MEMBERS_GROUP_NAME]
-                _is_none_allowed = not _is_owner
-                _compact_perms_list[_k] = get_compact_perms_list(_v, resource_type, resource_subtype, _is_owner, _is_none_allowed)
-            return _compact_perms_list
+        _types, _allowed_perms = get_resource_types_info()
+        _counts = get_resources_counts(
+            get_resources_with_perms(request.user), 'resource_type', values=_types, user=request.user)
 
         resource_types = []
-        _types = []
-        _allowed_perms = {}
-        for _model in apps.get_models():
-            if _model.__name__ == "ResourceBase":
-                for _m in _model.__subclasses__():
-                    if _m.__name__.lower() not in ['service']:
-                        _types.append(_m.__name__.lower())
-                        _allowed_perms[_m.__name__.lower()] = {
-                            "perms": _m.allowed_permissions,
-                            "compact": _to_compact_perms_list(_m.allowed_permissions, _m.__name__.lower(), _m.__name__.lower())
-                        }
-
-        if settings.GEONODE_APPS_ENABLE and 'geoapp' in _types:
-            _types.remove('geoapp')
-            if hasattr(settings, 'CLIENT_APP_LIST') and settings.CLIENT_APP_LIST:
-                _types += settings.CLIENT_APP_LIST
-            else:
-                from geonode.geoapps.models import GeoApp
-                geoapp_types = [x for x in GeoApp.objects.values_list('resource_type', flat=True).all().distinct()]
-                _types += geoapp_types
-
-            if hasattr(settings, 'CLIENT_APP_ALLOWED_PERMS') and settings.CLIENT_APP_ALLOWED_PERMS:
-                for _type in settings.CLIENT_APP_ALLOWED_PERMS:
-                    for _type_name, _type_perms in _type.items():
-                        _allowed_perms[_type_name] = {
-                            "perms": _type_perms,
-                            "compact": _to_compact_perms_list(_type_perms, _type_name, _type_name)
-                        }
-            else:
-                from geonode.geoapps.models import GeoApp
-                for _m in GeoApp.objects.filter(resource_type__in=_types).iterator():
-                    if hasattr(_m, 'resource_type') and _m.resource_type and _m.resource_type not in _allowed_perms:
-                        _allowed_perms[_m.resource_type] = {
-                            "perms": _m.allowed_permissions,
-                            "compact": _to_compact_perms_list(_m.allowed_permissions, _m.resource_type, _m.subtype)
-                        }
-
         for _type in _types:
             resource_types.append({
                 "name": _type,
-                "count": get_resources_with_perms(request.user).filter(resource_type=_type).count(),
+                "count": _counts.get(_type, 0),
                 "allowed_perms": _allowed_perms[_type] if _type in _allowed_perms else []
             })
         return Response({"resource_types": resource_types})
@@ -22,14 +22,27 @@ import datetime
 import logging
 import traceback
 
+from threading import Lock
+
 from django.utils import timezone
 from django.conf import settings
+from django.db.models import signals
 from django.contrib.auth import authenticate
 from oauth2_provider.models import AccessToken, get_application_model
 from oauthlib.common import generate_token
 
 logger = logging.getLogger(__name__)
 
+# In-process cache of the bearer tokens used for outbound calls:
+#   (username, client) -> (token, cache expiration)
+_token_cache = {}
+_token_cache_lock = Lock()
+_token_cache_stats = {
+    'hits': 0,
+    'misses': 0,
+    'invalidations': 0
+}
+
 
 def extract_headers(request):
     """
@@ -198,3 +211,88 @@ def basic_auth_authenticate_user(auth_header: str):
     password = decoded_credentials[1]
 
     return authenticate(username=username, password=password)
+
+
+def _token_cache_ttl():
+    return getattr(settings, 'ACCESS_TOKEN_CACHE_TTL', 300)
+
+
+def get_cached_token(username, client="GeoServer"):
+    """
+    Returns the cached bearer token string for 'username', if still valid.
+    Every hit is a DB lookup saved by 'get_or_create_cached_token'.
+    """
+    if not username:
+        return None
+    _key = (username, client)
+    with _token_cache_lock:
+        _entry = _token_cache.get(_key)
+        if _entry and _entry[1] > timezone.now():
+            _token_cache_stats['hits'] += 1
+            return _entry[0]
+        elif _entry:
+            del _token_cache[_key]
+        _token_cache_stats['misses'] += 1
+    return None
+
+
+def set_cached_token(username, access_token, client="GeoServer"):
+    if not username or not access_token or access_token.is_expired():
+        return
+    _max_expires = timezone.now() + datetime.timedelta(seconds=_token_cache_ttl())
+    _expires = min(access_token.expires, _max_expires)
+    with _token_cache_lock:
+        _token_cache[(username, client)] = (access_token.token, _expires)
+
+
+def invalidate_cached_token(username=None):
+    """
+    Drops the cached tokens of 'username', or the whole cache if no username is given.
+    """
+    with _token_cache_lock:
+        if username is None:
+            _token_cache.clear()
+        else:
+            for _key in [_k for _k in _token_cache if _k[0] == username]:
+                del _token_cache[_key]
+        _token_cache_stats['invalidations'] += 1
+
+
+def get_token_cache_stats():
+    with _token_cache_lock:
+        return dict(_token_cache_stats, size=len(_token_cache))
+
+
+def get_or_create_cached_token(user, client="GeoServer"):
+    """
+    Returns a valid bearer token string for 'user' (a user instance or a username),
+    hitting the DB only when the token is not cached yet or has expired.
+    """
+    from django.contrib.auth import get_user_model
+
+    _username = user if isinstance(user, str) else getattr(user, 'username', None)
+    token = get_cached_token(_username, client)
+    if token:
+        return token
+    if isinstance(user, str):
+        user = get_user_model().objects.get(username=user)
+    access_token = get_or_create_token(user, client)
+    if access_token and not access_token.is_expired():
+        set_cached_token(_username, access_token, client)
+        return access_token.token
+    return None
+
+
+def access_token_post_change(instance, *args, **kwargs):
+    """
+    Revoked, refreshed or extended tokens must not be served from the cache anymore.
+    """
+    try:
+        invalidate_cached_token(instance.user.username if instance.user_id else None)
+    except Exception as e:
+        logger.debug(e)
+        invalidate_cached_token()
+
+
+signals.post_save.connect(access_token_post_change, sender=AccessToken)
+signals.post_delete.connect(access_token_post_change, sender=AccessToken)
@@ -0,0 +1,62 @@
+# Generated by Django 3.2.7 on 2021-12-01 10:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+VISIBILITY_PERMISSIONS = ('view_resourcebase', 'change_resourcebase')
+
+
+def fill_resource_visibility(apps, _):
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    ResourceVisibility = apps.get_model('base', 'ResourceVisibility')
+    ResourceBase = apps.get_model('base', 'ResourceBase')
+    UserObjectPermission = apps.get_model('guardian', 'UserObjectPermission')
+    GroupObjectPermission = apps.get_model('guardian', 'GroupObjectPermission')
+    ctype = ContentType.objects.filter(app_label='base', model='resourcebase').first()
+    if not ctype:
+        return
+    resources_ids = set(str(_id) for _id in ResourceBase.objects.values_list('id', flat=True))
+    _rows = []
+    for _pk, _user_id in UserObjectPermission.objects.filter(
+            content_type=ctype,
+            permission__codename__in=VISIBILITY_PERMISSIONS).values_list('object_pk', 'user_id').distinct():
+        if _pk in resources_ids:
+            _rows.append(ResourceVisibility(resource_id=int(_pk), user_id=_user_id))
+    for _pk, _group_id in GroupObjectPermission.objects.filter(
+            content_type=ctype,
+            permission__codename__in=VISIBILITY_PERMISSIONS).values_list('object_pk', 'group_id').distinct():
+        if _pk in resources_ids:
+            _rows.append(ResourceVisibility(resource_id=int(_pk), group_id=_group_id))
+    ResourceVisibility.objects.bulk_create(_rows, batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('guardian', '0002_generic_permissions_index'),
+        ('base', '0074_auto_20211119_1359'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResourceVisibility',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('group', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='auth.group')),
+                ('resource', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='base.resourcebase')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='resourcevisibility',
+            index=models.Index(fields=['user', 'resource'], name='base_resvis_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resourcevisibility',
+            index=models.Index(fields=['group', 'resource'], name='base_resvis_group_idx'),
+        ),
+        migrations.RunPython(fill_resource_visibility, migrations.RunPython.noop),
+    ]
@@ -59,6 +59,7 @@ from pinax.ratings.models import OverallRating
 from taggit.models import TagBase, ItemBase
 from taggit.managers import TaggableManager, _TaggableManager
 
+from guardian.models import UserObjectPermission, GroupObjectPermission
 from guardian.shortcuts import get_anonymous_user, get_objects_for_user
 from treebeard.mp_tree import MP_Node, MP_NodeQuerySet, MP_NodeManager
 
@@ -76,11 +77,12 @@ from geonode.thumbs.utils import (
     thumb_size,
     get_unique_upload_path)
 from geonode.groups.models import GroupProfile
-from geonode.security.utils import get_visible_resources, get_geoapp_subtypes
+from geonode.security.utils import get_visible_resources, get_geoapp_subtypes, invalidate_resources_counts
 from geonode.security.models import PermissionLevelMixin
 from geonode.security.permissions import (
     VIEW_PERMISSIONS,
-    OWNER_PERMISSIONS
+    OWNER_PERMISSIONS,
+    VISIBILITY_PERMISSIONS
 )
 
 from geonode.notifications_helper import (
@@ -2094,6 +2096,132 @@ class GroupGeoLimit(models.Model):
         blank=True)
 
 
+class ResourceVisibilityManager(models.Manager):
+
+    def refresh(self, resources_ids):
+        """
+        Rebuilds the visibility rows of the given resources from the guardian object permissions.
+        """
+        resources_ids = [int(_id) for _id in resources_ids]
+        if not resources_ids:
+            return
+        ctype = ContentType.objects.get_for_model(ResourceBase)
+        _object_pks = [str(_id) for _id in resources_ids]
+        _users = UserObjectPermission.objects.filter(
+            content_type=ctype,
+            permission__codename__in=VISIBILITY_PERMISSIONS,
+            object_pk__in=_object_pks).values_list('object_pk', 'user_id').distinct()
+        _groups = GroupObjectPermission.objects.filter(
+            content_type=ctype,
+            permission__codename__in=VISIBILITY_PERMISSIONS,
+            object_pk__in=_object_pks).values_list('object_pk', 'group_id').distinct()
+        self.filter(resource_id__in=resources_ids).delete()
+        self.bulk_create(
+            [self.model(resource_id=int(_pk), user_id=_user_id) for _pk, _user_id in _users] +
+            [self.model(resource_id=int(_pk), group_id=_group_id) for _pk, _group_id in _groups])
+        invalidate_resources_counts()
+
+
+class ResourceVisibility(models.Model):
+    """
+    Materialized index of the users and groups which can see a resource, i.e. having
+    any of the VISIBILITY_PERMISSIONS object permissions on it.
+
+    It is kept up to date by the guardian object permissions signals, and it is used
+    by 'get_visible_resources' instead of deriving the permissions at every request.
+    """
+    resource = models.ForeignKey(
+        ResourceBase,
+        related_name='+',
+        on_delete=models.CASCADE)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        blank=True,
+        related_name='+',
+        on_delete=models.CASCADE)
+    group = models.ForeignKey(
+        Group,
+        null=True,
+        blank=True,
+        related_name='+',
+        on_delete=models.CASCADE)
+
+    objects = ResourceVisibilityManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'resource'], name='base_resvis_user_idx'),
+            models.Index(fields=['group', 'resource'], name='base_resvis_group_idx'),
+        ]
+
+
+def _get_visibility_key(instance):
+    """
+    Returns the (resource id, filter) of a guardian object permission changing the resources visibility, if any.
+    """
+    if instance.content_type_id != ContentType.objects.get_for_model(ResourceBase).id:
+        return None, None
+    try:
+        if instance.permission.codename not in VISIBILITY_PERMISSIONS:
+            return None, None
+        _resource_id = int(instance.object_pk)
+    except Exception:
+        return None, None
+    if isinstance(instance, UserObjectPermission):
+        return _resource_id, {'user_id': instance.user_id}
+    return _resource_id, {'group_id': instance.group_id}
+
+
+def resource_visibility_post_save(instance, created, *args, **kwargs):
+    _resource_id, _filter = _get_visibility_key(instance)
+    if _resource_id and ResourceBase.objects.filter(id=_resource_id).exists():
+        _, _created = ResourceVisibility.objects.get_or_create(resource_id=_resource_id, **_filter)
+        if _created:
+            invalidate_resources_counts()
+
+
+def resource_visibility_post_delete(instance, *args, **kwargs):
+    _resource_id, _filter = _get_visibility_key(instance)
+    if _resource_id:
+        _still_visible = instance.__class__.objects.filter(
+            content_type_id=instance.content_type_id,
+            object_pk=instance.object_pk,
+            permission__codename__in=VISIBILITY_PERMISSIONS,
+            **_filter).exists()
+        if not _still_visible:
+            ResourceVisibility.objects.filter(resource_id=_resource_id, **_filter).delete()
+            invalidate_resources_counts()
+
+
+signals.post_save.connect(resource_visibility_post_save, sender=UserObjectPermission)
+signals.post_save.connect(resource_visibility_post_save, sender=GroupObjectPermission)
+signals.post_delete.connect(resource_visibility_post_delete, sender=UserObjectPermission)
+signals.post_delete.connect(resource_visibility_post_delete, sender=GroupObjectPermission)
+
+
+def resource_post_change(instance, created=True, *args, **kwargs):
+    """
+    Invalidates the cached resources counts when a resource is created or deleted.
+    """
+    if created:
+        invalidate_resources_counts()
+
+
+def resource_class_prepared(sender, **kwargs):
+    """
+    Connects 'resource_post_change' to the saves of the ResourceBase subclasses, since
+    'post_save' is sent for the concrete model only.
+    """
+    if issubclass(sender, ResourceBase):
+        signals.post_save.connect(resource_post_change, sender=sender)
+
+
+signals.post_save.connect(resource_post_change, sender=ResourceBase)
+signals.post_delete.connect(resource_post_change, sender=ResourceBase)
+signals.class_prepared.connect(resource_class_prepared)
+
+
 def rating_post_save(instance, *args, **kwargs):
     """
     Used to fill the average rating field on OverallRating change.
@@ -56,6 +56,8 @@ from django.contrib.auth import get_user_model
 from geonode.storage.manager import storage_manager
 from django.test import Client, TestCase, override_settings, SimpleTestCase
 from django.shortcuts import reverse
+from django.utils import timezone
+from datetime import timedelta
 
 from geonode.base.middleware import ReadOnlyMiddleware, MaintenanceMiddleware
 from geonode.base.templatetags.base_tags import get_visibile_resources, facets
@@ -72,6 +74,10 @@ from django.core.files import File
 from django.core.management import call_command
 from django.core.management.base import CommandError
 from geonode.base.forms import ThesaurusAvailableForm
+from geonode.base.auth import (
+    get_or_create_cached_token,
+    get_token_cache_stats,
+    invalidate_cached_token)
 
 
 test_image = Image.new('RGBA', size=(50, 50), color=(155, 0, 0))
@@ -1112,3 +1118,38 @@ class TestGenerateThesaurusReference(TestCase):
         '''
         self.assertEqual(expected, actual)
         self.assertEqual(expected, keyword.about)
+
+
+class TestCachedAuthToken(GeoNodeBaseTestSupport):
+
+    def setUp(self):
+        super().setUp()
+        invalidate_cached_token()
+        self.user = get_user_model().objects.get(username='admin')
+
+    @patch('geonode.base.auth.get_or_create_token')
+    def test_token_is_served_from_cache(self, get_or_create_token):
+        access_token = Mock(token='abc123', expires=timezone.now() + timedelta(hours=1))
+        access_token.is_expired.return_value = False
+        get_or_create_token.return_value = access_token
+
+        self.assertEqual(get_or_create_cached_token(self.user), 'abc123')
+        hits = get_token_cache_stats()['hits']
+        self.assertEqual(get_or_create_cached_token(self.user), 'abc123')
+        self.assertEqual(get_or_create_cached_token(self.user.username), 'abc123')
+        self.assertEqual(get_or_create_token.call_count, 1)
+        self.assertEqual(get_token_cache_stats()['hits'], hits + 2)
+
+        invalidate_cached_token(self.user.username)
+        self.assertEqual(get_or_create_cached_token(self.user), 'abc123')
+        self.assertEqual(get_or_create_token.call_count, 2)
+
+    @patch('geonode.base.auth.get_or_create_token')
+    def test_expired_token_is_not_cached(self, get_or_create_token):
+        access_token = Mock(token='abc123', expires=timezone.now() - timedelta(hours=1))
+        access_token.is_expired.return_value = True
+        get_or_create_token.return_value = access_token
+
+        self.assertIsNone(get_or_create_cached_token(self.user))
+        self.assertIsNone(get_or_create_cached_token(self.user))
+        self.assertEqual(get_or_create_token.call_count, 2)
@@ -17,30 +17,229 @@
 #
 #########################################################################
 import json
+import time
 import logging
 import typing
 import requests
 import traceback
 import xml.etree.ElementTree as ET
 
+from threading import local
+from contextlib import contextmanager
+
 from lxml import etree
 from defusedxml import lxml as dlxml
 from requests.auth import HTTPBasicAuth
 from guardian.shortcuts import get_anonymous_user
 
 from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
 from django.contrib.auth.models import Group
 from django.contrib.auth import get_user_model
 
-from geonode.utils import get_dataset_workspace
+from geonode.utils import get_dataset_workspace, http_client
 from geonode.groups.models import GroupProfile
 
 logger = logging.getLogger(__name__)
 
 
+class GeoFenceRulesBatch:
+    """
+    Compiles the GeoFence rules of the datasets changed within a 'geofence_rules_batch' block,
+    and synchronizes them with GeoFence at once:
+     - the rules of a purged dataset are diffed against the existing ones, so that only the
+       rules which changed are deleted and posted again;
+     - the priorities of the new rules are assigned locally, from a single lookup;
+     - all the calls share the same HTTP session, and the rules cache is invalidated only once.
+    """
+
+    def __init__(self):
+        self.datasets = {}
+        self.invalidate = False
+
+    def _get_dataset(self, workspace, dataset_name):
+        return self.datasets.setdefault((workspace, dataset_name), {'purge': False, 'rules': []})
+
+    @staticmethod
+    def _get_rule(service, request=None, user=None, group=None, geo_limit=None, allow=True):
+        """
+        Returns the normalized fields of a rule, as returned by the GeoFence REST API.
+        """
+        _limited = service == "*" and geo_limit is not None and geo_limit != ""
+        return (
+            user or None,
+            f"ROLE_{group.upper()}" if group is not None else None,
+            service.upper() if service and service != "*" else None,
+            request.upper() if request and request != "*" else None,
+            "LIMIT" if _limited else "ALLOW" if allow else "DENY",
+            geo_limit if _limited else None,
+        )
+
+    @staticmethod
+    def _get_existing_rule(rule):
+        _limits = rule.get('limits') or {}
+        return (
+            rule.get('userName') or None,
+            rule.get('roleName') or None,
+            (rule.get('service') or '').upper() or None,
+            (rule.get('request') or '').upper() or None,
+            rule.get('access'),
+            _limits.get('allowedArea') or None,
+        )
+
+    def add(self, workspace, dataset_name, service, request=None, user=None, group=None, geo_limit=None, allow=True):
+        _rules = self._get_dataset(workspace, dataset_name)['rules']
+        _rule = self._get_rule(service, request=request, user=user, group=group, geo_limit=geo_limit, allow=allow)
+        if _rule not in [_key for _key, _ in _rules]:
+            _rules.append((_rule, dict(service=service, request=request, user=user, group=group,
+                                       geo_limit=geo_limit, allow=allow)))
+
+    def purge(self, workspace, dataset_name):
+        """
+        Marks the rules of the dataset to be replaced by the ones added to the batch.
+        """
+        _dataset = self._get_dataset(workspace, dataset_name)
+        _dataset['purge'] = True
+        _dataset['rules'] = []
+
+    def _get_existing_rules(self, session, auth, workspace, dataset_name):
+        url = settings.OGC_SERVER['default']['LOCATION']
+        r = session.get(
+            f"{url}rest/geofence/rules.json",
+            params={'workspace': workspace, 'layer': dataset_name},
+            headers={'Content-type': 'application/json'},
+            auth=auth,
+            timeout=10,
+            verify=False)
+        if r.status_code < 200 or r.status_code >= 300:
+            raise RuntimeError(f"Could not retrieve the GeoFence Rules of Dataset {dataset_name}: '{r.text}'")
+        _rules = [_r for _r in (r.json().get('rules') or []) if _r.get('layer') and _r['layer'] == dataset_name]
+        return sorted(_rules, key=lambda _r: int(_r.get('priority') or 0))
+
+    def diff(self, existing, workspace, dataset_name):
+        """
+        Returns the ids of the existing rules to be deleted and the rules to be added, in order.
+
+        When the dataset is purged the existing rules are kept only as long as they match,
+        in the same order, the ones compiled; otherwise the compiled rules are appended.
+        """
+        _dataset = self._get_dataset(workspace, dataset_name)
+        _existing = [(_r['id'], self._get_existing_rule(_r)) for _r in existing]
+        _rules = _dataset['rules']
+        if not _dataset['purge']:
+            _current = set(_rule for _, _rule in _existing)
+            return [], [_rule for _rule in _rules if _rule[0] not in _current]
+        _kept = 0
+        while _kept < min(len(_existing), len(_rules)) and _existing[_kept][1] == _rules[_kept][0]:
+            _kept += 1
+        return [_id for _id, _ in _existing[_kept:]], _rules[_kept:]
+
+    def apply(self):
+        """
+        Synchronizes the compiled rules with GeoFence; returns the number of (added, deleted) rules.
+        """
+        if not self.datasets and not self.invalidate:
+            return 0, 0
+        url = settings.OGC_SERVER['default']['LOCATION']
+        auth = HTTPBasicAuth(settings.OGC_SERVER['default']['USER'], settings.OGC_SERVER['default']['PASSWORD'])
+        session = http_client.get_session(url)
+
+        _added = _deleted = 0
+        _changes = []
+        for (workspace, dataset_name) in self.datasets.keys():
+            try:
+                _existing = self._get_existing_rules(session, auth, workspace, dataset_name)
+            except Exception as e:
+                logger.exception(e)
+                continue
+            _changes.append((workspace, dataset_name) + tuple(self.diff(_existing, workspace, dataset_name)))
+
+        # Delete the stale GeoFence Rules first, so that the new ones get the right priorities
+        # curl -X DELETE -u admin:geoserver http://<host>:<port>/geoserver/rest/geofence/rules/id/{r_id}
+        for _, dataset_name, to_delete, _ in _changes:
+            for _id in to_delete:
+                r = session.delete(f"{url}rest/geofence/rules/id/{_id}", auth=auth, timeout=10, verify=False)
+                if r.status_code < 200 or r.status_code > 201:
+                    logger.debug(f"Could not DELETE GeoServer Rule id[{_id}] for Dataset {dataset_name}: "
+                                 f"Response [{r.status_code}] : {r.text}")
+                else:
+                    _deleted += 1
+
+        if any(_to_add for _, _, _, _to_add in _changes):
+            # Every new rule is inserted at the highest priority, just before the catch-all one
+            highest_priority = get_highest_priority()
+            priority = highest_priority if highest_priority >= 0 else 0
+            for workspace, dataset_name, _, to_add in _changes:
+                for _, _rule in to_add:
+                    payload = _get_geofence_payload(
+                        layer=None,
+                        dataset_name=dataset_name,
+                        workspace=workspace,
+                        access="ALLOW" if _rule['allow'] else "DENY",
+                        user=_rule['user'],
+                        group=_rule['group'],
+                        service=_rule['service'],
+                        request=_rule['request'],
+                        geo_limit=_rule['geo_limit'],
+                        priority=priority)
+                    r = session.post(
+                        f"{url}rest/geofence/rules",
+                        data=payload,
+                        headers={'Content-type': 'application/xml'},
+                        auth=auth,
+                        timeout=10,
+                        verify=False)
+                    if r.status_code not in (200, 201):
+                        msg = f"Could not ADD GeoServer Rule for Dataset {dataset_name}: '{r.text}'"
+                        if 'Duplicate Rule' in r.text:
+                            logger.debug(msg)
+                        else:
+                            logger.error(msg)
+                        continue
+                    priority += 1
+                    _added += 1
+
+        if self.invalidate or _added or _deleted:
+            self.invalidate = False
+            set_geofence_invalidate_cache()
+        self.datasets = {}
+        return _added, _deleted
+
+
+# Active GeoFence rules batch of the current thread; see 'geofence_rules_batch'
+_geofence_rules_batch = local()
+
+
+def get_geofence_rules_batch():
+    """
+    Returns the active GeoFence rules batch, or None if no batch is active.
+    """
+    return getattr(_geofence_rules_batch, 'batch', None)
+
+
+@contextmanager
+def geofence_rules_batch():
+    """
+    Collects the GeoFence rules changes of the enclosed block, e.g. a permissions update,
+    and applies them at the end of the block. Nested blocks share the outer batch.
+    """
+    _owner = get_geofence_rules_batch() is None
+    if _owner:
+        _geofence_rules_batch.batch = GeoFenceRulesBatch()
+    try:
+        yield _geofence_rules_batch.batch
+    finally:
+        if _owner:
+            _batch = _geofence_rules_batch.batch
+            _geofence_rules_batch.batch = None
+            _batch.apply()
+
+
 def _get_geofence_payload(layer, dataset_name, workspace, access, user=None, group=None,
-                          service=None, request=None, geo_limit=None):
-    highest_priority = get_highest_priority()
+                          service=None, request=None, geo_limit=None, priority=None):
+    highest_priority = get_highest_priority() if priority is None else priority
     root_el = etree.Element("Rule")
     username_el = etree.SubElement(root_el, "userName")
     if user is not None:
@@ -80,6 +279,11 @@ def _update_geofence_rule(layer, dataset_name, workspace,
                           service, request=None,
                           user=None, group=None,
                           geo_limit=None, allow=True):
+    _batch = get_geofence_rules_batch()
+    if _batch is not None:
+        _batch.add(workspace, dataset_name, service, request=request, user=user, group=group,
+                   geo_limit=geo_limit, allow=allow)
+        return
     payload = _get_geofence_payload(
         layer=layer,
         dataset_name=dataset_name,
@@ -230,6 +434,10 @@ def purge_geofence_dataset_rules(resource):
     workspace = get_dataset_workspace(resource.dataset)
     dataset_name = resource.dataset.name if resource.dataset and hasattr(resource.dataset, 'name') \
         else resource.dataset.alternate
+    _batch = get_geofence_rules_batch()
+    if _batch is not None:
+        _batch.purge(workspace, dataset_name)
+        return
     try:
         r = requests.get(
             f"{url}rest/geofence/rules.json?workspace={workspace}&layer={dataset_name}",
@@ -266,6 +474,10 @@ def purge_geofence_dataset_rules(resource):
 def set_geofence_invalidate_cache():
     """invalidate GeoFence Cache Rules"""
     if settings.OGC_SERVER['default']['GEOFENCE_SECURITY_ENABLED']:
+        _batch = get_geofence_rules_batch()
+        if _batch is not None:
+            _batch.invalidate = True
+            return True
         try:
             url = settings.OGC_SERVER['default']['LOCATION']
             user = settings.OGC_SERVER['default']['USER']
@@ -527,91 +739,209 @@ def sync_geofence_with_guardian(dataset, perms, user=None, group=None, group_per
         gf_services_limits_first.update(gf_services)
         gf_services = gf_services_limits_first
 
-    for service, allowed in gf_services.items():
-        if dataset and _dataset_name and allowed:
-            if _user:
-                logger.debug(f"Adding 'user' to geofence the rule: {dataset} {service} {_user}")
-                _wkt = None
-                if users_geolimits and users_geolimits.count():
-                    _wkt = users_geolimits.last().wkt
-                if service in gf_requests:
-                    for request, enabled in gf_requests[service].items():
-                        _update_geofence_rule(dataset, _dataset_name, _dataset_workspace,
-                                              service, request=request, user=_user, allow=enabled)
-                _update_geofence_rule(dataset, _dataset_name, _dataset_workspace, service, user=_user, geo_limit=_wkt)
-            elif not _group:
-                logger.debug(f"Adding to geofence the rule: {dataset} {service} *")
-                _wkt = None
-                if anonymous_geolimits and anonymous_geolimits.count():
-                    _wkt = anonymous_geolimits.last().wkt
-                if service in gf_requests:
-                    for request, enabled in gf_requests[service].items():
-                        _update_geofence_rule(dataset, _dataset_name, _dataset_workspace,
-                                              service, request=request, user=_user, allow=enabled)
-                _update_geofence_rule(dataset, _dataset_name, _dataset_workspace, service, geo_limit=_wkt)
-                if service in gf_requests:
-                    for request, enabled in gf_requests[service].items():
-                        _update_geofence_rule(dataset, _dataset_name, _dataset_workspace,
-                                              service, request=request, user=_user, allow=enabled)
-            if _group:
-                logger.debug(f"Adding 'group' to geofence the rule: {dataset} {service} {_group}")
-                _wkt = None
-                if groups_geolimits and groups_geolimits.count():
-                    _wkt = groups_geolimits.last().wkt
-                if service in gf_requests:
-                    for request, enabled in gf_requests[service].items():
-                        _update_geofence_rule(dataset, _dataset_name, _dataset_workspace,
-                                              service, request=request, group=_group, allow=enabled)
-                _update_geofence_rule(dataset, _dataset_name, _dataset_workspace, service, group=_group, geo_limit=_wkt)
-                if service in gf_requests:
-                    for request, enabled in gf_requests[service].items():
-                        _update_geofence_rule(dataset, _dataset_name, _dataset_workspace,
-                                              service, request=request, group=_group, allow=enabled)
-    if not getattr(settings, 'DELAYED_SECURITY_SIGNALS', False):
-        set_geofence_invalidate_cache()
-    else:
-        dataset.set_dirty_state()
+    with geofence_rules_batch():
+        for service, allowed in gf_services.items():
+            if dataset and _dataset_name and allowed:
+                if _user:
+                    logger.debug(f"Adding 'user' to geofence the rule: {dataset} {service} {_user}")
+                    _wkt = None
+                    if users_geolimits and users_geolimits.count():
+                        _wkt = users_geolimits.last().wkt
+                    if service in gf_requests:
+                        for request, enabled in gf_requests[service].items():
+                            _update_geofence_rule(dataset, _dataset_name, _dataset_workspace,
+                                                  service, request=request, user=_user, allow=enabled)
+                    _update_geofence_rule(dataset, _dataset_name, _dataset_workspace, service, user=_user, geo_limit=_wkt)
+                elif not _group:
+                    logger.debug(f"Adding to geofence the rule: {dataset} {service} *")
+                    _wkt = None
+                    if anonymous_geolimits and anonymous_geolimits.count():
+                        _wkt = anonymous_geolimits.last().wkt
+                    if service in gf_requests:
+                        for request, enabled in gf_requests[service].items():
+                            _update_geofence_rule(dataset, _dataset_name, _dataset_workspace,
+                                                  service, request=request, user=_user, allow=enabled)
+                    _update_geofence_rule(dataset, _dataset_name, _dataset_workspace, service, geo_limit=_wkt)
+                    if service in gf_requests:
+                        for request, enabled in gf_requests[service].items():
+                            _update_geofence_rule(dataset, _dataset_name, _dataset_workspace,
+                                                  service, request=request, user=_user, allow=enabled)
+                if _group:
+                    logger.debug(f"Adding 'group' to geofence the rule: {dataset} {service} {_group}")
+                    _wkt = None
+                    if groups_geolimits and groups_geolimits.count():
+                        _wkt = groups_geolimits.last().wkt
+                    if service in gf_requests:
+                        for request, enabled in gf_requests[service].items():
+                            _update_geofence_rule(dataset, _dataset_name, _dataset_workspace,
+                                                  service, request=request, group=_group, allow=enabled)
+                    _update_geofence_rule(dataset, _dataset_name, _dataset_workspace, service, group=_group, geo_limit=_wkt)
+                    if service in gf_requests:
+                        for request, enabled in gf_requests[service].items():
+                            _update_geofence_rule(dataset, _dataset_name, _dataset_workspace,
+                                                  service, request=request, group=_group, allow=enabled)
+        if not getattr(settings, 'DELAYED_SECURITY_SIGNALS', False):
+            set_geofence_invalidate_cache()
+        else:
+            dataset.set_dirty_state()
 
 
-def sync_resources_with_guardian(resource=None):
+def _sync_resource_with_guardian(resource):
     """
-    Sync resources with Guardian and clear their dirty state
+    Rebuilds the GeoFence rules of a dataset from its Guardian permissions.
     """
     from geonode.layers.models import Dataset
+
+    with geofence_rules_batch():
+        purge_geofence_dataset_rules(resource)
+        layer = Dataset.objects.get(id=resource.id)
+        perm_spec = layer.get_all_level_info()
+        # All the other users
+        if 'users' in perm_spec:
+            for user, perms in perm_spec['users'].items():
+                if isinstance(user, str):
+                    user = get_user_model().objects.get(username=user)
+                # Set the GeoFence User Rules
+                geofence_user = str(user)
+                if "AnonymousUser" in geofence_user:
+                    geofence_user = None
+                sync_geofence_with_guardian(layer, perms, user=geofence_user)
+        # All the other groups
+        if 'groups' in perm_spec:
+            for group, perms in perm_spec['groups'].items():
+                if isinstance(group, str):
+                    group = Group.objects.get(name=group)
+                # Set the GeoFence Group Rules
+                sync_geofence_with_guardian(layer, perms, group=group)
+
+
+def sync_resources_with_guardian(resource=None, resources_ids=None):
+    """
+    Sync resources with Guardian and clear their dirty state.
+
+    Only the dirty resources in 'resources_ids' are synced when the ids are given, e.g. by a chunk
+    of the 'synch_guardian' task. Returns the number of synced and failed resources.
+    """
     from geonode.base.models import ResourceBase
 
     if resource:
         dirty_resources = ResourceBase.objects.filter(id=resource.id)
+    elif resources_ids is not None:
+        dirty_resources = ResourceBase.objects.filter(id__in=resources_ids, dirty_state=True)
     else:
         dirty_resources = ResourceBase.objects.filter(dirty_state=True)
-    if dirty_resources and dirty_resources.count() > 0:
-        logger.debug(" --------------------------- synching with guardian!")
-        for r in dirty_resources:
-            if r.polymorphic_ctype.name == 'dataset':
-                layer = None
-                try:
-                    purge_geofence_dataset_rules(r)
-                    layer = Dataset.objects.get(id=r.id)
-                    perm_spec = layer.get_all_level_info()
-                    # All the other users
-                    if 'users' in perm_spec:
-                        for user, perms in perm_spec['users'].items():
-                            user = get_user_model().objects.get(username=user)
-                            # Set the GeoFence User Rules
-                            geofence_user = str(user)
-                            if "AnonymousUser" in geofence_user:
-                                geofence_user = None
-                            sync_geofence_with_guardian(layer, perms, user=geofence_user)
-                    # All the other groups
-                    if 'groups' in perm_spec:
-                        for group, perms in perm_spec['groups'].items():
-                            group = Group.objects.get(name=group)
-                            # Set the GeoFence Group Rules
-                            sync_geofence_with_guardian(layer, perms, group=group)
-                    r.clear_dirty_state()
-                except Exception as e:
-                    logger.exception(e)
-                    logger.warn(f"!WARNING! - Failure Synching-up Security Rules for Resource [{r}]")
+    dirty_resources = dirty_resources.filter(polymorphic_ctype__model='dataset').order_by('last_updated', 'id')
+
+    _synced = 0
+    _failed = 0
+    logger.debug(" --------------------------- synching with guardian!")
+    for r in dirty_resources.iterator():
+        # the dirty state is cleared before reading the permissions, so that a resource changed
+        # while being synced stays dirty and is synced again by the next drain
+        r.clear_dirty_state()
+        try:
+            _sync_resource_with_guardian(r)
+            _synced += 1
+        except Exception as e:
+            _failed += 1
+            r.set_dirty_state()
+            logger.exception(e)
+            logger.warn(f"!WARNING! - Failure Synching-up Security Rules for Resource [{r}]")
+    if resources_ids is not None:
+        update_sync_resources_progress(_synced, _failed)
+    return _synced, _failed
+
+
+def get_dirty_resources_chunks(chunk_size=None):
+    """
+    Returns the ids of the dirty datasets split in chunks of 'chunk_size' elements,
+    the ones waiting for the longest time first.
+    """
+    from geonode.base.models import ResourceBase
+
+    chunk_size = chunk_size or settings.SECURITY_SYNC_CHUNK_SIZE
+    _ids = list(
+        ResourceBase.objects.filter(
+            dirty_state=True, polymorphic_ctype__model='dataset'
+        ).order_by('last_updated', 'id').values_list('id', flat=True))
+    return [_ids[_i:_i + chunk_size] for _i in range(0, len(_ids), chunk_size)]
+
+
+SYNC_RESOURCES_PROGRESS_KEY = 'synch_guardian_progress'
+SYNC_RESOURCES_PROGRESS_KEYS = ('total', 'synced', 'failed', 'started')
+
+# The progress of the dirty resources drain is shared by the 'synch_guardian' tasks through the
+# default cache, which must then be shared by all the workers, e.g. a memcached or redis one.
+# With a process local or dummy cache the progress is not available, and a running drain cannot be
+# detected: drains may overlap, with the same resources synced twice.
+
+
+def _is_sync_resources_progress_shared():
+    return not isinstance(cache, (DummyCache, LocMemCache))
+
+
+def start_sync_resources_progress(total):
+    """
+    Resets the progress counters of the dirty resources drain.
+    """
+    if not _is_sync_resources_progress_shared():
+        logger.warning(
+            f"The dirty resources drain progress cannot be tracked through a {cache.__class__.__name__}: "
+            "configure a cache shared by all the workers to prevent overlapping drains")
+    cache.set_many({
+        f'{SYNC_RESOURCES_PROGRESS_KEY}_total': total,
+        f'{SYNC_RESOURCES_PROGRESS_KEY}_synced': 0,
+        f'{SYNC_RESOURCES_PROGRESS_KEY}_failed': 0,
+        f'{SYNC_RESOURCES_PROGRESS_KEY}_started': time.time(),
+    }, None)
+
+
+def update_sync_resources_progress(synced, failed):
+    for _key, _value in (('synced', synced), ('failed', failed)):
+        if _value:
+            try:
+                cache.incr(f'{SYNC_RESOURCES_PROGRESS_KEY}_{_key}', _value)
+            except ValueError:
+                # No drain in progress
+                pass
+
+
+def get_sync_resources_progress():
+    """
+    Returns the progress and the throughput, in resources per second, of the dirty resources drain;
+    None if no drain is running, or if the cache is not shared by the workers.
+    """
+    if not _is_sync_resources_progress_shared():
+        return None
+    _progress = cache.get_many([
+        f'{SYNC_RESOURCES_PROGRESS_KEY}_{_key}' for _key in SYNC_RESOURCES_PROGRESS_KEYS])
+    _progress = {
+        _key[len(SYNC_RESOURCES_PROGRESS_KEY) + 1:]: _value for _key, _value in _progress.items()}
+    if 'started' not in _progress:
+        return None
+    _done = _progress.get('synced', 0) + _progress.get('failed', 0)
+    _elapsed = time.time() - _progress['started']
+    _progress.update({
+        'pending': max(_progress.get('total', 0) - _done, 0),
+        'elapsed': _elapsed,
+        'throughput': _done / _elapsed if _elapsed > 0 else 0,
+    })
+    return _progress
+
+
+def is_sync_resources_running():
+    """
+    Checks if a dirty resources drain has been started and neither finished nor timed out.
+    """
+    _progress = get_sync_resources_progress()
+    return _progress is not None and _progress['elapsed'] < settings.SECURITY_SYNC_TIMEOUT
+
+
+def finish_sync_resources_progress():
+    """
+    Clears the progress of the dirty resources drain, so that a new one can be started.
+    """
+    cache.delete_many([f'{SYNC_RESOURCES_PROGRESS_KEY}_{_key}' for _key in SYNC_RESOURCES_PROGRESS_KEYS])
 
 
 def get_user_geolimits(layer, user, group, gf_services):
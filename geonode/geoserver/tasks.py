@@ -21,7 +21,7 @@ import os
 from django.conf import settings
 from django.core.management import call_command
 
-from celery import shared_task
+from celery import chord, shared_task
 from celery.utils.log import get_task_logger
 
 from geonode.celery_app import app
@@ -33,7 +33,13 @@ from geonode.base import enumerations
 from geonode.layers.models import Dataset
 from geonode.base.models import ResourceBase
 
-from .security import sync_resources_with_guardian
+from .security import (
+    get_dirty_resources_chunks,
+    is_sync_resources_running,
+    get_sync_resources_progress,
+    start_sync_resources_progress,
+    finish_sync_resources_progress,
+    sync_resources_with_guardian)
 from .helpers import (
     gs_slurp,
     gs_catalog,
@@ -297,6 +303,9 @@ def geoserver_delete_map(self, object_id):
             map_obj.delete()
 
 
+SYNCH_GUARDIAN_LOCK_ID = 'geonode.security.tasks.synch_guardian'
+
+
 @shared_task(
     bind=True,
     name='geonode.security.tasks.synch_guardian',
@@ -308,9 +317,66 @@ def geoserver_delete_map(self, object_id):
     retry_backoff=True,
     retry_backoff_max=700,
     retry_jitter=True)
-def synch_guardian():
+def synch_guardian(self):
     """
-    Sync resources with Guardian and clear their dirty state
+    Sync resources with Guardian and clear their dirty state.
+
+    The dirty resources are split in chunks synced in parallel by 'synch_guardian_chunk';
+    a new drain is not dispatched until the running one has been finalized.
     """
     if getattr(settings, 'DELAYED_SECURITY_SIGNALS', False):
-        sync_resources_with_guardian()
+        with AcquireLock(SYNCH_GUARDIAN_LOCK_ID) as lock:
+            if lock.acquire() is True:
+                if is_sync_resources_running():
+                    logger.debug(f"Resources sync with Guardian still running: {get_sync_resources_progress()}")
+                    return
+                chunks = get_dirty_resources_chunks()
+                if not chunks:
+                    return
+                start_sync_resources_progress(sum(len(_chunk) for _chunk in chunks))
+                try:
+                    synch_guardian_workflow_finalizer = _synch_guardian_finalizer.signature(
+                        immutable=True
+                    ).on_error(
+                        _synch_guardian_finalizer.signature(immutable=True)
+                    )
+                    synch_guardian_workflow = chord(
+                        [synch_guardian_chunk.signature(args=(_chunk,)) for _chunk in chunks],
+                        body=synch_guardian_workflow_finalizer)
+                    synch_guardian_workflow.apply_async()
+                except Exception:
+                    finish_sync_resources_progress()
+                    raise
+
+
+@app.task(
+    bind=True,
+    base=FaultTolerantTask,
+    name='geonode.security.tasks.synch_guardian_chunk',
+    queue='security',
+    acks_late=False,
+    ignore_result=False)
+def synch_guardian_chunk(self, resources_ids):
+    """
+    Sync a chunk of dirty resources with Guardian.
+    """
+    lock_id = f'{SYNCH_GUARDIAN_LOCK_ID}_{resources_ids[0]}_{resources_ids[-1]}'
+    with AcquireLock(lock_id) as lock:
+        if lock.acquire() is True:
+            return sync_resources_with_guardian(resources_ids=resources_ids)
+
+
+@app.task(
+    bind=True,
+    base=FaultTolerantTask,
+    name='geonode.security.tasks.synch_guardian_finalizer',
+    queue='security',
+    acks_late=False,
+    ignore_result=False)
+def _synch_guardian_finalizer(self):
+    progress = get_sync_resources_progress()
+    if progress:
+        logger.info(
+            f"Synced {progress.get('synced', 0)} resources with Guardian ({progress.get('failed', 0)} failed, "
+            f"{progress['pending']} pending) in {progress['elapsed']:.1f}s: {progress['throughput']:.2f} resources/s")
+    finish_sync_resources_progress()
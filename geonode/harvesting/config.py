@@ -50,6 +50,8 @@ def get_setting(setting_key: str) -> typing.Any:
         ),
         "HARVESTED_RESOURCE_FILE_MAX_MEMORY_SIZE": getattr(
             settings, "HARVESTED_RESOURCE_MAX_MEMORY_SIZE", settings.FILE_UPLOAD_MAX_MEMORY_SIZE),
-        "HARVESTER_SCHEDULER_FREQUENCY_MINUTES": getattr(settings, "HARVESTER_SCHEDULER_FREQUENCY_MINUTES", 0.5)
+        "HARVESTER_SCHEDULER_FREQUENCY_MINUTES": getattr(settings, "HARVESTER_SCHEDULER_FREQUENCY_MINUTES", 0.5),
+        "HARVESTER_MAX_REFRESH_BATCHES": getattr(settings, "HARVESTER_MAX_REFRESH_BATCHES", 100),
+        "HARVESTER_RESOURCES_BATCH_SIZE": getattr(settings, "HARVESTER_RESOURCES_BATCH_SIZE", 10),
     }.get(setting_key, getattr(settings, setting_key, None))
     return result
@@ -379,6 +379,9 @@ class ArcgisHarvesterWorker(base.BaseHarvesterWorker):
     harvest_image_services: bool
     resource_name_filter: typing.Optional[str]
     service_names_filter: typing.Optional[typing.List[str]]
+    # the nested services cannot be paginated, all resources are listed at once
+    page_size = None
+    max_page_size = None
 
     http_session: requests.Session
     _arc_catalog: typing.Optional[arcrest.Catalog]
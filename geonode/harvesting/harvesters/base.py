@@ -23,6 +23,7 @@ import html
 import io
 import logging
 import typing
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import geonode.upload.files
@@ -75,6 +76,14 @@ class BaseHarvesterWorker(abc.ABC):
 
     remote_url: str
     harvester_id: int
+    # Number of resources returned by `list_resources()` for each offset - `None` means
+    # that all the resources are returned at once, when `offset=0`
+    page_size: typing.Optional[int] = 10
+    # Largest page size accepted by the remote service, the page size may be increased
+    # up to this value in order to refresh the harvestable resources in fewer batches
+    max_page_size: typing.Optional[int] = 10
+    # Number of remote resources that `get_resources()` is allowed to fetch concurrently
+    max_concurrent_requests: int = 1
 
     def __init__(self, remote_url: str, harvester_id: int):
         self.remote_url = remote_url
@@ -183,6 +192,34 @@ class BaseHarvesterWorker(abc.ABC):
 
         return True
 
+    def get_resources(
+            self,
+            harvestable_resources: typing.List["HarvestableResource"],  # noqa
+    ) -> typing.List[typing.Optional[HarvestedResourceInfo]]:
+        """Retrieve the information of a batch of remote resources, in the same order.
+
+        The base implementation calls `get_resource()` for each resource, concurrently when
+        `max_concurrent_requests` allows it, so that the worker's HTTP session is shared by
+        the whole batch. A resource that cannot be retrieved gets `None`. Subclasses may
+        re-implement this method if the remote service is able to retrieve multiple
+        resources at once.
+
+        """
+
+        def _get_resource(harvestable_resource):
+            try:
+                return self.get_resource(harvestable_resource)
+            except Exception:
+                logger.exception(
+                    f"Could not retrieve remote resource {harvestable_resource.unique_identifier!r}")
+                return None
+
+        max_workers = min(self.max_concurrent_requests, len(harvestable_resources))
+        if max_workers > 1:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                return list(executor.map(_get_resource, harvestable_resources))
+        return [_get_resource(harvestable_resource) for harvestable_resource in harvestable_resources]
+
     def should_copy_resource(
             self,
             harvestable_resource: "HarvestableResource",  # noqa
@@ -98,6 +98,8 @@ class GeonodeCurrentHarvester(base.BaseHarvesterWorker):
     categories_filter: typing.Optional[typing.List[str]]
     http_session: requests.Session
     page_size: int = 10
+    max_page_size: int = 500
+    max_concurrent_requests: int = 4
 
     def __init__(
             self,
@@ -472,6 +474,8 @@ class GeonodeLegacyHarvester(base.BaseHarvesterWorker):
     resource_title_filter: typing.Optional[str]
     http_session: requests.Session
     page_size: int = 10
+    max_page_size: int = 500
+    max_concurrent_requests: int = 4
 
     def __init__(
             self,
@@ -1106,6 +1110,12 @@ class GeonodeUnifiedHarvesterWorker(base.BaseHarvesterWorker):
     ) -> typing.Optional[base.HarvestedResourceInfo]:
         return self.concrete_worker.get_resource(harvestable_resource)
 
+    def get_resources(
+            self,
+            harvestable_resources: typing.List[models.HarvestableResource],
+    ) -> typing.List[typing.Optional[base.HarvestedResourceInfo]]:
+        return self.concrete_worker.get_resources(harvestable_resources)
+
     def should_copy_resource(
             self,
             harvestable_resource: models.HarvestableResource,
@@ -111,6 +111,10 @@ class OgcWmsHarvester(base.BaseHarvesterWorker):
     """Harvester for resources coming from OGC WMS web services"""
 
     dataset_title_filter: typing.Optional[str]
+    # GetCapabilities lists all the layers at once
+    page_size = None
+    max_page_size = None
+    _cached_data: typing.Optional[typing.Dict] = None
     _base_wms_parameters: typing.Dict = {
         "service": "WMS",
         "version": "1.3.0",
@@ -345,8 +349,21 @@ class OgcWmsHarvester(base.BaseHarvesterWorker):
             )
         return result
 
+    def get_resources(
+            self,
+            harvestable_resources: typing.List[models.HarvestableResource],
+    ) -> typing.List[typing.Optional[base.HarvestedResourceInfo]]:
+        # a single GetCapabilities request provides the information of the whole batch
+        self._cached_data = self._get_data()
+        try:
+            return super().get_resources(harvestable_resources)
+        finally:
+            self._cached_data = None
+
     def _get_data(self) -> typing.Dict:
         """Return data from the harvester URL in JSON format."""
+        if self._cached_data is not None:
+            return self._cached_data
         get_capabilities_response = self.get_capabilities()
         root = etree.fromstring(get_capabilities_response.content, parser=XML_PARSER)
         nsmap = _get_nsmap(root.nsmap)
@@ -32,6 +32,7 @@ from django.utils import timezone
 from geonode.celery_app import app
 
 from . import models
+from .config import get_setting
 from .harvesters import base
 
 logger = logging.getLogger(__name__)
@@ -153,12 +154,21 @@ def harvest_resources(
                 session.total_records_to_process = len(harvestable_resource_ids)
                 session.save()
                 resource_tasks = []
-                for harvestable_resource_id in harvestable_resource_ids:
-                    resource_tasks.append(
-                        _harvest_resource.signature(
-                            args=(harvestable_resource_id, harvesting_session_id)
+                batch_size = get_setting("HARVESTER_RESOURCES_BATCH_SIZE")
+                if batch_size > 1:
+                    for index in range(0, len(harvestable_resource_ids), batch_size):
+                        resource_tasks.append(
+                            _harvest_resources_batch.signature(
+                                args=(harvestable_resource_ids[index:index + batch_size], harvesting_session_id)
+                            )
+                        )
+                else:
+                    for harvestable_resource_id in harvestable_resource_ids:
+                        resource_tasks.append(
+                            _harvest_resource.signature(
+                                args=(harvestable_resource_id, harvesting_session_id)
+                            )
                         )
-                    )
                 harvesting_finalizer = _finish_harvesting.signature(
                     args=(harvesting_session_id,),
                     immutable=True
@@ -211,36 +221,14 @@ def _harvest_resource(
         harvestable_resource = models.HarvestableResource.objects.get(pk=harvestable_resource_id)
         worker: base.BaseHarvesterWorker = harvestable_resource.harvester.get_harvester_worker()
         harvested_resource_info = worker.get_resource(harvestable_resource)
-        now_ = timezone.now()
-        if harvested_resource_info is not None:
-            if worker.should_copy_resource(harvestable_resource):
-                copied_path = worker.copy_resource(harvestable_resource, harvested_resource_info)
-                if copied_path is not None:
-                    harvested_resource_info.copied_resources.append(copied_path)
-            try:
-                worker.update_geonode_resource(
-                    harvested_resource_info,
-                    harvestable_resource,
-                )
-                result = True
-                details = ""
-            except (RuntimeError, ValidationError) as exc:
-                logger.error(msg="Unable to update geonode resource")
-                result = False
-                details = str(exc)
-            harvesting_message = f"{harvestable_resource.title}({harvestable_resource_id}) - {'Success' if result else details}"
+        result, harvesting_message = _update_harvested_resource(
+            worker, harvestable_resource, harvested_resource_info)
+        if harvesting_message is not None:
             update_asynchronous_session(
                 harvesting_session_id,
                 additional_processed_records=1 if result else 0,
                 additional_details=harvesting_message
             )
-            harvestable_resource.last_harvesting_message = f"{now_} - {harvesting_message}"
-            harvestable_resource.last_harvesting_succeeded = result
-        else:
-            harvestable_resource.last_harvesting_message = f"{now_}Harvesting failed"
-            harvestable_resource.last_harvesting_succeeded = False
-        harvestable_resource.last_harvested = now_
-        harvestable_resource.save()
     else:
         message = (
             f"Skipping harvesting of resource {harvestable_resource_id} since the "
@@ -250,6 +238,114 @@ def _harvest_resource(
         logger.debug(message)
 
 
+@app.task(
+    bind=True,
+    queue='geonode',
+    acks_late=False,
+    ignore_result=False,
+)
+def _harvest_resources_batch(
+        self,
+        harvestable_resource_ids: typing.List[int],
+        harvesting_session_id: int
+):
+    """Harvest a batch of resources from the input harvestable resource ids.
+
+    The remote resources are retrieved by a single worker, and so through the same
+    HTTP session, with `worker.get_resources()`. The harvesting session is updated
+    once for the whole batch.
+
+    """
+
+    session = models.AsynchronousHarvestingSession.objects.get(pk=harvesting_session_id)
+    if session.status != session.STATUS_ABORTING:
+        harvestable_resources = models.HarvestableResource.objects.filter(
+            pk__in=harvestable_resource_ids).select_related("harvester", "geonode_resource")
+        resources_order = {pk: index for index, pk in enumerate(harvestable_resource_ids)}
+        harvestable_resources = sorted(
+            harvestable_resources, key=lambda r: resources_order.get(r.pk, len(resources_order)))
+        if len(harvestable_resources) == 0:
+            return
+        processed = 0
+        harvesting_messages = []
+        try:
+            worker: base.BaseHarvesterWorker = session.harvester.get_harvester_worker()
+            harvested_resources_info = worker.get_resources(harvestable_resources)
+            for harvestable_resource, harvested_resource_info in zip(harvestable_resources, harvested_resources_info):
+                try:
+                    result, harvesting_message = _update_harvested_resource(
+                        worker, harvestable_resource, harvested_resource_info)
+                except Exception as exc:
+                    # a failure must not prevent harvesting the other resources of the batch
+                    logger.exception(f"Unable to harvest resource {harvestable_resource.pk}")
+                    now_ = timezone.now()
+                    result = False
+                    harvesting_message = f"{harvestable_resource.title}({harvestable_resource.pk}) - {exc}"
+                    models.HarvestableResource.objects.filter(pk=harvestable_resource.pk).update(
+                        last_harvesting_message=f"{now_} - {harvesting_message}",
+                        last_harvesting_succeeded=False,
+                        last_harvested=now_
+                    )
+                processed += 1 if result else 0
+                if harvesting_message is not None:
+                    harvesting_messages.append(harvesting_message)
+        finally:
+            update_asynchronous_session(
+                harvesting_session_id,
+                additional_processed_records=processed,
+                additional_details="\n".join(harvesting_messages) if harvesting_messages else None
+            )
+    else:
+        message = (
+            f"Skipping harvesting of resources {harvestable_resource_ids} since the "
+            f"session has been aborted"
+        )
+        update_asynchronous_session(harvesting_session_id, additional_details=message)
+        logger.debug(message)
+
+
+def _update_harvested_resource(
+        worker: base.BaseHarvesterWorker,
+        harvestable_resource: models.HarvestableResource,
+        harvested_resource_info: typing.Optional[base.HarvestedResourceInfo]
+) -> typing.Tuple[bool, typing.Optional[str]]:
+    """Update the local GeoNode resource with the information retrieved from the remote one.
+
+    Return whether the update succeeded, together with the message to be added to the
+    harvesting session - which is `None` when the remote resource was not retrieved.
+
+    """
+
+    now_ = timezone.now()
+    result = False
+    harvesting_message = None
+    if harvested_resource_info is not None:
+        if worker.should_copy_resource(harvestable_resource):
+            copied_path = worker.copy_resource(harvestable_resource, harvested_resource_info)
+            if copied_path is not None:
+                harvested_resource_info.copied_resources.append(copied_path)
+        try:
+            worker.update_geonode_resource(
+                harvested_resource_info,
+                harvestable_resource,
+            )
+            result = True
+            details = ""
+        except (RuntimeError, ValidationError) as exc:
+            logger.error(msg="Unable to update geonode resource")
+            result = False
+            details = str(exc)
+        harvesting_message = f"{harvestable_resource.title}({harvestable_resource.pk}) - {'Success' if result else details}"
+        harvestable_resource.last_harvesting_message = f"{now_} - {harvesting_message}"
+        harvestable_resource.last_harvesting_succeeded = result
+    else:
+        harvestable_resource.last_harvesting_message = f"{now_}Harvesting failed"
+        harvestable_resource.last_harvesting_succeeded = False
+    harvestable_resource.last_harvested = now_
+    harvestable_resource.save()
+    return result, harvesting_message
+
+
 @app.task(
     bind=True,
     queue='geonode',
@@ -369,7 +465,7 @@ def update_harvestable_resources(self, refresh_session_id: int):
                 harvester.save()
                 session.total_records_to_process = num_resources
                 session.save()
-                page_size = 10
+                page_size = _get_harvestable_resources_page_size(worker, num_resources)
                 total_pages = math.ceil(num_resources / page_size)
                 batches = []
                 for page in range(total_pages):
@@ -414,35 +510,90 @@ def _update_harvestable_resources_batch(
     if session.status == session.STATUS_ON_GOING:
         harvester = session.harvester
         worker = harvester.get_harvester_worker()
+        if worker.page_size is not None:
+            worker.page_size = page_size
         offset = page * page_size
         try:
             found_resources = worker.list_resources(offset)
         except base.HarvestingException:
             logger.exception("Could not retrieve list of remote resources.")
         else:
-            processed = 0
-            for remote_resource in found_resources:
-                resource, created = models.HarvestableResource.objects.get_or_create(
-                    harvester=harvester,
-                    unique_identifier=remote_resource.unique_identifier,
-                    title=remote_resource.title,
-                    defaults={
-                        "should_be_harvested": harvester.harvest_new_resources_by_default,
-                        "remote_resource_type": remote_resource.resource_type,
-                        "last_refreshed": timezone.now()
-                    }
-                )
-                processed += 1
-                # NOTE: make sure to save the resource because we need to have its
-                # `last_updated` property be refreshed - this is done in order to be able
-                # to compare when a resource has been found
-                resource.last_refreshed = timezone.now()
-                resource.save()
+            processed = _upsert_harvestable_resources(harvester, found_resources)
             update_asynchronous_session(refresh_session_id, additional_processed_records=processed)
     else:
         logger.info("The refresh session has been asked to abort, so skipping...")
 
 
+def _get_harvestable_resources_page_size(worker: base.BaseHarvesterWorker, num_resources: int) -> int:
+    """Return the number of remote resources to be refreshed by each batch.
+
+    The worker page size is increased, up to the largest one accepted by the remote
+    service, so that the resources are refreshed in `HARVESTER_MAX_REFRESH_BATCHES`
+    batches at most. Workers that are not able to paginate list all the resources
+    in a single batch.
+
+    """
+
+    if worker.page_size is None:
+        return max(num_resources, 1)
+    page_size = int(worker.page_size)
+    max_page_size = int(worker.max_page_size or page_size)
+    adapted = math.ceil(num_resources / get_setting("HARVESTER_MAX_REFRESH_BATCHES"))
+    return max(min(adapted, max_page_size), page_size)
+
+
+def _upsert_harvestable_resources(
+        harvester: models.Harvester,
+        remote_resources: typing.List[base.BriefRemoteResource]
+) -> int:
+    """Create or refresh the harvestable resources of a page of remote resources.
+
+    Resources are matched on `(harvester, unique_identifier)`. The new ones are created
+    in bulk, the existing ones get their title and type updated if they changed, and the
+    `last_refreshed` (and `last_updated`) properties of the whole page are set with a
+    single statement - these are used in order to know when a resource has been found.
+
+    """
+
+    remote_resources = {str(r.unique_identifier): r for r in remote_resources}
+    if len(remote_resources) == 0:
+        return 0
+    now_ = timezone.now()
+    existing = {
+        r.unique_identifier: r for r in models.HarvestableResource.objects.filter(
+            harvester=harvester, unique_identifier__in=remote_resources.keys()).only(
+                "id", "unique_identifier", "title", "remote_resource_type")
+    }
+    to_create = []
+    to_update = []
+    for unique_identifier, remote_resource in remote_resources.items():
+        resource = existing.get(unique_identifier)
+        if resource is None:
+            to_create.append(
+                models.HarvestableResource(
+                    harvester=harvester,
+                    unique_identifier=unique_identifier,
+                    title=remote_resource.title,
+                    should_be_harvested=harvester.harvest_new_resources_by_default,
+                    remote_resource_type=remote_resource.resource_type,
+                    last_refreshed=now_
+                )
+            )
+        elif (resource.title, resource.remote_resource_type) != (remote_resource.title, remote_resource.resource_type):
+            resource.title = remote_resource.title
+            resource.remote_resource_type = remote_resource.resource_type
+            to_update.append(resource)
+    if to_create:
+        # a concurrent batch may have just created some of the same resources
+        models.HarvestableResource.objects.bulk_create(to_create, ignore_conflicts=True)
+    if to_update:
+        models.HarvestableResource.objects.bulk_update(to_update, ["title", "remote_resource_type"])
+    models.HarvestableResource.objects.filter(
+        harvester=harvester, unique_identifier__in=remote_resources.keys()
+    ).update(last_refreshed=now_, last_updated=now_)
+    return len(remote_resources)
+
+
 @app.task(
     bind=True,
     queue='geonode',
@@ -524,14 +675,23 @@ def _delete_stale_harvestable_resources(harvester: models.Harvester):
     logger.debug(f"now: {timezone.now()}")
     to_remove = models.HarvestableResource.objects.filter(
         harvester=harvester, last_refreshed__lte=previously_checked_at)
-    for harvestable_resource in to_remove:
-        # NOTE: Iterating on each resource and calling its `delete()` method instead of
-        # just calling `delete()` on the queryset because this way we can be sure that
-        # the instance's `delete()` method is called (django may not call
-        # `instance.delete()` when using the queryset directly, for performance
-        # reasons). This is because `HarvestableResource.delete()` has the custom logic
-        # to check whether the related GeoNode resource should also be deleted or not
-        harvestable_resource.delete()
+    if harvester.delete_orphan_resources_automatically:
+        worker = harvester.get_harvester_worker()
+        finalizes_deletion = (
+            type(worker).finalize_harvestable_resource_deletion is not
+            base.BaseHarvesterWorker.finalize_harvestable_resource_deletion
+        )
+        if not finalizes_deletion:
+            to_remove = to_remove.filter(geonode_resource__isnull=False)
+        for harvestable_resource in to_remove.select_related("harvester", "geonode_resource"):
+            # NOTE: Calling the instance's `delete()` method, instead of just calling
+            # `delete()` on the queryset, for the harvestable resources that may leave an
+            # orphan GeoNode resource - `HarvestableResource.delete()` has the custom logic
+            # to check whether the related GeoNode resource should also be deleted or not
+            harvestable_resource.delete()
+    # The remaining harvestable resources do not need any custom logic on deletion
+    models.HarvestableResource.objects.filter(
+        harvester=harvester, last_refreshed__lte=previously_checked_at).delete()
 
 
 def finish_asynchronous_session(
@@ -28,6 +28,7 @@ from .. import (
     models,
     tasks,
 )
+from ..harvesters import base
 
 
 class TasksTestCase(GeoNodeBaseTestSupport):
@@ -102,6 +103,56 @@ class TasksTestCase(GeoNodeBaseTestSupport):
             mock_worker.get_resource.assert_called()
             mock_worker.update_geonode_resource.assert_not_called()
 
+    @mock.patch("geonode.harvesting.tasks.update_asynchronous_session")
+    def test_harvest_resources_batch_updates_session_once(self, mock_update_asynchronous_session):
+        """Test that the `_harvest_resources_batch()` task retrieves the whole batch with a single worker.
+
+        Verify that `worker.get_resources()` is called once, that only the retrieved resources are used to update
+        GeoNode and that the harvesting session is updated once for the whole batch.
+
+        """
+
+        harvestable_resources = list(models.HarvestableResource.objects.filter(harvester=self.harvester).order_by("pk"))
+        mock_worker = mock.MagicMock()
+        mock_worker.get_resources.return_value = ["fake_gotten_resource", None, "fake_gotten_resource"]
+        mock_worker.should_copy_resource.return_value = False
+        with mock.patch.object(models.Harvester, "get_harvester_worker", return_value=mock_worker):
+            tasks._harvest_resources_batch([r.pk for r in harvestable_resources], self.harvesting_session.id)
+
+        mock_worker.get_resources.assert_called_once()
+        self.assertEqual([r.pk for r in mock_worker.get_resources.call_args[0][0]], [r.pk for r in harvestable_resources])
+        self.assertEqual(mock_worker.update_geonode_resource.call_count, 2)
+        mock_update_asynchronous_session.assert_called_once()
+        self.assertEqual(mock_update_asynchronous_session.call_args[1]["additional_processed_records"], 2)
+        harvestable_resources[1].refresh_from_db()
+        self.assertFalse(harvestable_resources[1].last_harvesting_succeeded)
+        self.assertIsNotNone(harvestable_resources[1].last_harvested)
+
+    @mock.patch("geonode.harvesting.tasks.update_asynchronous_session")
+    def test_harvest_resources_batch_continues_after_unexpected_errors(self, mock_update_asynchronous_session):
+        """Test that an unexpected error harvesting a resource does not stop the `_harvest_resources_batch()` task.
+
+        Verify that the failed resource is marked as such and that the harvesting session is still updated once.
+
+        """
+
+        harvestable_resources = list(models.HarvestableResource.objects.filter(harvester=self.harvester).order_by("pk"))
+        mock_worker = mock.MagicMock()
+        mock_worker.get_resources.return_value = ["fake_gotten_resource"] * len(harvestable_resources)
+        mock_worker.should_copy_resource.return_value = False
+        mock_worker.update_geonode_resource.side_effect = [KeyError("fake_error")] + [None] * (len(harvestable_resources) - 1)
+        with mock.patch.object(models.Harvester, "get_harvester_worker", return_value=mock_worker):
+            tasks._harvest_resources_batch([r.pk for r in harvestable_resources], self.harvesting_session.id)
+
+        self.assertEqual(mock_worker.update_geonode_resource.call_count, len(harvestable_resources))
+        mock_update_asynchronous_session.assert_called_once()
+        self.assertEqual(
+            mock_update_asynchronous_session.call_args[1]["additional_processed_records"], len(harvestable_resources) - 1)
+        harvestable_resources[0].refresh_from_db()
+        self.assertFalse(harvestable_resources[0].last_harvesting_succeeded)
+        self.assertIn("fake_error", harvestable_resources[0].last_harvesting_message)
+        self.assertIsNotNone(harvestable_resources[0].last_harvested)
+
     def test_finish_harvesting_updates_harvester_status(self):
         tasks._finish_harvesting(self.harvesting_session.id)
         self.harvester.refresh_from_db()
@@ -144,6 +195,45 @@ class TasksTestCase(GeoNodeBaseTestSupport):
         mock_chord.assert_called()
         mock_chord.return_value.apply_async.assert_called()
 
+    def test_upsert_harvestable_resources(self):
+        remote_resources = [
+            base.BriefRemoteResource(
+                unique_identifier="fake-identifier-0", title="new-title-0", resource_type="fake-remote-resource-type"),
+            base.BriefRemoteResource(
+                unique_identifier="fake-identifier-1", title="fake-title-1", resource_type="fake-remote-resource-type"),
+            base.BriefRemoteResource(
+                unique_identifier="fake-identifier-3", title="fake-title-3", resource_type="fake-remote-resource-type"),
+        ]
+        before = now()
+        processed = tasks._upsert_harvestable_resources(self.harvester, remote_resources)
+        self.assertEqual(processed, 3)
+        harvestable_resources = models.HarvestableResource.objects.filter(harvester=self.harvester)
+        self.assertEqual(harvestable_resources.count(), 4)
+        self.assertEqual(harvestable_resources.get(unique_identifier="fake-identifier-0").title, "new-title-0")
+        self.assertEqual(
+            set(harvestable_resources.filter(last_refreshed__gte=before).values_list("unique_identifier", flat=True)),
+            {"fake-identifier-0", "fake-identifier-1", "fake-identifier-3"}
+        )
+
+        # the resources not refreshed anymore are stale
+        self.harvester.last_checked_harvestable_resources = before
+        tasks._delete_stale_harvestable_resources(self.harvester)
+        self.assertEqual(
+            set(harvestable_resources.values_list("unique_identifier", flat=True)),
+            {"fake-identifier-0", "fake-identifier-1", "fake-identifier-3"}
+        )
+
+    def test_get_harvestable_resources_page_size(self):
+        mock_worker = mock.MagicMock()
+        mock_worker.page_size = 10
+        mock_worker.max_page_size = 500
+        with self.settings(HARVESTER_MAX_REFRESH_BATCHES=100):
+            self.assertEqual(tasks._get_harvestable_resources_page_size(mock_worker, 50), 10)
+            self.assertEqual(tasks._get_harvestable_resources_page_size(mock_worker, 20000), 200)
+            self.assertEqual(tasks._get_harvestable_resources_page_size(mock_worker, 100000), 500)
+            mock_worker.page_size = None
+            self.assertEqual(tasks._get_harvestable_resources_page_size(mock_worker, 50), 50)
+
     def test_harvesting_scheduler(self):
         mock_harvester = mock.MagicMock(spec=models.Harvester).return_value
         mock_harvester.scheduling_enabled = True
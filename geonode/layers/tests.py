@@ -62,7 +62,7 @@ from geonode.layers.forms import JSONField, LayerUploadForm
 from geonode.maps.tests_populate_maplayers import maplayers as ml
 from geonode.layers.populate_datasets_data import create_dataset_data
 from geonode.base.models import TopicCategory, License, Region, Link
-from geonode.utils import check_ogc_backend, set_resource_default_links
+from geonode.utils import check_ogc_backend, set_resource_default_links, sync_resource_links
 from geonode.layers.metadata import convert_keyword, set_metadata, parse_metadata
 
 from geonode.layers.utils import (
@@ -389,6 +389,35 @@ class DatasetsTest(GeoNodeBaseTestSupport):
             links = Link.objects.filter(resource=lyr.resourcebase_ptr, link_type="image")
             self.assertIsNotNone(links)
 
+    def test_sync_resource_links(self):
+        lyr = Dataset.objects.first()
+        resource = lyr.resourcebase_ptr
+        Link.objects.filter(resource=resource).delete()
+        Link.objects.create(resource=resource, name='PNG', url='http://old/png', extension='png', mime='image/png', link_type='image')
+        Link.objects.create(resource=resource, name='PNG', url='http://dup/png', extension='png', mime='image/png', link_type='image')
+        Link.objects.create(resource=resource, name='CSV', url='http://csv', extension='csv', mime='csv', link_type='data')
+        Link.objects.create(resource=resource, name='Stale', url='http://stale', extension='csv', mime='csv', link_type='data')
+        Link.objects.create(resource=resource, name='Metadata', url='http://md', extension='xml', mime='text/xml', link_type='metadata')
+        links = [
+            (dict(name='PNG'), dict(url='http://new/png', extension='png', mime='image/png', link_type='image'), True),
+            (dict(url='http://csv', name='CSV', link_type='data'), dict(extension='csv', mime='csv'), True),
+            (dict(url='http://json', name='GeoJSON', link_type='data'), dict(extension='json', mime='json'), True),
+            (dict(url='http://ows', name='OGC WMS'), dict(extension='html', mime='text/html', link_type='OGC:WMS'), False),
+        ]
+        self.assertEqual(sync_resource_links(resource, links), (2, 1, 1))
+        self.assertEqual(Link.objects.get(resource=resource, name='PNG').url, 'http://new/png')
+        self.assertTrue(Link.objects.filter(resource=resource, name='Stale').exists())
+
+        # Nothing changes if the links are synced again
+        with self.assertNumQueries(1):
+            self.assertEqual(sync_resource_links(resource, links), (0, 0, 0))
+
+        # Pruning deletes the old links of the default types only
+        self.assertEqual(sync_resource_links(resource, links, prune_types=('data', 'image')), (0, 0, 1))
+        self.assertEqual(
+            sorted(Link.objects.filter(resource=resource).values_list('name', flat=True)),
+            ['CSV', 'GeoJSON', 'Metadata', 'OGC WMS', 'PNG'])
+
     def test_get_valid_user(self):
         # Verify it accepts an admin user
         adminuser = get_user_model().objects.get(is_superuser=True)
@@ -24,16 +24,34 @@ import logging
 import pytz
 
 from django.conf import settings
-from django.db.models import Sum, F
+from django.db import connection, transaction
+from django.db.models import Sum, Count, Max
 from django.core.exceptions import ObjectDoesNotExist, MultipleObjectsReturned
 
 from geonode.monitoring.utils import generate_periods
-from geonode.monitoring.models import (Metric, MetricValue, ServiceTypeMetric,
+from geonode.monitoring.models import (Metric, MetricValue, ServiceTypeMetric, ExceptionEvent,
                                        MonitoredResource, MetricLabel, EventType,)
 
 
 log = logging.getLogger(__name__)
 
+# metric name, RequestEvent column computed for every batch of requests
+REQUESTS_METRICS = (('request.ip', 'client_ip',),
+                    ('request.users', 'user_identifier',),
+                    ('request.country', 'client_country'),
+                    ('request.city', 'client_city',),
+                    ('request.region', 'client_region'),
+                    ('request.ua', 'user_agent',),
+                    ('request.ua.family', 'user_agent_family',),
+                    ('response.time', 'response_time',),
+                    ('response.size', 'response_size',),
+                    ('response.status', 'response_status',),
+                    ('request.method', 'request_method',),
+                    )
+
+# max number of labels stored for the "count" and "value" metrics
+REQUESTS_METRICS_MAX_LABELS = 100
+
 
 def get_metric_names():
     """
@@ -135,6 +153,162 @@ def extract_special_event_types(requests):
     return out
 
 
+def _get_requests_groups(requests, columns=(), **aggregates):
+    """
+    Computes the aggregates of the requests grouped by event type and "columns", both for all the
+    requests and for the requests of each monitored resource.
+
+    Yields tuples of (resource id or None, event type id, columns values, aggregates).
+    """
+    for by_resource in (False, True):
+        fields = ['event_type'] + list(columns)
+        q = requests
+        if by_resource:
+            fields = ['resources'] + fields
+            q = q.filter(resources__isnull=False)
+        for row in q.order_by().values(*fields).annotate(**aggregates):
+            yield row.pop('resources', None), row.pop('event_type'), tuple(row.pop(c) for c in columns), row
+
+
+def aggregate_requests(service, requests, valid_from, valid_to):
+    """
+    Computes the metric values of a batch of requests for all of them and for each monitored
+    resource, split by event type, with a few GROUP BY queries per metric column.
+
+    Returns a list of 'MetricValue.bulk_add' rows.
+    """
+    event_types = {et.id: et for et in EventType.objects.all()}
+    event_types_names = {et.name: et for et in event_types.values()}
+    event_all = event_types_names[EventType.EVENT_ALL]
+    # combined event types: ows and non-ows
+    event_ows = event_types_names.get(EventType.EVENT_OWS)
+    event_other = event_types_names.get(EventType.EVENT_OTHER)
+    metrics = {
+        stm.metric.name: stm.metric for stm in ServiceTypeMetric.objects.filter(
+            service_type=service.service_type,
+            metric__name__in=[mname for mname, _ in REQUESTS_METRICS]).select_related('metric')}
+
+    def get_scopes(resource_id, event_type_id):
+        """
+        Returns the (resource, event type) pairs the requests are accounted for
+        """
+        scopes = {(resource_id, event_all.id,)}
+        event_type = event_types.get(event_type_id)
+        if event_type:
+            scopes.add((resource_id, event_type.id,))
+            if event_type.name.startswith('OWS:'):
+                if event_ows and event_type.name != EventType.EVENT_OWS:
+                    scopes.add((resource_id, event_ows.id,))
+            elif event_other and event_type.name != EventType.EVENT_OTHER:
+                scopes.add((resource_id, event_other.id,))
+        return scopes
+
+    out = []
+
+    def add_value(scope, metric_name, label, value, samples_count):
+        resource_id, event_type_id = scope
+        out.append({'metric': metric_name,
+                    'valid_from': valid_from,
+                    'valid_to': valid_to,
+                    'service': service,
+                    'resource_id': resource_id,
+                    'event_type_id': event_type_id,
+                    'label': label,
+                    'value': value or 0,
+                    'value_raw': value or 0,
+                    'value_num': value if isinstance(value, (float, Decimal, int)) else None,
+                    'samples_count': samples_count})
+
+    # overall stats: requests count, rates and numeric values
+    aggregates = {'count': Count('id')}
+    for idx, (mname, cname) in enumerate(REQUESTS_METRICS):
+        metric = metrics.get(mname)
+        if not metric:
+            continue
+        if metric.is_rate:
+            aggregates[f'sum_{idx}'] = Sum(cname)
+            aggregates[f'samples_{idx}'] = Count(cname)
+        elif metric.is_value_numeric:
+            aggregates[f'max_{idx}'] = Max(cname)
+            aggregates[f'samples_{idx}'] = Count(cname)
+        elif not (metric.is_count or metric.is_value):
+            raise ValueError(f"Unsupported metric type: {metric.type}")
+
+    totals = {}
+    for resource_id, event_type_id, _, row in _get_requests_groups(requests, **aggregates):
+        for scope in get_scopes(resource_id, event_type_id):
+            _totals = totals.setdefault(scope, {})
+            for k, v in row.items():
+                if v is None:
+                    continue
+                if k.startswith('max_'):
+                    _totals[k] = max(_totals.get(k, v), v)
+                else:
+                    _totals[k] = _totals.get(k, 0) + v
+    for resource_id in {None} | {resource_id for resource_id, _ in totals}:
+        for event_type in (event_all, event_ows, event_other,):
+            if event_type:
+                totals.setdefault((resource_id, event_type.id,), {})
+
+    for scope, _totals in totals.items():
+        count = _totals.get('count', 0)
+        add_value(scope, 'request.count', 'Count', count, count)
+        for idx, (mname, cname) in enumerate(REQUESTS_METRICS):
+            metric = metrics.get(mname)
+            if not metric:
+                continue
+            samples = _totals.get(f'samples_{idx}', 0)
+            if metric.is_rate:
+                value = _totals[f'sum_{idx}'] / samples if samples else None
+                add_value(scope, mname, Metric.TYPE_RATE, value, count)
+            elif metric.is_value_numeric:
+                add_value(scope, mname, Metric.TYPE_VALUE_NUMERIC, _totals.get(f'max_{idx}'), samples)
+
+    # per-value stats: paths, counts and values
+    values_metrics = [('request.path', 'request_path',)] + [
+        (mname, cname) for mname, cname in REQUESTS_METRICS
+        if metrics.get(mname) and (metrics[mname].is_count or metrics[mname].is_value)]
+    for mname, cname in values_metrics:
+        is_path = mname == 'request.path'
+        is_count = not is_path and metrics[mname].is_count
+        columns = (cname, 'user_username',) if cname == 'user_identifier' else (cname,)
+        aggregates = {'samples': Count(cname)}
+        if is_count:
+            aggregates['value'] = Sum(cname)
+
+        values = {}
+        q = requests.exclude(**{f'{cname}__isnull': True})
+        for resource_id, event_type_id, group_values, row in _get_requests_groups(q, columns, **aggregates):
+            # the users are labelled by (identifier, username)
+            label = group_values if len(group_values) > 1 else group_values[0]
+            value = row['value'] if is_count else row['samples']
+            for scope in get_scopes(resource_id, event_type_id):
+                _values = values.setdefault(scope, {})
+                if group_values[0] in _values:
+                    _values[group_values[0]][1] += value or 0
+                    _values[group_values[0]][2] += row['samples']
+                else:
+                    _values[group_values[0]] = [label, value or 0, row['samples']]
+
+        for scope, _values in values.items():
+            rows = sorted(_values.values(), key=lambda r: r[1], reverse=True)
+            if not is_path:
+                rows = rows[:REQUESTS_METRICS_MAX_LABELS]
+            for label, value, samples in rows:
+                add_value(scope, mname, label, value, samples)
+
+    # errors stats
+    requests_count = totals[(None, event_all.id,)].get('count', 0)
+    errors_count = requests.filter(exceptions__isnull=False).values('id').distinct().count()
+    if errors_count:
+        add_value((None, None,), 'response.error.count', 'count', errors_count, requests_count)
+        errors = ExceptionEvent.objects.filter(request__in=requests).order_by().values(
+            'error_type').annotate(count=Count('request', distinct=True))
+        for row in errors:
+            add_value((None, None,), 'response.error.types', row['error_type'], row['count'], row['count'])
+    return out
+
+
 def calculate_rate(metric_name, metric_label,
                    current_value, valid_to):
     """
@@ -231,70 +405,196 @@ def aggregate_past_periods(metric_data_q=None, periods=None, cleanup=True, now=N
 
 
 def aggregate_period(period_start, period_end, metric_data_q, cleanup=True):
-    counter = 0
+    """
+    Rolls up the metric values within the period into one value for each (service, metric,
+    resource, event type, label) with a single INSERT ... SELECT ... GROUP BY, using the
+    aggregate function of each metric type.
+
+    Returns the number of aggregated values.
+    """
     to_remove_data = {'remove_at': period_start.strftime("%Y%m%d%H%M%S")}
     source_metric_data = metric_data_q.filter(valid_from__gte=period_start,
                                               valid_to__lte=period_end)\
         .exclude(valid_from=period_start,
                  valid_to=period_end,
                  data={})
-    r = source_metric_data.values_list('service_id', 'service_metric_id', 'resource_id', 'event_type_id', 'label_id',)\
-                          .distinct('service_id', 'service_metric_id', 'resource_id', 'event_type_id', 'label_id')
-    source_metric_data.update(data=to_remove_data)
-
-    for service_id, metric_id, resource_id, event_type_id, label_id in r:
-        m = Metric.objects.filter(service_type__id=metric_id).get()
-        f = m.get_aggregate_field()
-        per_metric_q = source_metric_data.filter(service_metric_id=metric_id,
-                                                 service_id=service_id,
-                                                 resource_id=resource_id,
-                                                 event_type_id=event_type_id,
-                                                 label_id=label_id)
-
-        try:
-            value_q = per_metric_q.aggregate(fvalue=f,
-                                             fsamples_count=Sum(F('samples_count')))
-        except TypeError as err:
-            raise ValueError(f, m, err)
-        value = value_q['fvalue']
-        samples_count = value_q['fsamples_count']
-        if cleanup:
-            per_metric_q.delete()
-        log.debug('Metric %s: %s - %s (value: %s, samples: %s)',
-                  m, period_start, period_end, value, samples_count)
-        if not metric_data_q.filter(service_metric_id=metric_id,
-                                    service_id=service_id,
-                                    resource_id=resource_id,
-                                    event_type_id=event_type_id,
-                                    valid_from=period_start,
-                                    valid_to=period_end,
-                                    label_id=label_id).exists():
-            MetricValue.objects.create(service_metric_id=metric_id,
-                                       service_id=service_id,
-                                       resource_id=resource_id,
-                                       event_type_id=event_type_id,
-                                       value=value,
-                                       value_num=value,
-                                       value_raw=value,
-                                       valid_from=period_start,
-                                       valid_to=period_end,
-                                       label_id=label_id,
-                                       samples_count=samples_count)
-        else:
-            metric_data_q.filter(service_metric_id=metric_id,
-                                 service_id=service_id,
-                                 resource_id=resource_id,
-                                 event_type_id=event_type_id,
-                                 valid_from=period_start,
-                                 valid_to=period_end,
-                                 label_id=label_id)\
-                .update(value=value,
-                        value_num=value,
-                        value_raw=value,
-                        data=None,
-                        samples_count=samples_count)
-        counter += 1
+    if not source_metric_data.update(data=to_remove_data):
+        return 0
+    source_metric_data = metric_data_q.filter(valid_from__gte=period_start,
+                                              valid_to__lte=period_end,
+                                              data=to_remove_data)
+    target_metric_data = metric_data_q.filter(valid_from=period_start,
+                                              valid_to=period_end)\
+        .exclude(data=to_remove_data)
+
+    source_sql, source_params = source_metric_data.values('id').query.sql_with_params()
+    target_sql, target_params = target_metric_data.values('id').query.sql_with_params()
+    metric_values_table = MetricValue._meta.db_table
+    aggregate_sql = ' '.join(f'WHEN %s THEN {aggregate}' for aggregate in Metric.AGGREGATE_MAP.values())
+    aggregate_sql = f'CASE m.type {aggregate_sql} END'
+    aggregate_params = list(Metric.AGGREGATE_MAP.keys())
+
+    # the aggregated values already stored for the period are replaced; when the sources are
+    # cleaned up they are rolled up again together with the new sources, since the aggregate
+    # functions of all the metric types can be composed
+    previous_sql = ' UNION ALL SELECT * FROM previous' if cleanup else ''
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'WITH previous AS (DELETE FROM {metric_values_table} t WHERE t.id IN ({target_sql}) AND EXISTS ('
+            f'SELECT 1 FROM {metric_values_table} s WHERE s.id IN ({source_sql}) '
+            'AND s.service_id = t.service_id '
+            'AND s.service_metric_id = t.service_metric_id '
+            'AND s.resource_id IS NOT DISTINCT FROM t.resource_id '
+            'AND s.event_type_id IS NOT DISTINCT FROM t.event_type_id '
+            'AND s.label_id = t.label_id) RETURNING t.*) '
+            f'INSERT INTO {metric_values_table} (valid_from, valid_to, service_id, service_metric_id, '
+            'resource_id, event_type_id, label_id, value, value_raw, value_num, samples_count, data) '
+            'SELECT %s, %s, s.service_id, s.service_metric_id, s.resource_id, s.event_type_id, s.label_id, '
+            f'COALESCE({aggregate_sql}, 0), COALESCE({aggregate_sql}, 0), {aggregate_sql}, '
+            "COALESCE(SUM(s.samples_count), 0), '{}' "
+            f'FROM (SELECT * FROM {metric_values_table} WHERE id IN ({source_sql}){previous_sql}) s '
+            f'JOIN {ServiceTypeMetric._meta.db_table} stm ON stm.id = s.service_metric_id '
+            f'JOIN {Metric._meta.db_table} m ON m.id = stm.metric_id '
+            'GROUP BY s.service_id, s.service_metric_id, s.resource_id, s.event_type_id, s.label_id, m.type',
+            list(target_params) + list(source_params) +
+            [period_start, period_end] + aggregate_params * 3 + list(source_params))
+        counter = cursor.rowcount
+    log.debug('Aggregated %s metric values: %s - %s', counter, period_start, period_end)
 
     if cleanup:
-        source_metric_data.filter(data=to_remove_data).delete()
+        source_metric_data.delete()
+    MetricValue._invalidate_data_cache(period_start, period_end)
     return counter
+
+
+def _get_month_start(dt):
+    return dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _get_next_month(dt):
+    dt = _get_month_start(dt)
+    return dt.replace(year=dt.year + 1, month=1) if dt.month == 12 else dt.replace(month=dt.month + 1)
+
+
+def is_metric_values_partitioned():
+    """
+    Checks if the MetricValues table has been converted to the monthly partitioned layout
+    by "partition_metric_values".
+    """
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid '
+                       'WHERE c.relname = %s', [MetricValue._meta.db_table])
+        return cursor.fetchone() is not None
+
+
+def get_metric_values_partitions():
+    """
+    Returns the list of (partition name, month start) of the MetricValues table.
+    """
+    partitions = []
+    prefix = f'{MetricValue._meta.db_table}_p'
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+                       'JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = %s', [MetricValue._meta.db_table])
+        for name, in cursor.fetchall():
+            if name.startswith(prefix):
+                try:
+                    partitions.append((name, datetime.strptime(name[len(prefix):], '%Y%m').replace(tzinfo=pytz.utc)))
+                except ValueError:
+                    pass
+    return sorted(partitions, key=lambda p: p[1])
+
+
+def create_metric_values_partitions(since, until):
+    """
+    Creates the monthly partitions of the MetricValues table between since and until.
+    """
+    table = MetricValue._meta.db_table
+    quote_name = connection.ops.quote_name
+    existing = {month for _, month in get_metric_values_partitions()}
+    month = _get_month_start(since)
+    created = []
+    with connection.cursor() as cursor:
+        while month <= until:
+            next_month = _get_next_month(month)
+            if month not in existing:
+                name = f"{table}_p{month.strftime('%Y%m')}"
+                cursor.execute(f'SELECT 1 FROM {quote_name(f"{table}_default")} '
+                               'WHERE valid_from >= %s AND valid_from < %s LIMIT 1', [month, next_month])
+                if cursor.fetchone():
+                    log.warning("Cannot create the partition %s: its values are in the default partition", name)
+                else:
+                    cursor.execute(f'CREATE TABLE {quote_name(name)} PARTITION OF {quote_name(table)} '
+                                   'FOR VALUES FROM (%s) TO (%s)', [month, next_month])
+                    created.append(name)
+            month = next_month
+    return created
+
+
+def drop_metric_values_partitions(cutoff):
+    """
+    Drops the partitions of the MetricValues table with values older than the cutoff only.
+    """
+    quote_name = connection.ops.quote_name
+    # the aggregated values span up to the longest aggregation period
+    max_period = max([period for _, period in getattr(settings, 'MONITORING_DATA_AGGREGATION', ())] +
+                     [timedelta(days=1)])
+    dropped = []
+    with connection.cursor() as cursor:
+        for name, month in get_metric_values_partitions():
+            if _get_next_month(month) + max_period <= cutoff:
+                cursor.execute(f'DROP TABLE {quote_name(name)}')
+                dropped.append(name)
+    return dropped
+
+
+def partition_metric_values(months_ahead=2):
+    """
+    Converts the MetricValues table to a layout partitioned by month of 'valid_from', so that
+    old data can be dropped by partition. Requires PostgreSQL 11 or later.
+    """
+    if is_metric_values_partitioned():
+        return False
+    table = MetricValue._meta.db_table
+    old_table = f'{table}_old'
+    quote_name = connection.ops.quote_name
+    now = datetime.utcnow().replace(tzinfo=pytz.utc)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {quote_name(table)} RENAME TO {quote_name(old_table)}')
+        # the index names are unique in the schema, so the old ones are moved out of the way
+        for index in MetricValue._meta.indexes:
+            cursor.execute(f'ALTER INDEX IF EXISTS {quote_name(index.name)} RENAME TO {quote_name(f"{index.name}_old")}')
+        cursor.execute(f'CREATE TABLE {quote_name(table)} (LIKE {quote_name(old_table)} INCLUDING DEFAULTS) '
+                       'PARTITION BY RANGE (valid_from)')
+        # the partition key must be part of the primary key and of the unique constraints
+        cursor.execute(f'ALTER TABLE {quote_name(table)} ADD PRIMARY KEY (id, valid_from)')
+        cursor.execute(f'ALTER TABLE {quote_name(table)} ADD UNIQUE '
+                       f"({', '.join(MetricValue._meta.get_field(f).column for f in MetricValue.KEY_FIELDS)})")
+        for field in MetricValue._meta.concrete_fields:
+            if field.db_index or field.is_relation:
+                cursor.execute(f'CREATE INDEX ON {quote_name(table)} ({quote_name(field.column)})')
+            if field.is_relation:
+                cursor.execute(f'ALTER TABLE {quote_name(table)} ADD FOREIGN KEY ({quote_name(field.column)}) '
+                               f'REFERENCES {quote_name(field.related_model._meta.db_table)} (id) '
+                               'DEFERRABLE INITIALLY DEFERRED')
+        # the composite indexes are created on the parent table with their model names, and
+        # propagated by PostgreSQL to every partition
+        with connection.schema_editor(atomic=False) as schema_editor:
+            for index in MetricValue._meta.indexes:
+                schema_editor.add_index(MetricValue, index)
+        cursor.execute(f'CREATE TABLE {quote_name(f"{table}_default")} PARTITION OF {quote_name(table)} DEFAULT')
+        cursor.execute(f'SELECT MIN(valid_from) FROM {quote_name(old_table)}')
+        since = cursor.fetchone()[0] or now
+        months_ahead_end = now
+        for _ in range(months_ahead):
+            months_ahead_end = _get_next_month(months_ahead_end)
+        create_metric_values_partitions(since, months_ahead_end)
+        cursor.execute(f'INSERT INTO {quote_name(table)} SELECT * FROM {quote_name(old_table)}')
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [old_table])
+        sequence = cursor.fetchone()[0]
+        if sequence:
+            cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY {quote_name(table)}.id')
+        cursor.execute(f'DROP TABLE {quote_name(old_table)}')
+    return True
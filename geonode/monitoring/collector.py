@@ -39,12 +39,15 @@ from geonode.monitoring import MonitoringAppConfig as AppConf
 from geonode.monitoring.models import (Metric, MetricValue, RequestEvent, MonitoredResource,
                                        ExceptionEvent, EventType, NotificationCheck, BuiltIns)
 
-from geonode.monitoring.utils import generate_periods, align_period_start, align_period_end
-from geonode.monitoring.aggregation import (aggregate_past_periods, calculate_rate, calculate_percent,
+from geonode.monitoring.utils import (generate_periods, align_period_start, align_period_end,
+                                      get_metrics_data_cache, get_metrics_data_cache_key,
+                                      invalidate_metrics_data_cache)
+from geonode.monitoring.aggregation import (aggregate_past_periods, aggregate_requests, calculate_rate, calculate_percent,
                                             extract_resources, extract_event_type,
                                             extract_event_types, extract_special_event_types,
                                             get_resources_for_metric, get_labels_for_metric,
-                                            get_metric_names)
+                                            get_metric_names, is_metric_values_partitioned,
+                                            create_metric_values_partitions, drop_metric_values_partitions)
 from geonode.base.models import ResourceBase
 from geonode.utils import parse_datetime
 
@@ -107,7 +110,7 @@ class CollectorAPI:
                      'label': iface_label,
                      'metric': f'{metric_name}.rate'}
             mdata.update(metric_defaults)
-            log.debug(MetricValue.add(**mdata))
+            metric_values.append(dict(mdata))
 
         def get_mem_label(*args):
             return 'B'
@@ -145,6 +148,7 @@ class CollectorAPI:
                      'service': service}
 
         metrics = [m[0] for m in GS_METRIC_MAP.values()]
+        metric_values = []
 
         MetricValue.objects.filter(service_metric__metric__name__in=metrics,
                                    valid_from=valid_from,
@@ -168,7 +172,7 @@ class CollectorAPI:
                      'label': label_function(metric_data) if callable(label_function) else None,
                      'metric': metric_name}
             mdata.update(mdefaults)
-            log.debug(MetricValue.add(**mdata))
+            metric_values.append(dict(mdata))
 
             if callable(processing_function):
                 processing_function(
@@ -177,6 +181,7 @@ class CollectorAPI:
                     mdefaults,
                     metric_name,
                     valid_to)
+        MetricValue.bulk_add(metric_values)
 
     def process_host_geonode(self, service, data, valid_from, valid_to):
         """
@@ -193,6 +198,7 @@ class CollectorAPI:
                      'resource': None,
                      'samples_count': 1,
                      'service': service}
+        metric_values = []
 
         MetricValue.objects.filter(service_metric__metric__name__in=('network.in', 'network.out'),
                                    valid_from=valid_from,
@@ -210,13 +216,13 @@ class CollectorAPI:
                 mdata.update(mdefaults)
                 rate = self._calculate_rate(
                     mdata['metric'], ifname, tx_value, valid_to)
-                log.debug(MetricValue.add(**mdata))
+                metric_values.append(dict(mdata))
                 if rate:
                     mdata['metric'] = f"{mdata['metric']}.rate"
                     mdata['value'] = rate
                     mdata['value_num'] = rate
                     mdata['value_raw'] = rate
-                    log.debug(MetricValue.add(**mdata))
+                    metric_values.append(dict(mdata))
 
         ldata = data['data']['load']
         llabel = ['1', '5', '15']
@@ -241,7 +247,7 @@ class CollectorAPI:
                                        label__name='MB',
                                        service=service)\
                 .delete()
-            log.debug(MetricValue.add(**mdata))
+            metric_values.append(dict(mdata))
 
         MetricValue.objects.filter(service_metric__metric__name__in=('storage.total', 'storage.used', 'storage.free',),
                                    valid_from=valid_from,
@@ -267,7 +273,7 @@ class CollectorAPI:
                          'label': mount,
                          }
                 mdata.update(mdefaults)
-                log.debug(MetricValue.add(**mdata))
+                metric_values.append(dict(mdata))
 
         if ldata:
             for lidx, l in enumerate(ldata):
@@ -285,7 +291,7 @@ class CollectorAPI:
                                            label__name='Value',
                                            service=service)\
                     .delete()
-                log.debug(MetricValue.add(**mdata))
+                metric_values.append(dict(mdata))
 
         uptime = data['data'].get('uptime')
         if uptime is not None:
@@ -301,7 +307,7 @@ class CollectorAPI:
                                        label__name=mdata['label'],
                                        service=service)\
                 .delete()
-            log.debug(MetricValue.add(**mdata))
+            metric_values.append(dict(mdata))
 
         if data['data'].get('cpu'):
             _l = data['data']['cpu']['usage']
@@ -320,7 +326,7 @@ class CollectorAPI:
                                        label__name=mdata['label'],
                                        service=service)\
                 .delete()
-            log.debug(MetricValue.add(**mdata))
+            metric_values.append(dict(mdata))
             rate = self._calculate_rate(
                 mdata['metric'],
                 mdata['label'],
@@ -332,7 +338,7 @@ class CollectorAPI:
                 rate_data['value'] = rate
                 rate_data['value_num'] = rate
                 rate_data['value_raw'] = rate
-                log.debug(MetricValue.add(**rate_data))
+                metric_values.append(dict(rate_data))
 
             percent = self._calculate_percent(
                 mdata['metric'],
@@ -346,10 +352,11 @@ class CollectorAPI:
                 percent_data['value_num'] = percent
                 percent_data['value_raw'] = percent
                 percent_data['label'] = 'Value'
-                log.debug(MetricValue.add(**percent_data))
+                metric_values.append(dict(percent_data))
 
             mdata.update(mdefaults)
-            log.debug(MetricValue.add(**mdata))
+            metric_values.append(dict(mdata))
+        MetricValue.bulk_add(metric_values)
 
     def get_labels_for_metric(self, metric_name, resource=None):
         return get_labels_for_metric(metric_name, resource)
@@ -511,85 +518,13 @@ class CollectorAPI:
         log.debug("Processing batch of %s requests from %s to %s", requests.count(), valid_from, valid_to)
         if not requests.count():
             return
-        event_all = EventType.objects.get(name=EventType.EVENT_ALL)
-        metric_defaults = {'valid_from': valid_from,
-                           'valid_to': valid_to,
-                           'event_type': event_all,
-                           'resource': None,
-                           'service': service}
         MetricValue.objects.filter(
             valid_from__gte=valid_from,
             valid_to__lte=valid_to,
             service=service).delete()
         requests = requests.filter(service=service)
-        resources = self.extract_resources(requests)
-
-        def push_metric_values(srequests, **mdefaults):
-
-            count = srequests.count()
-            count_mdefaults = mdefaults.copy()
-            count_mdefaults['value'] = count
-            count_mdefaults['label'] = 'Count'
-            count_mdefaults['value_num'] = count
-            count_mdefaults['value_raw'] = count
-            count_mdefaults['samples_count'] = count
-
-            log.debug(MetricValue.add('request.count', **count_mdefaults))
-
-            paths = srequests.distinct('request_path') \
-                .values_list('request_path', flat=True)
-            for path in paths:
-                count = srequests.filter(request_path=path).count()
-                count_mdefaults['value'] = count
-                count_mdefaults['label'] = path
-                count_mdefaults['value_num'] = count
-                count_mdefaults['value_raw'] = count
-                count_mdefaults['samples_count'] = count
-
-                log.debug(MetricValue.add('request.path', **count_mdefaults))
-
-            for mname, cname in (('request.ip', 'client_ip',),
-                                 ('request.users', 'user_identifier',),
-                                 ('request.country', 'client_country'),
-                                 ('request.city', 'client_city',),
-                                 ('request.region', 'client_region'),
-                                 ('request.ua', 'user_agent',),
-                                 ('request.ua.family', 'user_agent_family',),
-                                 ('response.time', 'response_time',),
-                                 ('response.size', 'response_size',),
-                                 ('response.status', 'response_status',),
-                                 ('request.method', 'request_method',),
-                                 ):
-                # calculate overall stats
-                self.set_metric_values(mname, cname, srequests, **mdefaults)
-
-            self.set_error_values(
-                srequests,
-                valid_from,
-                valid_to,
-                service=service,
-                resource=None)
-
-        push_metric_values(requests, **metric_defaults)
-
-        # for each resource we should calculate another set of stats
-        for resource, _requests in [(None, requests,)] + resources:
-
-            metric_defaults['resource'] = resource
-            metric_defaults['event_type'] = event_all
-            push_metric_values(_requests, **metric_defaults)
-
-            # for each event type we need separate metrics set
-            event_types = self.extract_event_types(_requests)
-            for event_type in event_types:
-                event_type_requests = _requests.filter(event_type=event_type)
-                metric_defaults['event_type'] = event_type
-                push_metric_values(event_type_requests, **metric_defaults)
-
-            # combined event types: ows and non-ows
-            for evt, rq in self.extract_special_event_types(_requests):
-                metric_defaults['event_type'] = evt
-                push_metric_values(rq, **metric_defaults)
+        metric_values = aggregate_requests(service, requests, valid_from, valid_to)
+        log.debug("Stored %s metric values", MetricValue.bulk_add(metric_values))
 
     def get_metrics_for(self, metric_name,
                         valid_from=None,
@@ -602,9 +537,13 @@ class CollectorAPI:
                         event_type=None,
                         service_type=None,
                         group_by=None,
-                        resource_type=None):
+                        resource_type=None,
+                        align=False):
         """
         Returns metric data for given metric. Returned dataset contains list of periods and values in that periods
+
+        With 'align' the periods are aligned to the interval, so that the requests of a moving time span,
+        as the dashboard ones ending now, share the cached data of their common periods.
         """
         utc = pytz.utc
 
@@ -632,6 +571,8 @@ class CollectorAPI:
                'type': metric.type,
                'axis_label': metric.unit,
                'data': []}
+        if align:
+            valid_from = align_period_start(valid_from, interval)
         periods = generate_periods(valid_from, interval, valid_to, align=False)
         for pstart, pend in periods:
             pdata = self.get_metrics_data(metric_name, pstart, pend,
@@ -676,8 +617,40 @@ class CollectorAPI:
                          service_type=None,
                          group_by=None):
         """
-        Returns metric values for metric within given time span
+        Returns metric values for metric within given time span.
+
+        The results are cached in the settings.MONITORING_DATA_CACHE cache, until metric
+        values overlapping the time span are written.
         """
+        kwargs = dict(service=service, label=label, user=user, resource=resource, resource_type=resource_type,
+                      event_type=event_type, service_type=service_type, group_by=group_by)
+        cache_key = None
+        # uptime is not filtered by time span
+        if metric_name != 'uptime':
+            cache_key = get_metrics_data_cache_key(
+                valid_from, valid_to, metric_name, interval,
+                *[getattr(v, 'id', v) for v in kwargs.values()])
+        if cache_key:
+            data = get_metrics_data_cache().get(cache_key)
+            if data is not None:
+                return data
+        data = self._get_metrics_data(metric_name, valid_from, valid_to, interval, **kwargs)
+        if cache_key:
+            get_metrics_data_cache().set(cache_key, data, getattr(settings, 'MONITORING_DATA_CACHE_TIMEOUT', 300))
+        return data
+
+    def _get_metrics_data(self, metric_name,
+                          valid_from,
+                          valid_to,
+                          interval,
+                          service=None,
+                          label=None,
+                          user=None,
+                          resource=None,
+                          resource_type=None,
+                          event_type=None,
+                          service_type=None,
+                          group_by=None):
         utc = pytz.utc
         params = {}
         col = 'mv.value_num'
@@ -968,10 +941,16 @@ class CollectorAPI:
         if not isinstance(threshold, timedelta):
             raise TypeError("MONITORING_DATA_TTL should be an instance of "
                             f"datatime.timedelta, not {threshold.__class__}")
-        cutoff = datetime.utcnow().replace(tzinfo=utc) - threshold
+        now = datetime.utcnow().replace(tzinfo=utc)
+        cutoff = now - threshold
         ExceptionEvent.objects.filter(created__lte=cutoff).delete()
         RequestEvent.objects.filter(created__lte=cutoff).delete()
+        if is_metric_values_partitioned():
+            log.debug("Dropped partitions: %s", drop_metric_values_partitions(cutoff))
+            months_ahead = getattr(settings, 'MONITORING_DATA_PARTITIONS_AHEAD', 2)
+            create_metric_values_partitions(now, now + timedelta(days=31 * months_ahead))
         MetricValue.objects.filter(valid_to__lte=cutoff).delete()
+        invalidate_metrics_data_cache()
 
     def compose_notifications(self, ndata, when=None):
         utc = pytz.utc
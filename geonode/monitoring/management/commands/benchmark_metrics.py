@@ -0,0 +1,105 @@
+#########################################################################
+#
+# Copyright (C) 2021 OSGeo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#########################################################################
+import time
+import pytz
+import logging
+
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.test.utils import override_settings
+from django.core.management.base import BaseCommand
+from django.utils.translation import ugettext_noop as _
+
+from geonode.monitoring.collector import CollectorAPI
+
+logger = logging.getLogger(__name__)
+
+# metrics queries issued by a load of the monitoring dashboard
+DASHBOARD_QUERIES = (
+    ('request.count', None),
+    ('request.count', 'resource'),
+    ('request.count', 'event_type'),
+    ('request.count', 'count_on_resource'),
+    ('request.count', 'resource_on_user'),
+    ('request.users', 'user'),
+    ('request.users', 'user_on_label'),
+    ('request.ip', 'label'),
+    ('request.country', None),
+    ('request.ua.family', None),
+    ('response.time', None),
+    ('response.size', None),
+    ('response.error.count', None),
+    ('cpu.usage.percent', None),
+    ('mem.usage.percent', None),
+)
+
+
+class Command(BaseCommand):
+    """
+    Measures the time spent by the metrics queries of the monitoring dashboard,
+    without the metrics data cache, with a cold and a warm cache.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('-d', '--days', dest='days', type=int, default=1,
+                            help=_("Time span of the queries, in days before now (default: 1)"))
+        parser.add_argument('-i', '--interval', dest='interval', type=int, default=3600,
+                            help=_("Queries interval in seconds (default: 3600)"))
+        parser.add_argument('-r', '--repeat', dest='repeat', type=int, default=3,
+                            help=_("Number of dashboard loads for each run (default: 3)"))
+
+    def handle(self, *args, **options):
+        # Exit early if MONITORING_ENABLED=False
+        if not settings.MONITORING_ENABLED:
+            return
+        self.collector = CollectorAPI()
+        valid_to = datetime.utcnow().replace(tzinfo=pytz.utc)
+        valid_from = valid_to - timedelta(days=options['days'])
+        interval = timedelta(seconds=options['interval'])
+
+        with override_settings(MONITORING_DATA_CACHE=''):
+            timings = self.load_dashboard(valid_from, valid_to, interval, options['repeat'])
+        self.report('no cache', timings)
+        if not settings.MONITORING_DATA_CACHE:
+            return
+        # a new period is used, so that the first load runs on a cold cache
+        valid_to = valid_to + timedelta(seconds=1)
+        timings = self.load_dashboard(valid_from, valid_to, interval, 1)
+        self.report('cold cache', timings)
+        timings = self.load_dashboard(valid_from, valid_to, interval, options['repeat'])
+        self.report('warm cache', timings)
+
+    def load_dashboard(self, valid_from, valid_to, interval, repeat):
+        timings = []
+        for _i in range(repeat):
+            start = time.perf_counter()
+            for metric_name, group_by in DASHBOARD_QUERIES:
+                try:
+                    self.collector.get_metrics_for(metric_name, valid_from=valid_from, valid_to=valid_to,
+                                                   interval=interval, group_by=group_by)
+                except Exception as e:
+                    logger.debug("Cannot query %s (%s): %s", metric_name, group_by, e)
+            timings.append(time.perf_counter() - start)
+        return timings
+
+    def report(self, name, timings):
+        self.stdout.write(
+            f"{name}: {len(timings)} dashboard loads, "
+            f"avg {sum(timings) / len(timings):.3f}s, min {min(timings):.3f}s, max {max(timings):.3f}s")
@@ -0,0 +1,56 @@
+#########################################################################
+#
+# Copyright (C) 2021 OSGeo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#########################################################################
+import logging
+
+from django.conf import settings
+from django.db import connection
+from django.core.management.base import BaseCommand
+from django.utils.translation import ugettext_noop as _
+
+from geonode.monitoring.aggregation import (
+    partition_metric_values,
+    is_metric_values_partitioned,
+    get_metric_values_partitions)
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    Converts the monitoring MetricValues table to a layout partitioned by month,
+    so that old data is cleared by dropping whole partitions.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('-m', '--months-ahead', dest='months_ahead', type=int,
+                            default=settings.MONITORING_DATA_PARTITIONS_AHEAD,
+                            help=_("Number of future monthly partitions to be created"))
+
+    def handle(self, *args, **options):
+        # Exit early if MONITORING_ENABLED=False
+        if not settings.MONITORING_ENABLED:
+            return
+        if connection.vendor != 'postgresql':
+            logger.error("The partitioned layout is available on PostgreSQL only")
+            return
+        if is_metric_values_partitioned():
+            logger.info("MetricValues table is already partitioned")
+        else:
+            partition_metric_values(months_ahead=options['months_ahead'])
+        logger.info("MetricValues partitions: %s", ', '.join(name for name, _ in get_metric_values_partitions()))
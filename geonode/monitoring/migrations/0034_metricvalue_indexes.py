@@ -0,0 +1,21 @@
+# Generated by Django 3.2.7 on 2021-12-06 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0033_alter_monitoredresource_type'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='metricvalue',
+            index=models.Index(fields=['service_metric', 'valid_from', 'valid_to'], name='monitoring_mv_metric_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='metricvalue',
+            index=models.Index(fields=['resource', 'valid_from'], name='monitoring_mv_resource_idx'),
+        ),
+    ]
@@ -20,6 +20,9 @@
 import logging
 import types
 import pytz
+import threading
+import traceback
+from collections import OrderedDict
 from urllib.parse import urlparse
 
 from socket import gethostbyname
@@ -27,7 +30,7 @@ from datetime import datetime, timedelta
 from decimal import Decimal
 
 from django import forms
-from django.db import models
+from django.db import models, transaction, connection
 from django.conf import settings
 from django.http import Http404
 
@@ -68,6 +71,72 @@ def get_geoip():
     return GEOIP_DB
 
 
+class LRUCache:
+    """
+    Thread-safe, size-bounded in-memory mapping which evicts the least recently used
+    entries first. It keeps track of its hits, misses and evictions.
+    """
+
+    _missing = object()
+
+    def __init__(self, maxsize=1000):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._data.get(key, self._missing)
+            if value is self._missing:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            self._evict()
+
+    def resize(self, maxsize):
+        with self._lock:
+            self.maxsize = maxsize
+            self._evict()
+
+    def _evict(self):
+        while len(self._data) > max(self.maxsize, 0):
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+
 class Host(models.Model):
 
     """
@@ -532,18 +601,90 @@ class RequestEvent(models.Model):
         Returns event type based on events
         """
         rqmeta = getattr(request, '_monitoring', {})
-        events = {e[0] for e in rqmeta['events']}
+        return EventType.get(cls._get_event_name(rqmeta['events'], default_event_type))
+
+    @staticmethod
+    def _get_event_name(events, default_event_type='view'):
+        """
+        Returns event type name based on events
+        """
+        events = {e[0] for e in events}
         event_name = default_event_type
         if len(events) == 1:
             event_name = events.pop()
         elif len(events) == 2 and default_event_type in events:
             events.remove(default_event_type)
             event_name = events.pop()
-        return EventType.get(event_name)
+        return event_name
 
-    @staticmethod
-    def _get_ua_family(ua):
-        return str(user_agents.parse(ua))
+    # caches of the resolved user agent families and client locations, most of the
+    # requests come from a few clients
+    _ua_family_cache = LRUCache(getattr(settings, 'MONITORING_USER_AGENT_CACHE_SIZE', 5000))
+    _user_location_cache = LRUCache(getattr(settings, 'MONITORING_GEOIP_CACHE_SIZE', 10000))
+    _user_data_caches_warmed = False
+
+    @classmethod
+    def get_user_data_caches_stats(cls):
+        return {
+            'user_agent': cls._ua_family_cache.stats(),
+            'geoip': cls._user_location_cache.stats()
+        }
+
+    @classmethod
+    def clear_user_data_caches(cls):
+        cls._ua_family_cache.clear()
+        cls._user_location_cache.clear()
+
+    @classmethod
+    def warm_user_data_caches(cls, limit=None):
+        """
+        Fills the user agent and client location caches with the most recent values
+        already resolved and stored in the request events.
+        """
+        if limit is None:
+            limit = getattr(settings, 'MONITORING_USER_DATA_CACHE_WARMUP', 0)
+        cls._user_data_caches_warmed = True
+        if not limit:
+            return 0
+        warmed = 0
+        qs = cls.objects.exclude(user_agent__isnull=True).exclude(user_agent='')\
+            .exclude(user_agent_family__isnull=True)\
+            .values_list('user_agent', 'user_agent_family').order_by('-created')
+        for ua, ua_family in qs[:limit].iterator():
+            if ua not in cls._ua_family_cache:
+                cls._ua_family_cache.set(ua, ua_family)
+                warmed += 1
+        qs = cls.objects.exclude(client_ip__isnull=True).exclude(client_country__isnull=True)\
+            .values_list('client_ip', 'client_lat', 'client_lon', 'client_country', 'client_region', 'client_city')\
+            .order_by('-created')
+        for ip, lat, lon, country, region, city in qs[:limit].iterator():
+            if ip not in cls._user_location_cache:
+                cls._user_location_cache.set(ip, {'client_ip': ip,
+                                                  'client_lat': lat,
+                                                  'client_lon': lon,
+                                                  'client_country': country,
+                                                  'client_region': region,
+                                                  'client_city': city})
+                warmed += 1
+        return warmed
+
+    @classmethod
+    def _warm_user_data_caches(cls):
+        if cls._user_data_caches_warmed:
+            return
+        try:
+            cls.warm_user_data_caches()
+        except Exception as e:
+            log.warning("Cannot warm the user data caches: %s", e)
+
+    @classmethod
+    def _get_ua_family(cls, ua):
+        cls._warm_user_data_caches()
+        ua_family = cls._ua_family_cache.get(ua)
+        if ua_family is None:
+            ua_family = str(user_agents.parse(ua))
+            cls._ua_family_cache.set(ua, ua_family)
+        return ua_family
 
     @classmethod
     def _get_user_agent(cls, ua):
@@ -560,13 +701,29 @@ class RequestEvent(models.Model):
 
     @classmethod
     def _get_user_location(cls, request_ip):
+        if not request_ip or request_ip in ('127.0.0.1',):
+            return {}
+        cls._warm_user_data_caches()
+        out = cls._user_location_cache.get(request_ip)
+        if out is None:
+            out = cls._resolve_user_location(request_ip)
+            if out is not None:
+                cls._user_location_cache.set(request_ip, out)
+        return dict(out or {})
+
+    @classmethod
+    def _resolve_user_location(cls, request_ip):
+        """
+        Returns the client location of the ip from the GeoIP database,
+        or None if the database is not available.
+        """
         out = {}
         lat = lon = None
         country = region = city = None
         if request_ip:
             geoip = get_geoip()
-            if request_ip in ('127.0.0.1',):
-                return out
+            if geoip is None:
+                return None
             try:
                 client_loc = geoip.city(request_ip)
             except Exception as err:
@@ -604,36 +761,35 @@ class RequestEvent(models.Model):
         if rqmeta.get('user_username'):
             out['user_username'] = rqmeta.get('user_username')
 
-        ua = request.META.get('HTTP_USER_AGENT') or ''
-        ua_data = cls._get_user_agent(ua)
-        out.update(ua_data)
+        out['user_agent'] = request.META.get('HTTP_USER_AGENT') or ''
 
         request_ip, is_routable = get_client_ip(request)
         if request_ip and is_routable:
-            location_data = cls._get_user_location(request_ip)
-            out.update(location_data)
+            out['client_ip'] = request_ip
         return out
 
     @classmethod
-    def _get_user_data_gs(cls, request):
-        out = {}
-
-        # check consent
-        # if not cls._get_user_consent(request):
-        #    return out
-
-        ua = request.get('remoteUserAgent') or ''
-        ua_data = cls._get_user_agent(ua)
-        out.update(ua_data)
-
-        request_ip = request.get('remoteAddr')
+    def _resolve_user_data(cls, user_data):
+        """
+        Completes the user data of a request with the user agent family and the client location
+        """
+        out = dict(user_data)
+        if 'user_agent' in out:
+            out.update(cls._get_user_agent(out['user_agent']))
+        request_ip = out.pop('client_ip', None)
         if request_ip:
-            location_data = cls._get_user_location(request_ip)
-            out.update(location_data)
+            out.update(cls._get_user_location(request_ip))
         return out
 
     @classmethod
-    def from_geonode(cls, service, request, response):
+    def get_geonode_record(cls, service, request, response, exc_info=None):
+        """
+        Returns the plain data of a GeoNode request needed to write its RequestEvent
+        with 'from_geonode_records'.
+
+        It doesn't hit the database nor resolves the client location, so it is cheap
+        enough to be called within the request/response cycle.
+        """
         from geonode.utils import parse_datetime
 
         received = datetime.utcnow().replace(tzinfo=pytz.utc)
@@ -647,41 +803,10 @@ class RequestEvent(models.Model):
                 tzinfo=pytz.utc))
         duration = (_ended - created).microseconds / 1000.0
 
-        sensitive_data = cls._get_user_data_gn(request)
-        event_type = cls._get_event_type(request)
-
-        # ua = request.META.get('HTTP_USER_AGENT') or ''
-        # ua_family = cls._get_ua_family(ua)
-        #
-        # ip, is_routable = get_client_ip(request)
-        # lat = lon = None
-        # country = region = city = None
-        # if ip and is_routable:
-        #     ip = ip.split(':')[0]
-        #     if settings.TEST and ip == 'testserver':
-        #         ip = '127.0.0.1'
-        #     try:
-        #         ip = gethostbyname(ip)
-        #     except Exception as err:
-        #         pass
-        #
-        #     geoip = get_geoip()
-        #     try:
-        #         client_loc = geoip.city(ip)
-        #     except Exception as err:
-        #         log.warning("Cannot resolve %s: %s", ip, err)
-        #         client_loc = None
-        #
-        #     if client_loc:
-        #         lat, lon = client_loc['latitude'], client_loc['longitude'],
-        #         country = client_loc.get(
-        #             'country_code3') or client_loc['country_code']
-        #         if len(country) == 2:
-        #             _c = pycountry.countries.get(alpha_2=country)
-        #             country = _c.alpha_3
-        #
-        #         region = client_loc['region']
-        #         city = client_loc['city']
+        if getattr(response, 'streaming', False):
+            response_size = response.get('Content-length') or 0
+        else:
+            response_size = response.get('Content-length') or len(response.getvalue())
 
         data = {'received': received,
                 'created': created,
@@ -689,31 +814,87 @@ class RequestEvent(models.Model):
                 'service': service,
                 'user_identifier': None,
                 'user_username': None,
-                'event_type': event_type,
                 'request_path': request.get_full_path(),
                 'request_method': request.method,
                 'response_status': response.status_code,
-                'response_size':
-                    response.get('Content-length') or len(response.getvalue()),
+                'response_size': response_size,
                 'response_type': response.get('Content-type'),
                 'response_time': duration}
 
-        data.update(sensitive_data)
+        exception = None
+        if exc_info:
+            _cls = exc_info[1].__class__
+            error_type = f'{_cls.__module__}.{_cls.__name__}'
+            exception = {'error_type': error_type,
+                         'error_message': error_type,
+                         'error_data': ''.join(traceback.format_exception(*exc_info))}
+
+        return {'data': data,
+                'user_data': cls._get_user_data_gn(request),
+                'event_type': cls._get_event_name(rqmeta['events']),
+                'resources': [(res_name, res_type, res_id) for _, res_type, res_name, res_id in rqmeta['events']],
+                'exception': exception}
 
+    @classmethod
+    def from_geonode_records(cls, records):
+        """
+        Writes in bulk the RequestEvents of the records returned by 'get_geonode_record'
+        or 'get_geoserver_record', along with their resources and ExceptionEvents.
+        """
+        event_types = {}
+        events = []
+        for record in records:
+            event_name = record['event_type']
+            if event_name not in event_types:
+                event_types[event_name] = EventType.get(event_name)
+            data = dict(record['data'], event_type=event_types[event_name])
+            data.update(cls._resolve_user_data(record['user_data']))
+            events.append(cls(**data))
+
+        with transaction.atomic():
+            if connection.features.can_return_rows_from_bulk_insert:
+                events = cls.objects.bulk_create(events)
+            else:
+                for event in events:
+                    event.save()
+
+            resources = {}
+            requests_resources = []
+            exceptions = []
+            for event, record in zip(events, records):
+                for res_name, res_type, res_id in record['resources']:
+                    if (res_name, res_type) not in resources:
+                        resources[(res_name, res_type)], _ = MonitoredResource.objects.get_or_create(
+                            name=res_name, type=res_type)
+                    r = resources[(res_name, res_type)]
+                    if res_id and r.resource_id != res_id:
+                        r.resource_id = res_id
+                        r.save()
+                    requests_resources.append(
+                        cls.resources.through(requestevent_id=event.id, monitoredresource_id=r.id))
+                if record['exception']:
+                    exceptions.append(
+                        ExceptionEvent(created=event.received,
+                                       received=event.received,
+                                       service=event.service,
+                                       request=event,
+                                       **record['exception']))
+            cls.resources.through.objects.bulk_create(requests_resources, ignore_conflicts=True)
+            ExceptionEvent.objects.bulk_create(exceptions)
+        return events
+
+    @classmethod
+    def from_geonode(cls, service, request, response):
         try:
-            inst = cls.objects.create(**data)
-            resources = cls._get_geonode_resources(request)
-            if resources:
-                inst.resources.add(*resources)
-                inst.save()
-            return inst
+            return cls.from_geonode_records([cls.get_geonode_record(service, request, response)])[0]
         except Exception:
             return None
 
     @classmethod
-    def from_geoserver(cls, service, request_data, received=None):
+    def get_geoserver_record(cls, service, request_data, received=None):
         """
-        Writes RequestEvent for data from audit log in GS
+        Returns the plain data of a request from the audit log in GS, to be written
+        with 'from_geonode_records', or None if the request is not finished.
         """
         from dateutil.tz import tzlocal
         from geonode.utils import parse_datetime
@@ -727,31 +908,6 @@ class RequestEvent(models.Model):
             return
         received = received or datetime.utcnow().replace(tzinfo=pytz.utc)
 
-        sensitive_data = cls._get_user_data_gs(rd)
-
-        # ua = rd.get('remoteUserAgent') or ''
-        # ua_family = cls._get_ua_family(ua)
-        # ip = rd['remoteAddr']
-        # lat = lon = None
-        # country = region = city = None
-        # if ip:
-        #     geoip = get_geoip()
-        #     try:
-        #         client_loc = geoip.city(ip)
-        #     except Exception as err:
-        #         log.warning("Cannot resolve %s: %s", ip, err)
-        #         client_loc = None
-        #
-        #     if client_loc:
-        #         lat, lon = client_loc['latitude'], client_loc['longitude'],
-        #         country = client_loc.get(
-        #             'country_code3') or client_loc['country_code']
-        #         if len(country) == 2:
-        #             _c = pycountry.countries.get(alpha_2=country)
-        #             country = _c.alpha_3
-        #         region = client_loc['region']
-        #         city = client_loc['city']
-
         utc = pytz.utc
         try:
             local_tz = pytz.timezone(datetime.now(tzlocal()).tzname())
@@ -765,9 +921,9 @@ class RequestEvent(models.Model):
         rl = rd['responseLength']
         event_type_name = rd.get('service')
         if event_type_name:
-            event_type = EventType.get(f'OWS:{event_type_name.upper()}')
+            event_type_name = f'OWS:{event_type_name.upper()}'
         else:
-            event_type = EventType.get(EventType.EVENT_GEOSERVER)
+            event_type_name = EventType.EVENT_GEOSERVER
 
         if rd.get('queryString'):
             request_path = f"{rd['path']}?{rd['queryString']}"
@@ -776,7 +932,6 @@ class RequestEvent(models.Model):
         data = {'created': start_time,
                 'received': received,
                 'host': rd['host'],
-                'event_type': event_type,
                 'service': service,
                 'request_path': request_path,
                 'request_method': rd['httpMethod'],
@@ -784,35 +939,47 @@ class RequestEvent(models.Model):
                 'response_size': rl[0] if isinstance(rl, list) else rl,
                 'response_type': rd.get('responseContentType'),
                 'response_time': rd['totalTime']}
-        data.update(sensitive_data)
 
-        inst = cls.objects.create(**data)
+        # check consent
+        # if not cls._get_user_consent(request):
+        #    user_data = {}
+        user_data = {'user_agent': rd.get('remoteUserAgent') or ''}
+        if rd.get('remoteAddr'):
+            user_data['client_ip'] = rd['remoteAddr']
+
         resource_names = (rd.get('resources') or {}).get('string') or []
         if not isinstance(resource_names, (list, tuple)):
             resource_names = [resource_names]
-        resources = cls._get_resources('layer', resource_names)
+
+        exception = None
         if rd.get('error'):
+            error = rd['error']
+            emessage = error['detailMessage'] if 'detailMessage' in error else str(error)
             try:
-                etype = rd[
-                    'error'][
-                        '@class'] if '@class' in rd[
-                            'error'] else rd[
-                                'error'][
-                    'class']
-                edata = '\n'.join(rd['error']['stackTrace']['trace'])
-                emessage = rd['error']['detailMessage'] if 'detailMessage' in rd['error'] else str(rd['error'])
-                ExceptionEvent.add_error(
-                    service, etype, edata, message=emessage, request=inst)
-            except Exception:
-                emessage = rd['error']['detailMessage'] if 'detailMessage' in rd['error'] else str(rd['error'])
-                ExceptionEvent.add_error(service, 'undefined',
-                                         '\n'.join(
-                                             rd['error']['stackTrace']['trace']),
-                                         message=emessage, request=inst)
-        if resources:
-            inst.resources.add(*resources)
-            inst.save()
-        return inst
+                etype = error['@class'] if '@class' in error else error['class']
+            except KeyError:
+                etype = 'undefined'
+            trace = (error.get('stackTrace') or {}).get('trace') or []
+            if not isinstance(trace, (list, tuple)):
+                trace = [trace]
+            exception = {'error_type': etype,
+                         'error_message': emessage,
+                         'error_data': '\n'.join(trace)}
+
+        return {'data': data,
+                'user_data': user_data,
+                'event_type': event_type_name,
+                'resources': [(res_name, 'layer', None) for res_name in resource_names if res_name is not None],
+                'exception': exception}
+
+    @classmethod
+    def from_geoserver(cls, service, request_data, received=None):
+        """
+        Writes RequestEvent for data from audit log in GS
+        """
+        record = cls.get_geoserver_record(service, request_data, received=received)
+        if record:
+            return cls.from_geonode_records([record])[0]
 
 
 class ExceptionEvent(models.Model):
@@ -940,6 +1107,10 @@ class MetricValue(models.Model):
              'label',
              'event_type',
              ))
+        indexes = [
+            models.Index(fields=['service_metric', 'valid_from', 'valid_to'], name='monitoring_mv_metric_idx'),
+            models.Index(fields=['resource', 'valid_from'], name='monitoring_mv_resource_idx'),
+        ]
 
     def __str__(self):
         metric = self.service_metric.metric.name
@@ -998,9 +1169,11 @@ class MetricValue(models.Model):
                 inst.value_num = abs(value_num) if value_num else 0
                 inst.samples_count = samples_count or 0
                 inst.save()
+                cls._invalidate_data_cache(valid_from, valid_to)
                 return inst
         except cls.DoesNotExist:
             pass
+        cls._invalidate_data_cache(valid_from, valid_to)
         return cls.objects.create(
             valid_from=valid_from,
             valid_to=valid_to,
@@ -1015,6 +1188,177 @@ class MetricValue(models.Model):
             samples_count=samples_count or 0,
             data=data or {})
 
+    # key of the MetricValue rows, as in Meta.unique_together
+    KEY_FIELDS = ('valid_from', 'valid_to', 'service_id', 'service_metric_id', 'resource_id', 'label_id', 'event_type_id',)
+    VALUE_FIELDS = ('value', 'value_raw', 'value_num', 'samples_count', 'data',)
+
+    # in-process caches of the lookup dimensions: service metrics, labels and event types ids
+    _dimensions_cache = {}
+    _dimensions_cache_lock = threading.Lock()
+    DIMENSIONS_CACHE_MAX_SIZE = 10000
+
+    @classmethod
+    def clear_dimensions_cache(cls):
+        with cls._dimensions_cache_lock:
+            cls._dimensions_cache.clear()
+
+    @classmethod
+    def _get_dimension(cls, key, getter):
+        with cls._dimensions_cache_lock:
+            if key in cls._dimensions_cache:
+                return cls._dimensions_cache[key]
+        value = getter()
+        with cls._dimensions_cache_lock:
+            if len(cls._dimensions_cache) >= cls.DIMENSIONS_CACHE_MAX_SIZE:
+                cls._dimensions_cache.clear()
+            cls._dimensions_cache[key] = value
+        return value
+
+    @classmethod
+    def _get_service_metric_id(cls, service, metric):
+        if isinstance(metric, Metric):
+            return cls._get_dimension(
+                ('service_metric', service.service_type_id, metric.id,),
+                lambda: ServiceTypeMetric.objects.get(service_type_id=service.service_type_id, metric=metric).id)
+        return cls._get_dimension(
+            ('service_metric', service.service_type_id, metric,),
+            lambda: ServiceTypeMetric.objects.get(service_type_id=service.service_type_id, metric__name=metric).id)
+
+    @classmethod
+    def _get_label_id(cls, label):
+        if isinstance(label, MetricLabel):
+            return label.id
+        label_name = label
+        label_user = None
+        if label and isinstance(label, tuple):
+            label_name = label[0]
+            label_user = label[1]
+        label_name = str(label_name or 'count')
+
+        def get_label_id():
+            try:
+                label, c = MetricLabel.objects.get_or_create(name=label_name)
+            except MetricLabel.MultipleObjectsReturned:
+                c = False
+                label = MetricLabel.objects.filter(name=label_name).first()
+            if c and label_user:
+                label.user = label_user
+                label.save()
+            return label.id
+        return cls._get_dimension(('label', label_name,), get_label_id)
+
+    @classmethod
+    def _get_event_type_id(cls, event_type):
+        if not event_type:
+            return None
+        if isinstance(event_type, EventType):
+            return event_type.id
+
+        def get_event_type_id():
+            _event_type = EventType.get(event_type)
+            return _event_type.id if _event_type else None
+        return cls._get_dimension(('event_type', event_type,), get_event_type_id)
+
+    @classmethod
+    def bulk_add(cls, rows, batch_size=1000):
+        """
+        Creates or updates in bulk a list of MetricValues, each one given by the keyword arguments
+        of 'add'. The dimensions can be given by id as well, through the "<field>_id" keys.
+
+        The lookup dimensions are resolved through in-process caches, and on PostgreSQL the rows
+        are written with one "INSERT ... ON CONFLICT DO UPDATE" statement per batch.
+        """
+        values = {}
+        for row in rows:
+            service = row.get('service')
+            resource = row.get('resource')
+            value_raw = row.get('value_raw')
+            if value_raw is None:
+                value_raw = row.get('value') or 0
+            inst = cls(valid_from=row['valid_from'],
+                       valid_to=row['valid_to'],
+                       service_id=row['service_id'] if 'service_id' in row else service.id,
+                       service_metric_id=row['service_metric_id'] if 'service_metric_id' in row else
+                       cls._get_service_metric_id(service, row['metric']),
+                       resource_id=row['resource_id'] if 'resource_id' in row else resource.id if resource else None,
+                       label_id=row['label_id'] if 'label_id' in row else cls._get_label_id(row.get('label')),
+                       event_type_id=row['event_type_id'] if 'event_type_id' in row else
+                       cls._get_event_type_id(row.get('event_type')),
+                       value=value_raw,
+                       value_raw=value_raw,
+                       value_num=row.get('value_num'),
+                       samples_count=row.get('samples_count') or 0,
+                       data=row.get('data') or {})
+            # the last value wins, as with subsequent calls to 'add'
+            values[tuple(getattr(inst, f) for f in cls.KEY_FIELDS)] = inst
+
+        # the rows with a NULL key field never conflict on the unique constraint
+        upserts = {}
+        if connection.vendor == 'postgresql':
+            upserts = {key: inst for key, inst in values.items() if None not in key}
+        others = [inst for key, inst in values.items() if key not in upserts]
+        upserts = list(upserts.values())
+
+        with transaction.atomic():
+            for idx in range(0, len(upserts), batch_size):
+                cls._upsert(upserts[idx:idx + batch_size])
+            for idx in range(0, len(others), batch_size):
+                cls._update_or_create(others[idx:idx + batch_size])
+            if values:
+                cls._invalidate_data_cache(min(inst.valid_from for inst in values.values()),
+                                           max(inst.valid_to for inst in values.values()))
+        return len(values)
+
+    @staticmethod
+    def _invalidate_data_cache(valid_from, valid_to):
+        """
+        Invalidates the cached metrics data of the period once the current transaction is committed
+        """
+        from geonode.monitoring.utils import invalidate_metrics_data_cache
+        transaction.on_commit(lambda: invalidate_metrics_data_cache(valid_from, valid_to))
+
+    @classmethod
+    def _upsert(cls, values):
+        fields = cls.KEY_FIELDS + cls.VALUE_FIELDS
+        opts = cls._meta
+        quote_name = connection.ops.quote_name
+        columns = ', '.join(quote_name(opts.get_field(f).column) for f in fields)
+        keys = ', '.join(quote_name(opts.get_field(f).column) for f in cls.KEY_FIELDS)
+        updates = ', '.join(
+            f'{quote_name(opts.get_field(f).column)} = EXCLUDED.{quote_name(opts.get_field(f).column)}'
+            for f in cls.VALUE_FIELDS)
+        placeholders = f"({', '.join(['%s'] * len(fields))})"
+        params = []
+        for inst in values:
+            params.extend(opts.get_field(f).get_db_prep_save(getattr(inst, f), connection) for f in fields)
+        sql = (f'INSERT INTO {quote_name(opts.db_table)} ({columns}) '
+               f"VALUES {', '.join([placeholders] * len(values))} "
+               f'ON CONFLICT ({keys}) DO UPDATE SET {updates}')
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+    @classmethod
+    def _update_or_create(cls, values):
+        existing = {}
+        q = cls.objects.filter(
+            valid_from__in={inst.valid_from for inst in values},
+            valid_to__in={inst.valid_to for inst in values},
+            service_id__in={inst.service_id for inst in values},
+            service_metric_id__in={inst.service_metric_id for inst in values})
+        for _id, *key in q.values_list('id', *cls.KEY_FIELDS):
+            existing[tuple(key)] = _id
+        to_update = []
+        to_create = []
+        for inst in values:
+            _id = existing.get(tuple(getattr(inst, f) for f in cls.KEY_FIELDS))
+            if _id:
+                inst.id = _id
+                to_update.append(inst)
+            else:
+                to_create.append(inst)
+        cls.objects.bulk_update(to_update, cls.VALUE_FIELDS)
+        cls.objects.bulk_create(to_create)
+
     @classmethod
     def get_for(cls, metric, service=None, valid_on=None,
                 resource=None, label=None, event_type=None):
@@ -22,6 +22,8 @@ import pytz
 from datetime import datetime, timedelta
 
 import requests
+from django.conf import settings
+
 from geonode.monitoring.utils import GeoServerMonitorClient
 from geonode.monitoring.probes import get_probe
 from geonode.monitoring.models import RequestEvent, ExceptionEvent
@@ -174,15 +176,32 @@ class GeoServerService(BaseServiceHandler):
         self.gs_monitor = GeoServerMonitorClient(self.service.url)
 
     def _collect(self, since, until, format=None, **kwargs):
+        if getattr(settings, 'MONITORING_GEOSERVER_BULK_EXPORT', True):
+            try:
+                return self.gs_monitor.export_requests(since=since, until=until)
+            except Exception as e:
+                log.warning("Cannot export the requests from %s, fetching them one by one: %s", self.service.name, e)
         format = format or 'json'
-        requests = list(self.gs_monitor.get_requests(format=format, since=since, until=until))
-        return requests
+        return self.gs_monitor.get_requests(format=format, since=since, until=until)
 
     def handle_collected(self, requests):
         utc = pytz.utc
         now = datetime.utcnow().replace(tzinfo=utc)
+        batch_size = getattr(settings, 'MONITORING_WRITER_BATCH_SIZE', 500)
+        records = []
         for r in requests:
-            RequestEvent.from_geoserver(self.service, r, received=now)
+            try:
+                record = RequestEvent.get_geoserver_record(self.service, r, received=now)
+            except Exception as e:
+                log.warning("Cannot process the request %s: %s", r, e)
+                continue
+            if record:
+                records.append(record)
+            if len(records) >= batch_size:
+                RequestEvent.from_geonode_records(records)
+                records = []
+        if records:
+            RequestEvent.from_geonode_records(records)
         return RequestEvent.objects.filter(service=self.service, received=now)
 
 
@@ -24,19 +24,23 @@ from datetime import datetime, timedelta
 import os
 import time
 import json
+import unittest
 import pytz
 import logging
 import os.path
 import xmljson
 
 from decimal import Decimal  # noqa
+from unittest import mock
 from importlib import import_module
 from owslib.etree import etree as dlxml
 
 from django.core import mail
 from django.conf import settings
-from django.db import connections
+from django.db import connection, connections
 from django.urls import reverse
+from django.http import HttpResponse
+from django.test.client import RequestFactory
 from django.test.utils import override_settings
 from django.core.management import call_command
 from django.contrib.auth import get_user, get_user_model
@@ -45,12 +49,17 @@ from geonode.monitoring.models import (
     RequestEvent, Host, Service, ServiceType,
     populate, ExceptionEvent, MetricNotificationCheck,
     MetricValue, NotificationCheck, Metric, EventType,
-    MonitoredResource, MetricLabel,
+    MonitoredResource, MetricLabel, LRUCache,
     NotificationMetricDefinition,)
 from geonode.monitoring.models import do_autoconfigure
 from geonode.compat import ensure_string
+from geonode.monitoring import views as monitoring_views
 from geonode.monitoring.collector import CollectorAPI
-from geonode.monitoring.utils import generate_periods, align_period_start
+from geonode.monitoring.aggregation import (
+    aggregate_requests, aggregate_period, partition_metric_values, is_metric_values_partitioned,
+    get_metric_values_partitions, create_metric_values_partitions, drop_metric_values_partitions)
+from geonode.monitoring.utils import (
+    generate_periods, align_period_start, RequestToMonitoringThread, GeoServerMonitorClient)
 from geonode.base.models import ResourceBase
 from geonode.layers.models import Dataset
 from geonode.monitoring.models import *  # noqa
@@ -210,7 +219,7 @@ class MonitoringTestBase(GeoNodeLiveTestSupport):
         self._tempfiles = []
 
 
-@override_settings(USE_TZ=True)
+@override_settings(USE_TZ=True, MONITORING_ASYNC_WRITES=False)
 class RequestsTestCase(MonitoringTestBase):
 
     def setUp(self):
@@ -226,6 +235,8 @@ class RequestsTestCase(MonitoringTestBase):
         self.ua = ("Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36"
                    "(KHTML, like Gecko) Chrome/59.0.3071.47 Safari/537.36")
         populate()
+        # the cached dimensions ids of the previous tests have been rolled back
+        MetricValue.clear_dimensions_cache()
 
         self.host, _ = Host.objects.get_or_create(
             name='localhost', ip='127.0.0.1')
@@ -255,6 +266,25 @@ class RequestsTestCase(MonitoringTestBase):
             q[0].error_type,
             'org.geoserver.platform.ServiceException')
 
+    def test_gs_export_req(self):
+        """
+        Test if we can parse geoserver requests from the CSV export
+        """
+        row = {'id': '10', 'status': 'FINISHED', 'host': 'localhost', 'path': '/wms',
+               'queryString': 'service=WMS&request=GetMap', 'httpMethod': 'GET',
+               'startTime': req_big['org.geoserver.monitor.RequestData']['startTime'],
+               'totalTime': '12', 'remoteAddr': '127.0.0.1', 'remoteUserAgent': self.ua, 'service': 'WMS',
+               'resources': '[geonode:test, geonode:other]', 'responseLength': '1024',
+               'responseContentType': 'image/png', 'responseStatus': '200', 'errorMessage': 'failure'}
+        request_data = GeoServerMonitorClient(settings.GEOSERVER_LOCATION)._from_csv(row)
+        self.assertEqual(request_data['resources'], {'string': ['geonode:test', 'geonode:other']})
+        rq = RequestEvent.from_geoserver(self.service, {'org.geoserver.monitor.RequestData': request_data})
+        self.assertTrue(rq)
+        self.assertEqual(rq.response_size, 1024)
+        self.assertEqual(rq.event_type.name, 'OWS:WMS')
+        self.assertEqual(rq.resources.count(), 2)
+        self.assertEqual(ExceptionEvent.objects.get(request=rq).error_message, 'failure')
+
     def test_gn_request(self):
         """
         Test if we have geonode requests logged
@@ -293,6 +323,247 @@ class RequestsTestCase(MonitoringTestBase):
         if eq:
             self.assertEqual('django.http.response.Http404', eq.error_type)
 
+    def test_gn_request_writer(self):
+        """
+        Test if geonode requests are written in batches by the monitoring writer
+        """
+        request = RequestFactory().get('/', HTTP_USER_AGENT=self.ua)
+        now = datetime.utcnow().replace(tzinfo=pytz.utc)
+        request._monitoring = {'started': now, 'finished': now, 'resources': {}, 'events': []}
+        event = RequestEvent.get_geonode_record(self.service, request, HttpResponse('test'))
+        requests_count = RequestEvent.objects.count()
+
+        writer = RequestToMonitoringThread(max_size=2, batch_size=2)
+        self.assertTrue(writer.add(event))
+        self.assertTrue(writer.add(event))
+        # the queue is full, the event is dropped
+        self.assertFalse(writer.add(event))
+        writer.flush()
+        self.assertEqual(
+            writer.stats(), {'queued': 2, 'written': 2, 'dropped': 1, 'failed': 0, 'pending': 0})
+        self.assertEqual(RequestEvent.objects.count(), requests_count + 2)
+        self.assertEqual(RequestEvent.objects.last().request_path, '/')
+
+    def test_user_data_caches(self):
+        """
+        Test if user agents families are parsed once and cached
+        """
+        RequestEvent.clear_user_data_caches()
+        family = RequestEvent._get_ua_family(self.ua)
+        self.assertEqual(RequestEvent._get_ua_family(self.ua), family)
+        stats = RequestEvent.get_user_data_caches_stats()['user_agent']
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['size'], 1)
+        self.assertEqual(RequestEvent._get_user_location('127.0.0.1'), {})
+
+        cache = LRUCache(maxsize=2)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, key)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('c'), 'c')
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_aggregate_requests(self):
+        """
+        Test if requests metrics are computed for all the resources and event types
+        """
+        now = datetime.utcnow().replace(tzinfo=pytz.utc)
+        view = EventType.get(EventType.EVENT_VIEW)
+        wms = EventType.get('OWS:WMS')
+        resource, _ = MonitoredResource.objects.get_or_create(name='test_aggregate_requests', type='dataset')
+        for event_type, response_time in ((view, 10,), (view, 20,), (wms, 30,),):
+            rq = RequestEvent.objects.create(
+                created=now, received=now, service=self.service, event_type=event_type,
+                request_path='/test', request_method='GET', response_status=200, response_time=response_time)
+            if event_type == view:
+                rq.resources.add(resource)
+        requests = RequestEvent.objects.filter(created=now, service=self.service)
+        values = aggregate_requests(self.service, requests, now, now + timedelta(minutes=1))
+
+        def get_value(metric_name, resource_id=None, event_type=EventType.EVENT_ALL, label=None):
+            event_type_id = EventType.get(event_type).id
+            return [v['value'] for v in values if v['metric'] == metric_name and v['resource_id'] == resource_id and
+                    v['event_type_id'] == event_type_id and (label is None or v['label'] == label)]
+
+        self.assertEqual(get_value('request.count'), [3])
+        self.assertEqual(get_value('request.count', resource_id=resource.id), [2])
+        self.assertEqual(get_value('request.count', event_type=EventType.EVENT_OWS), [1])
+        self.assertEqual(get_value('request.count', event_type=EventType.EVENT_OTHER), [2])
+        self.assertEqual(get_value('request.count', resource_id=resource.id, event_type=EventType.EVENT_OWS), [0])
+        self.assertEqual(get_value('response.time'), [20])
+        self.assertEqual(get_value('response.time', resource_id=resource.id), [15])
+        self.assertEqual(get_value('request.path', label='/test'), [3])
+        self.assertEqual(get_value('request.method', event_type=EventType.EVENT_VIEW, label='GET'), [2])
+
+    def test_metric_value_bulk_add(self):
+        """
+        Test if metric values are created or updated in bulk
+        """
+        valid_from = datetime.utcnow().replace(tzinfo=pytz.utc, microsecond=0)
+        valid_to = valid_from + timedelta(minutes=1)
+        rows = [{'metric': 'request.count',
+                 'service': self.service,
+                 'valid_from': valid_from,
+                 'valid_to': valid_to,
+                 'label': 'Count',
+                 'event_type': event_type,
+                 'value_raw': 1,
+                 'value_num': 1,
+                 'samples_count': 1} for event_type in (EventType.EVENT_ALL, None,)]
+        self.assertEqual(MetricValue.bulk_add(rows), 2)
+        for row in rows:
+            row['value_raw'] = row['value_num'] = 2
+        self.assertEqual(MetricValue.bulk_add(rows), 2)
+
+        q = MetricValue.objects.filter(valid_from=valid_from, valid_to=valid_to, service=self.service)
+        self.assertEqual(q.count(), 2)
+        self.assertEqual({int(value) for value in q.values_list('value_num', flat=True)}, {2})
+        self.assertEqual(set(q.values_list('label__name', flat=True)), {'Count'})
+
+    def _add_metric_values(self, valid_from, values):
+        MetricValue.bulk_add([{'metric': metric,
+                               'service': service,
+                               'valid_from': valid_from,
+                               'valid_to': valid_from + timedelta(minutes=1),
+                               'label': label,
+                               'resource': resource,
+                               'event_type': event_type,
+                               'value_raw': value,
+                               'value_num': value,
+                               'samples_count': samples_count}
+                              for metric, service, label, resource, event_type, value, samples_count in values])
+
+    def test_aggregate_period(self):
+        """
+        Test if the metric values of a period are rolled up with the aggregate function of their metric type
+        """
+        host_service, _ = Service.objects.get_or_create(
+            name='localhost-hostgeonode',
+            host=self.host,
+            service_type=ServiceType.objects.get(name=ServiceType.TYPE_HOST_GN))
+        resource, _ = MonitoredResource.objects.get_or_create(name='aggregation_layer', type=MonitoredResource.TYPE_LAYER)
+        event_all = EventType.get(EventType.EVENT_ALL)
+        period_start = datetime(2021, 1, 1, tzinfo=pytz.utc)
+        period_end = period_start + timedelta(hours=1)
+
+        def get_aggregated_values():
+            q = MetricValue.objects.filter(valid_from=period_start, valid_to=period_end)
+            return {(v.service_metric.metric.name, v.resource_id, v.event_type_id): (float(v.value_num), v.samples_count)
+                    for v in q.select_related('service_metric__metric')}
+
+        # resource and event type keys can be NULL
+        self._add_metric_values(period_start, (
+            ('response.time', self.service, 'rate', None, None, 10, 1),
+            ('response.time', self.service, 'rate', resource, event_all, 20, 2),
+            ('request.count', self.service, 'Count', None, None, 1, 1),
+            ('request.ip', self.service, '127.0.0.1', None, event_all, 2, 2),
+            ('mem.free', host_service, 'B', None, None, 100, 1),))
+        self._add_metric_values(period_start + timedelta(minutes=1), (
+            ('response.time', self.service, 'rate', None, None, 40, 3),
+            ('response.time', self.service, 'rate', resource, event_all, 50, 2),
+            ('request.count', self.service, 'Count', None, None, 3, 3),
+            ('request.ip', self.service, '127.0.0.1', None, event_all, 5, 5),
+            ('mem.free', host_service, 'B', None, None, 300, 1),))
+
+        self.assertEqual(aggregate_period(period_start, period_end, MetricValue.objects.all()), 5)
+        # rates are weighted by their samples, counts and values are summed, numeric values are the max
+        self.assertEqual(get_aggregated_values(), {
+            ('response.time', None, None): (32.5, 4),
+            ('response.time', resource.id, event_all.id): (35, 4),
+            ('request.count', None, None): (4, 4),
+            ('request.ip', None, event_all.id): (7, 7),
+            ('mem.free', None, None): (300, 2)})
+        self.assertFalse(MetricValue.objects.filter(
+            valid_from__gte=period_start, valid_to__lt=period_end).exists())
+
+        # the values aggregated again are rolled up with the previous aggregates
+        self._add_metric_values(period_start + timedelta(minutes=2), (
+            ('response.time', self.service, 'rate', None, None, 80, 4),
+            ('request.count', self.service, 'Count', None, None, 2, 2),
+            ('mem.free', host_service, 'B', None, None, 200, 1),))
+        self.assertEqual(aggregate_period(period_start, period_end, MetricValue.objects.all()), 3)
+        self.assertEqual(get_aggregated_values(), {
+            ('response.time', None, None): (56.25, 8),
+            ('response.time', resource.id, event_all.id): (35, 4),
+            ('request.count', None, None): (6, 6),
+            ('request.ip', None, event_all.id): (7, 7),
+            ('mem.free', None, None): (300, 3)})
+        self.assertEqual(aggregate_period(period_start, period_end, MetricValue.objects.all()), 0)
+
+    @unittest.skipUnless(connection.vendor == 'postgresql', "Partitioning requires PostgreSQL")
+    @override_settings(MONITORING_DATA_TTL=timedelta(days=30), MONITORING_DATA_PARTITIONS_AHEAD=2)
+    def test_metric_values_partitions(self):
+        """
+        Test if the metric values are partitioned by month, and the expired partitions are dropped
+        """
+        now = datetime.utcnow().replace(tzinfo=pytz.utc, microsecond=0)
+        old = now - timedelta(days=200)
+        self._add_metric_values(old, (('request.count', self.service, 'Count', None, None, 1, 1),))
+        self._add_metric_values(now, (('request.count', self.service, 'Count', None, None, 2, 2),))
+        with connection.cursor() as cursor:
+            # the deferred foreign keys checks would prevent altering the table
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+        self.assertTrue(partition_metric_values(months_ahead=1))
+        self.assertTrue(is_metric_values_partitioned())
+        self.assertFalse(partition_metric_values())
+        self.assertEqual(MetricValue.objects.filter(service=self.service, valid_from__in=(old, now)).count(), 2)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT indexname FROM pg_indexes WHERE tablename = %s', [MetricValue._meta.db_table])
+            indexes = {name for name, in cursor.fetchall()}
+        self.assertTrue({index.name for index in MetricValue._meta.indexes}.issubset(indexes))
+
+        months = [month for _, month in get_metric_values_partitions()]
+        self.assertEqual(months[0], old.replace(day=1, hour=0, minute=0, second=0))
+        self.assertGreater(months[-1], now)
+        self.assertEqual(create_metric_values_partitions(old, now), [])
+        self.assertEqual(drop_metric_values_partitions(old), [])
+
+        CollectorAPI().clear_old_data()
+        months = [month for _, month in get_metric_values_partitions()]
+        self.assertNotIn(old.replace(day=1, hour=0, minute=0, second=0), months)
+        self.assertIn(now.replace(day=1, hour=0, minute=0, second=0), months)
+        self.assertGreaterEqual(len([month for month in months if month > now]), 2)
+        self.assertEqual(
+            list(MetricValue.objects.filter(service=self.service, valid_from__in=(old, now)).values_list(
+                'valid_from', flat=True)), [now])
+
+    @override_settings(
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+        MONITORING_DATA_CACHE='default')
+    def test_metrics_data_cache(self):
+        """
+        Test if the metrics data are cached until new values are written for the period
+        """
+        valid_from = datetime.utcnow().replace(tzinfo=pytz.utc, microsecond=0)
+        valid_to = valid_from + timedelta(minutes=1)
+        row = {'metric': 'request.count',
+               'service': self.service,
+               'valid_from': valid_from,
+               'valid_to': valid_to,
+               'label': 'count',
+               'event_type': EventType.EVENT_ALL,
+               'value_raw': 1,
+               'value_num': 1,
+               'samples_count': 1}
+        MetricValue.bulk_add([row])
+        c = CollectorAPI()
+
+        def get_value():
+            data = c.get_metrics_data('request.count', valid_from, valid_to, interval=valid_to - valid_from,
+                                      service=self.service)
+            return int(data[0]['val'])
+
+        self.assertEqual(get_value(), 1)
+        # cached results are returned
+        MetricValue.objects.filter(valid_from=valid_from, service=self.service).update(value_num=3)
+        self.assertEqual(get_value(), 1)
+        # new values for the period invalidate the cache
+        row['value_raw'] = row['value_num'] = 2
+        MetricValue.bulk_add([row])
+        self.assertEqual(get_value(), 2)
+
     def test_service_handlers(self):
         """
         Test if we can calculate metrics
@@ -908,6 +1179,33 @@ class MonitoringAnalyticsTestCase(MonitoringTestBase):
         self.user.email = 'test_user@email.com'
         self.user.save()
 
+    @override_settings(
+        CACHES={**settings.CACHES, 'monitoring_data': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+        MONITORING_DATA_CACHE='monitoring_data')
+    def test_last_metric_data_is_cached(self):
+        """
+        Test if a dashboard request for the last period is served from the cache when repeated a few seconds later
+        """
+        self.client.login_user(self.admin)
+        url = f"{reverse('monitoring:api_metric_data', args=['request.count'])}?last=3600&interval=60"
+        now = datetime(2019, 9, 11, 20, 0, 5)
+        with mock.patch.object(monitoring_views, 'datetime') as mock_datetime, \
+                mock.patch.object(monitoring_views.capi, '_get_metrics_data',
+                                  wraps=monitoring_views.capi._get_metrics_data) as mock_get_metrics_data:
+            mock_datetime.utcnow.side_effect = [now, now + timedelta(seconds=20)]
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            data = json.loads(ensure_string(response.content))['data']['data']
+            self.assertEqual(mock_get_metrics_data.call_count, len(data))
+            # the periods are aligned to the interval
+            self.assertEqual(data[0]['valid_from'], '2019-09-11T19:00:00.000000Z')
+
+            mock_get_metrics_data.reset_mock()
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(json.loads(ensure_string(response.content))['data']['data'], data)
+            mock_get_metrics_data.assert_not_called()
+
     def test_dataset_view_endpoints(self):
         dataset_view_data = [
             {'label': 'd2e837d24027cfd1ca361d60a63fc4f474993bd909bffbcc83117c3c76653c10',
@@ -16,14 +16,17 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 #
 #########################################################################
+import io
 import os
+import csv
 import pytz
+import atexit
 import queue
 import logging
 import xmljson
 import requests
 import threading
-import traceback
+import uuid
 
 from hashlib import md5
 from math import floor, ceil
@@ -35,6 +38,8 @@ from datetime import datetime, timedelta
 from owslib.etree import etree as dlxml
 
 from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
 from django.db.models.fields.related import RelatedField
 
 from geonode.tasks.tasks import AcquireLock
@@ -52,49 +57,149 @@ class MonitoringHandler(logging.Handler):
         self.service = service
 
     def emit(self, record):
-        from geonode.monitoring.models import RequestEvent, ExceptionEvent
+        from geonode.monitoring.models import RequestEvent
 
-        exc_info = record.exc_info
         req = record.request
-        resp = record.response
-        if not req._monitoring.get('processed'):
+        if req._monitoring.get('processed'):
+            return
+        req._monitoring['processed'] = True
+        try:
+            event = RequestEvent.get_geonode_record(self.service, req, record.response, exc_info=record.exc_info)
+        except Exception as e:
+            log.debug(f"Could not collect the monitoring data of the request: {e}")
+            return
+        if getattr(settings, 'MONITORING_ASYNC_WRITES', True):
+            get_monitoring_writer().add(event)
+        else:
             try:
-                re = RequestEvent.from_geonode(self.service, req, resp)
-                req._monitoring['processed'] = re
-            except Exception:
-                req._monitoring['processed'] = None
-        re = req._monitoring.get('processed')
-
-        if re and exc_info:
-            tb = traceback.format_exception(*exc_info)
-            ExceptionEvent.add_error(self.service, exc_info[1], tb, request=re)
+                RequestEvent.from_geonode_records([event])
+            except Exception as e:
+                log.debug(f"Could not write the monitoring data of the request: {e}")
 
 
 class RequestToMonitoringThread(threading.Thread):
-    q = queue.Queue()
+    """
+    Background writer of the GeoNode requests monitoring events.
 
-    def __init__(self, service, *args, **kwargs):
+    The request threads put the events into a bounded queue, which is flushed in batches
+    through 'RequestEvent.from_geonode_records'. When the queue is full the new events
+    are dropped and counted, so that the monitoring never slows down the requests.
+    """
+
+    def __init__(self, max_size=10000, batch_size=500, flush_interval=1.0, *args, **kwargs):
+        kwargs.setdefault('name', 'monitoring-writer')
+        kwargs.setdefault('daemon', True)
         super().__init__(*args, **kwargs)
-        self.service = service
+        self.q = queue.Queue(maxsize=max_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queued = self.written = self.dropped = self.failed = 0
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def add(self, event):
+        try:
+            self.q.put_nowait(event)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        with self._lock:
+            self.queued += 1
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {'queued': self.queued,
+                    'written': self.written,
+                    'dropped': self.dropped,
+                    'failed': self.failed,
+                    'pending': self.q.qsize()}
+
+    def get_batch(self, block=True):
+        batch = []
+        try:
+            batch.append(self.q.get(block=block, timeout=self.flush_interval if block else None))
+            while len(batch) < self.batch_size:
+                batch.append(self.q.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def write(self, batch):
+        from django.db import close_old_connections
+        from geonode.monitoring.models import RequestEvent
 
-    def add(self, req, resp):
-        item = (req, resp,)
-        RequestToMonitoringThread.q.put(item)
+        close_old_connections()
+        try:
+            RequestEvent.from_geonode_records(batch)
+            with self._lock:
+                self.written += len(batch)
+        except Exception as e:
+            log.exception(e)
+            with self._lock:
+                self.failed += len(batch)
+
+    def flush(self):
+        """
+        Writes all the pending events.
+        """
+        batch = self.get_batch(block=False)
+        while batch:
+            self.write(batch)
+            batch = self.get_batch(block=False)
 
     def run(self):
-        from geonode.monitoring.models import RequestEvent
+        while not self._stopping.is_set():
+            batch = self.get_batch()
+            if batch:
+                self.write(batch)
+        self.flush()
+
+    def stop(self, timeout=None):
+        """
+        Stops the writer once all the pending events have been written.
+        """
+        self._stopping.set()
+        if self.is_alive():
+            self.join(timeout)
+
+
+_monitoring_writer = None
+_monitoring_writer_lock = threading.Lock()
 
-        q = RequestToMonitoringThread.q
-        while True:
-            if not q.empty():
-                item = q.get()
-                req, resp = item
-                RequestEvent.from_geonode(self.service, req, resp)
+
+def get_monitoring_writer():
+    """
+    Returns the monitoring events writer of the current process, starting it if needed.
+    """
+    global _monitoring_writer
+    with _monitoring_writer_lock:
+        if _monitoring_writer is None or not _monitoring_writer.is_alive():
+            _monitoring_writer = RequestToMonitoringThread(
+                max_size=getattr(settings, 'MONITORING_WRITER_QUEUE_SIZE', 10000),
+                batch_size=getattr(settings, 'MONITORING_WRITER_BATCH_SIZE', 500),
+                flush_interval=getattr(settings, 'MONITORING_WRITER_FLUSH_INTERVAL', 1.0))
+            _monitoring_writer.start()
+        return _monitoring_writer
+
+
+@atexit.register
+def stop_monitoring_writer():
+    """
+    Stops the monitoring events writer of the current process, if any, writing the pending events.
+    """
+    if _monitoring_writer is not None:
+        _monitoring_writer.stop(timeout=getattr(settings, 'MONITORING_WRITER_SHUTDOWN_TIMEOUT', 10))
 
 
 class GeoServerMonitorClient:
 
     REPORT_FORMATS = ('html', 'xml', 'json',)
+    # request data fields of the CSV export
+    EXPORT_FIELDS = ('id', 'status', 'host', 'path', 'queryString', 'httpMethod', 'startTime', 'totalTime',
+                     'remoteAddr', 'remoteUserAgent', 'service', 'resources', 'responseLength',
+                     'responseContentType', 'responseStatus', 'errorMessage',)
 
     def __init__(self, base_url):
         self.base_url = base_url
@@ -147,6 +252,59 @@ class GeoServerMonitorClient:
             else:
                 log.warning(f"Skipping payload for {href}")
 
+    def export_requests(self, since=None, until=None, fields=EXPORT_FIELDS):
+        """
+        Returns an iterator over the requests from monitoring, downloaded with a single
+        CSV export and parsed while streaming, in the same structure returned by 'get_request'.
+
+        Raises ValueError if the export is not available.
+        """
+        from requests.auth import HTTPBasicAuth
+
+        qargs = {'fields': ';'.join(fields)}
+        if since:
+            qargs['from'] = since.strftime(GS_FORMAT)
+        if until:
+            qargs['to'] = until.strftime(GS_FORMAT)
+        rest_url = f'{self.base_url}rest/monitor/requests.csv?{urlencode(qargs)}'
+
+        log.debug('exporting %s', rest_url)
+        username = settings.OGC_SERVER['default']['USER']
+        password = settings.OGC_SERVER['default']['PASSWORD']
+        resp = requests.get(
+            rest_url,
+            auth=HTTPBasicAuth(username, password),
+            timeout=30,
+            verify=False,
+            stream=True)
+        if resp.status_code != 200:
+            resp.close()
+            raise ValueError(f"Invalid response for {rest_url}: {resp}")
+
+        def _rows():
+            with resp:
+                resp.raw.decode_content = True
+                lines = io.TextIOWrapper(resp.raw, encoding=resp.encoding or 'utf-8', newline='')
+                for row in csv.DictReader(lines):
+                    yield {'org.geoserver.monitor.RequestData': self._from_csv(row)}
+        return _rows()
+
+    def _from_csv(self, row):
+        """
+        Converts a row of the CSV export to the structure of the xml/json request data
+        """
+        data = {k: v for k, v in row.items() if k and v not in (None, '',)}
+        for field in ('totalTime', 'responseLength', 'responseStatus',):
+            try:
+                data[field] = int(float(data[field]))
+            except (KeyError, ValueError,):
+                data[field] = 0
+        resources = [r.strip() for r in data.pop('resources', '').strip('[]').split(',')]
+        data['resources'] = {'string': [r for r in resources if r]}
+        if data.get('errorMessage'):
+            data['error'] = {'class': 'undefined', 'detailMessage': data.pop('errorMessage')}
+        return data
+
     def get_request(self, href, format=format):
         from requests.auth import HTTPBasicAuth
 
@@ -250,6 +408,72 @@ def generate_periods(since, interval, end=None, align=True):
         since_aligned = since_aligned + interval
 
 
+# the metrics data cache entries are invalidated by day, through a
+# generation token stored for each day of metric values written
+METRICS_DATA_CACHE_BUCKET = 24 * 3600
+METRICS_DATA_CACHE_MAX_BUCKETS = 400
+
+
+def get_metrics_data_cache():
+    """
+    Returns the cache configured by settings.MONITORING_DATA_CACHE for the metrics data
+    queries, or None if it is disabled or it is a dummy cache, which would never hit.
+    """
+    alias = getattr(settings, 'MONITORING_DATA_CACHE', None)
+    if not alias:
+        return None
+    cache = caches[alias]
+    return None if isinstance(cache, DummyCache) else cache
+
+
+def _get_metrics_data_cache_buckets(valid_from, valid_to):
+    start = int(valid_from.timestamp() // METRICS_DATA_CACHE_BUCKET)
+    end = int(valid_to.timestamp() // METRICS_DATA_CACHE_BUCKET)
+    if end - start >= METRICS_DATA_CACHE_MAX_BUCKETS:
+        return None
+    return [f'monitoring_metrics_data_gen:{bucket}' for bucket in range(start, end + 1)]
+
+
+def _get_metrics_data_cache_generations(cache, keys):
+    generations = cache.get_many(keys)
+    missing = {key: uuid.uuid4().hex for key in keys if key not in generations}
+    if missing:
+        # a new generation is started, so that an evicted one won't bring back stale entries
+        cache.set_many(missing, timeout=None)
+        generations.update(missing)
+    return [generations[key] for key in keys]
+
+
+def get_metrics_data_cache_key(valid_from, valid_to, *args):
+    """
+    Returns the cache key of a metrics data query for the period, built from the query arguments
+    and the current generations of the period days; None if the period is too long to be cached.
+    """
+    cache = get_metrics_data_cache()
+    buckets = _get_metrics_data_cache_buckets(valid_from, valid_to)
+    if cache is None or buckets is None:
+        return None
+    generations = _get_metrics_data_cache_generations(cache, ['monitoring_metrics_data_gen'] + buckets)
+    key = repr((valid_from.isoformat(), valid_to.isoformat(),) + args + tuple(generations))
+    return f'monitoring_metrics_data:{md5(key.encode()).hexdigest()}'
+
+
+def invalidate_metrics_data_cache(valid_from=None, valid_to=None):
+    """
+    Invalidates the cached metrics data queries overlapping the period, or all of them
+    when no period is given.
+    """
+    cache = get_metrics_data_cache()
+    if cache is None:
+        return
+    buckets = None
+    if valid_from and valid_to:
+        buckets = _get_metrics_data_cache_buckets(valid_from, valid_to)
+    if buckets is None:
+        buckets = ['monitoring_metrics_data_gen']
+    cache.set_many({bucket: uuid.uuid4().hex for bucket in buckets}, timeout=None)
+
+
 class TypeChecks:
     AUDIT_TYPE_JSON = 'json'
     AUDIT_TYPE_XML = 'xml'
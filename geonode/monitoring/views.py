@@ -434,6 +434,7 @@ class MetricDataView(View):
             now = datetime.utcnow().replace(tzinfo=pytz.utc)
             filters['valid_from'] = now - td
             filters['valid_to'] = now
+            filters['align'] = True
         out = capi.get_metrics_for(metric_name, **filters)
         return json_response({'data': out})
 
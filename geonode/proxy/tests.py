@@ -23,10 +23,14 @@ unittest). These will both pass when you run "manage.py test".
 
 Replace these with more appropriate tests for your application.
 """
+import io
+import zipfile
+
 from urllib.parse import urljoin
 
 from django.conf import settings
 from geonode.proxy.templatetags.proxy_lib_tags import original_link_available
+from geonode.proxy.utils import AllowedHostsIndex, proxy_allowed_hosts
 from django.test.client import RequestFactory
 from unittest.mock import patch
 from geonode.upload.models import Upload
@@ -107,6 +111,35 @@ class ProxyTest(GeoNodeBaseTestSupport):
         # 200 - FOUND
         self.assertTrue(response.status_code in (200, 301))
 
+    @override_settings(DEBUG=False, PROXY_ALLOWED_HOSTS=())
+    def test_remote_services_hosts_are_indexed(self):
+        """The allowed hosts index must follow the Remote Services being created and deleted."""
+        from geonode.services.models import Service
+        from geonode.services.enumerations import WMS, INDEXED
+        self.assertFalse(proxy_allowed_hosts.is_allowed('bogus.hocus.com'))
+        service, _ = Service.objects.get_or_create(
+            type=WMS,
+            name='Hocus',
+            title='Pocus',
+            owner=self.admin,
+            method=INDEXED,
+            base_url='http://bogus.hocus.com/ows')
+        self.assertTrue(proxy_allowed_hosts.is_allowed('bogus.hocus.com'))
+        service.delete()
+        self.assertFalse(proxy_allowed_hosts.is_allowed('bogus.hocus.com'))
+
+    def test_allowed_hosts_index(self):
+        """The allowed hosts index must match like django.http.request.validate_host."""
+        index = AllowedHostsIndex(('.example.org', 'geonode.org', 'LocalHost'))
+        self.assertTrue(index.is_allowed('example.org'))
+        self.assertTrue(index.is_allowed('demo.maps.example.org'))
+        self.assertTrue(index.is_allowed('geonode.org'))
+        self.assertTrue(index.is_allowed('localhost'))
+        self.assertFalse(index.is_allowed('demo.geonode.org'))
+        self.assertFalse(index.is_allowed('badexample.org'))
+        self.assertFalse(index.is_allowed(None))
+        self.assertTrue(AllowedHostsIndex(('*',)).is_allowed('anything.com'))
+
     @override_settings(DEBUG=False, PROXY_ALLOWED_HOSTS=('.example.org',))
     def test_relative_urls(self):
         """Proxying to a URL with a relative path element should normalise the path into
@@ -177,6 +210,32 @@ class ProxyTest(GeoNodeBaseTestSupport):
             }
         )
 
+    @override_settings(DEBUG=False, PROXY_ALLOWED_HOSTS=('.example.org',), PROXY_STREAMING_ENABLED=True)
+    def test_proxy_streaming(self):
+        """With streaming enabled the upstream chunks should be forwarded as they come."""
+        response_mock = MagicMock()
+        response_mock.status_code = 200
+        response_mock.headers = {
+            'Content-Type': 'application/json',
+            'Content-Length': 16,
+            'Content-Encoding': 'gzip',
+            'Content-Language': 'en'
+        }
+        response_mock.iter_content.return_value = iter([b'{"hello":', b'', b' "world"}'])
+
+        with patch('geonode.proxy.views.http_client.request', return_value=(response_mock, None)) as request_mock:
+            response = self.client.get(f'{self.proxy_url}?url=http://example.org/features.json')
+            self.assertTrue(request_mock.call_args[1]['stream'])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(b''.join(response.streaming_content), b'{"hello": "world"}')
+        self.assertEqual(response.headers.get('Content-Language'), 'en')
+        self.assertIsNone(response.headers.get('Content-Length'))
+        self.assertIsNone(response.headers.get('Content-Encoding'))
+        response.close()
+        response_mock.close.assert_called_once()
+
 
 class DownloadResourceTestCase(GeoNodeBaseTestSupport):
 
@@ -205,7 +264,7 @@ class DownloadResourceTestCase(GeoNodeBaseTestSupport):
     @on_ogc_backend(geoserver.BACKEND_PACKAGE)
     def test_download_url_with_existing_files(self, fopen, fexists):
         fexists.return_value = True
-        fopen.return_value = SimpleUploadedFile('foo_file.shp', b'scc')
+        fopen.side_effect = lambda file_path, *args, **kwargs: SimpleUploadedFile(file_path, b'scc')
         dataset = Dataset.objects.all().first()
 
         dataset.files = [
@@ -234,6 +293,15 @@ class DownloadResourceTestCase(GeoNodeBaseTestSupport):
         self.assertEqual('application/zip', response.headers.get('Content-Type'))
         self.assertEqual('attachment; filename="CA.zip"', response.headers.get('Content-Disposition'))
 
+        # The archive is generated on the fly
+        self.assertTrue(response.streaming)
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertIsNone(archive.testzip())
+        self.assertEqual(
+            sorted(archive.namelist()),
+            ['foo_file.dbf', 'foo_file.prj', 'foo_file.shp', 'foo_file.shx'])
+        self.assertEqual(archive.read('foo_file.shp'), b'scc')
+
 
 class OWSApiTestCase(GeoNodeBaseTestSupport):
 
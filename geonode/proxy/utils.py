@@ -0,0 +1,130 @@
+#########################################################################
+#
+# Copyright (C) 2021 OSGeo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#########################################################################
+import time
+import logging
+
+from threading import Lock
+from urllib.parse import urlsplit
+
+from django.conf import settings
+
+from geonode import geoserver
+from geonode.utils import check_ogc_backend
+
+logger = logging.getLogger(__name__)
+
+
+class AllowedHostsIndex:
+    """
+    In-memory index of the hosts the proxy is allowed to reach.
+
+    Patterns follow the 'django.http.request.validate_host' semantics: '*' matches
+    everything, a leading dot matches the domain and all its subdomains, anything
+    else is an exact match. Lookups cost one set access per host label.
+    """
+
+    def __init__(self, patterns=()):
+        self.any = False
+        self.exact = set()
+        self.domains = set()
+        for _pattern in patterns:
+            self.add(_pattern)
+
+    def add(self, pattern):
+        if not pattern:
+            return
+        pattern = pattern.lower().rstrip('.')
+        if pattern == '*':
+            self.any = True
+        elif pattern.startswith('.'):
+            self.domains.add(pattern[1:])
+        else:
+            self.exact.add(pattern)
+
+    def is_allowed(self, host):
+        if self.any:
+            return True
+        if not host:
+            return False
+        host = host.lower().rstrip('.')
+        if host in self.exact or host in self.domains:
+            return True
+        _labels = host.split('.')
+        for _i in range(1, len(_labels)):
+            if '.'.join(_labels[_i:]) in self.domains:
+                return True
+        return False
+
+
+class ProxyAllowedHosts:
+    """
+    Keeps the proxy allowed hosts precomputed, instead of rebuilding them on every request.
+
+    The static part comes from the settings and is rebuilt only when they change.
+    The remote services part is invalidated by the Service signals; since those
+    are only received by the current process, it is also refreshed every
+    'PROXY_ALLOWED_HOSTS_CACHE_TTL' seconds.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._static_key = None
+        self._static_index = None
+        self._services_index = None
+        self._services_loaded_at = 0
+
+    def _get_static_patterns(self):
+        _patterns = list(getattr(settings, 'PROXY_ALLOWED_HOSTS', ()) or ())
+        _patterns.append(urlsplit(settings.SITEURL).hostname)
+        if check_ogc_backend(geoserver.BACKEND_PACKAGE):
+            from geonode.geoserver.helpers import ogc_server_settings
+            if ogc_server_settings:
+                _patterns.append(ogc_server_settings.hostname)
+        return tuple(_patterns)
+
+    def _get_static_index(self):
+        _patterns = self._get_static_patterns()
+        with self._lock:
+            if self._static_key != _patterns:
+                self._static_index = AllowedHostsIndex(_patterns)
+                self._static_key = _patterns
+            return self._static_index
+
+    def _get_services_index(self):
+        _ttl = getattr(settings, 'PROXY_ALLOWED_HOSTS_CACHE_TTL', 60)
+        with self._lock:
+            if self._services_index is not None and time.time() - self._services_loaded_at < _ttl:
+                return self._services_index
+        from geonode.services.models import Service
+        _index = AllowedHostsIndex(
+            urlsplit(_base_url).hostname for _base_url in Service.objects.values_list('base_url', flat=True))
+        with self._lock:
+            self._services_index = _index
+            self._services_loaded_at = time.time()
+        return _index
+
+    def is_allowed(self, host):
+        return self._get_static_index().is_allowed(host) or self._get_services_index().is_allowed(host)
+
+    def invalidate(self):
+        with self._lock:
+            self._services_index = None
+
+
+proxy_allowed_hosts = ProxyAllowedHosts()
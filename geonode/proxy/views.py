@@ -20,9 +20,7 @@ import io
 import os
 import re
 import gzip
-import shutil
 import logging
-import tempfile
 import traceback
 
 from hyperlink import URL
@@ -30,22 +28,21 @@ from urllib.parse import urlparse, urlsplit, urljoin
 
 from django.conf import settings
 from django.template import loader
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from django.views.generic import View
 from distutils.version import StrictVersion
-from django.http.request import validate_host
 from django.utils.translation import ugettext as _
 from django.views.decorators.csrf import requires_csrf_token
 
 from geonode.layers.models import Dataset
 from geonode.upload.models import Upload
 from geonode.base.models import ResourceBase
+from geonode.proxy.utils import proxy_allowed_hosts
 from geonode.storage.manager import storage_manager
 from geonode.utils import (
     resolve_object,
     check_ogc_backend,
-    get_dir_time_suffix,
-    zip_dir,
+    zip_stream,
     get_headers,
     http_client,
     json_response)
@@ -68,13 +65,15 @@ ows_regexp = re.compile(
 @requires_csrf_token
 def proxy(request, url=None, response_callback=None,
           sec_chk_hosts=True, sec_chk_rules=True, timeout=None,
-          allowed_hosts=[], **kwargs):
+          allowed_hosts=[], stream=None, **kwargs):
     # Request default timeout
     if not timeout:
         timeout = TIMEOUT
 
-    # Security rules and settings
-    PROXY_ALLOWED_HOSTS = getattr(settings, 'PROXY_ALLOWED_HOSTS', ())
+    # Streaming mode; the callbacks need the whole content
+    if stream is None:
+        stream = getattr(settings, 'PROXY_STREAMING_ENABLED', False)
+    stream = stream and not response_callback
 
     # Sanity url checks
     if 'url' not in request.GET and not url:
@@ -99,37 +98,18 @@ def proxy(request, url=None, response_callback=None,
     site_url = urlsplit(settings.SITEURL)
     if sec_chk_hosts and not settings.DEBUG:
 
-        # Attach current SITEURL
-        if site_url.hostname not in PROXY_ALLOWED_HOSTS:
-            PROXY_ALLOWED_HOSTS += (site_url.hostname, )
-
-        # Attach current hostname
-        if check_ogc_backend(geoserver.BACKEND_PACKAGE):
-            from geonode.geoserver.helpers import ogc_server_settings
-            hostname = (
-                ogc_server_settings.hostname,
-            ) if ogc_server_settings else ()
-            if hostname not in PROXY_ALLOWED_HOSTS:
-                PROXY_ALLOWED_HOSTS += hostname
-
         # Check OWS regexp
+        _ows_allowed = False
         if url.query and ows_regexp.match(url.query):
             ows_tokens = ows_regexp.match(url.query).groups()
             if len(ows_tokens) == 4 and 'version' == ows_tokens[0] and StrictVersion(
                     ows_tokens[1]) >= StrictVersion("1.0.0") and StrictVersion(
                         ows_tokens[1]) <= StrictVersion("3.0.0") and ows_tokens[2].lower() in (
                             'getcapabilities') and ows_tokens[3].upper() in ('OWS', 'WCS', 'WFS', 'WMS', 'WPS', 'CSW'):
-                if url.hostname not in PROXY_ALLOWED_HOSTS:
-                    PROXY_ALLOWED_HOSTS += (url.hostname, )
+                _ows_allowed = True
 
-        # Check Remote Services base_urls
-        from geonode.services.models import Service
-        for _s in Service.objects.all():
-            _remote_host = urlsplit(_s.base_url).hostname
-            PROXY_ALLOWED_HOSTS += (_remote_host, )
-
-        if not validate_host(
-                url.hostname, PROXY_ALLOWED_HOSTS):
+        # Check PROXY_ALLOWED_HOSTS, current SITEURL and OGC server hostnames and Remote Services base_urls
+        if not _ows_allowed and not proxy_allowed_hosts.is_allowed(url.hostname):
             return HttpResponse("DEBUG is set to False but the host of the path provided to the proxy service"
                                 " is not in the PROXY_ALLOWED_HOSTS setting.",
                                 status=403,
@@ -181,12 +161,17 @@ def proxy(request, url=None, response_callback=None,
         data=_data.encode('utf-8'),
         headers=headers,
         timeout=timeout,
+        stream=stream,
         user=request.user)
     if response is None:
         return HttpResponse(
             content=content,
             reason=content,
             status=500)
+    if stream:
+        _response = stream_response(response)
+        if _response is not None:
+            return _response
     content = response.content or response.reason
     status = response.status_code
     response_headers = response.headers
@@ -263,6 +248,39 @@ def proxy(request, url=None, response_callback=None,
             return fetch_response_headers(_response, response_headers)
 
 
+def stream_response(response, chunk_size=None):
+    """
+    Builds a StreamingHttpResponse forwarding the upstream chunks as they come.
+
+    Returns None when the upstream response must go through the buffered path
+    (errors, redirects and gzipped payloads), which will read the whole content.
+    """
+    status = response.status_code
+    content_type = response.headers.get('Content-Type')
+    if status >= 300 or content_type == 'gzip':
+        return None
+
+    chunk_size = chunk_size or getattr(settings, 'PROXY_STREAMING_CHUNK_SIZE', 65536)
+
+    def _iter_content():
+        try:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                if chunk:
+                    yield chunk
+        finally:
+            response.close()
+
+    _response = StreamingHttpResponse(
+        _iter_content(),
+        status=status,
+        content_type=content_type)
+    # 'iter_content' yields the decoded payload, so the upstream length and encoding do not apply
+    _response_headers = {
+        _header: _value for _header, _value in response.headers.items()
+        if _header.lower() not in ('content-length', 'content-encoding', 'transfer-encoding')}
+    return fetch_response_headers(_response, _response_headers)
+
+
 def download(request, resourceid, sender=Dataset):
 
     _not_authorized = _("You are not authorized to download this resource.")
@@ -276,23 +294,15 @@ def download(request, resourceid, sender=Dataset):
                               permission_msg=_not_permitted)
 
     if isinstance(instance, ResourceBase):
-        # Create Target Folder
-        dirpath = tempfile.mkdtemp(dir=settings.STATIC_ROOT)
-        dir_time_suffix = get_dir_time_suffix()
-        target_folder = os.path.join(dirpath, dir_time_suffix)
-        if not os.path.exists(target_folder):
-            os.makedirs(target_folder)
-
         dataset_files = []
         try:
             files = instance.resourcebase_ptr.files
-            # Copy all Dataset related files into a temporary folder
+            # Check we can access all the Dataset related files
             for file_path in files:
                 if storage_manager.exists(file_path):
-                    dataset_files.append(file_path)
                     filename = os.path.basename(file_path)
-                    with open(f"{target_folder}/{filename}", 'wb+') as f:
-                        f.write(storage_manager.open(file_path).read())
+                    if filename not in [_f[0] for _f in dataset_files]:
+                        dataset_files.append((filename, file_path))
                 else:
                     return HttpResponse(
                         loader.render_to_string(
@@ -314,13 +324,11 @@ def download(request, resourceid, sender=Dataset):
                         },
                         request=request), status=404)
 
-            # ZIP everything and return
+            # ZIP everything on the fly while sending it
             target_file_name = "".join([instance.name, ".zip"])
-            target_file = os.path.join(dirpath, target_file_name)
-            zip_dir(target_folder, target_file)
             register_event(request, 'download', instance)
-            response = HttpResponse(
-                content=open(target_file, mode='rb'),
+            response = StreamingHttpResponse(
+                zip_stream(dataset_files, open_file=storage_manager.open),
                 status=200,
                 content_type="application/zip")
             response['Content-Disposition'] = f'attachment; filename="{target_file_name}"'
@@ -337,9 +345,6 @@ def download(request, resourceid, sender=Dataset):
                         'error_message': _no_files_found
                     },
                     request=request), status=404)
-        finally:
-            if target_folder is not None:
-                shutil.rmtree(target_folder, ignore_errors=True)
     return HttpResponse(
         loader.render_to_string(
             '401.html',
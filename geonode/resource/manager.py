@@ -19,6 +19,7 @@
 import copy
 import json
 import typing
+import time
 import logging
 import importlib
 
@@ -28,9 +29,7 @@ from abc import ABCMeta, abstractmethod
 from guardian.models import (
     UserObjectPermission,
     GroupObjectPermission)
-from guardian.shortcuts import (
-    assign_perm,
-    get_anonymous_user)
+from guardian.shortcuts import get_anonymous_user
 
 from django.conf import settings
 from django.db import transaction
@@ -53,8 +52,10 @@ from geonode.groups.conf import settings as groups_settings
 from geonode.security.utils import (
     perms_as_set,
     get_user_groups,
+    clear_user_perms_cache,
     set_owner_permissions,
     get_obj_group_managers,
+    BulkPermissionsAssigner,
     skip_registered_members_common_group)
 
 from . import settings as rm_settings
@@ -554,6 +555,7 @@ class ResourceManager(ResourceManagerInterface):
                     GroupObjectPermission.objects.filter(
                         content_type=ContentType.objects.get_for_model(_resource.get_self_resource()),
                         object_pk=_resource.id).delete()
+                    clear_user_perms_cache()
                     if not self._concrete_resource_manager.remove_permissions(uuid, instance=_resource):
                         raise Exception("Could not complete concrete manager operation successfully!")
                 _resource.set_processing_state(enumerations.STATE_PROCESSED)
@@ -573,162 +575,10 @@ class ResourceManager(ResourceManagerInterface):
             try:
                 with transaction.atomic():
                     logger.debug(f'Setting permissions {permissions} on {_resource}')
-
-                    def assignable_perm_condition(perm, resource_type):
-                        _assignable_perm_policy_condition = (perm in DOWNLOAD_PERMISSIONS and resource_type in DOWNLOADABLE_RESOURCES) or \
-                            (perm in DATASET_EDIT_DATA_PERMISSIONS and resource_type in DATA_EDITABLE_RESOURCES_SUBTYPES) or \
-                            (perm not in (DOWNLOAD_PERMISSIONS + DATASET_EDIT_DATA_PERMISSIONS))
-                        logger.debug(f" perm: {perm} - resource_type: {resource_type} --> assignable: {_assignable_perm_policy_condition}")
-                        return _assignable_perm_policy_condition
-
-                    # default permissions for owner
-                    if owner and owner != _resource.owner:
-                        _resource.owner = owner
-                        ResourceBase.objects.filter(uuid=_resource.uuid).update(owner=owner)
-                    _owner = _resource.owner
-                    _resource_type = _resource.resource_type or _resource.polymorphic_ctype.name
-
-                    """
-                    Remove all the permissions except for the owner and assign the
-                    view permission to the anonymous group
-                    """
-                    self.remove_permissions(uuid, instance=_resource)
-
-                    if permissions is not None and len(permissions):
-                        """
-                        Sets an object's the permission levels based on the perm_spec JSON.
-
-                        the mapping looks like:
-                        {
-                            'users': {
-                                'AnonymousUser': ['view'],
-                                <username>: ['perm1','perm2','perm3'],
-                                <username2>: ['perm1','perm2','perm3']
-                                ...
-                            },
-                            'groups': [
-                                <groupname>: ['perm1','perm2','perm3'],
-                                <groupname2>: ['perm1','perm2','perm3'],
-                                ...
-                            ]
-                        }
-                        """
-
-                        # default permissions for resource owner
-                        _perm_spec = set_owner_permissions(_resource, members=get_obj_group_managers(_owner))
-
-                        # Anonymous User group
-                        if 'users' in permissions and "AnonymousUser" in permissions['users']:
-                            anonymous_group = Group.objects.get(name='anonymous')
-                            for perm in permissions['users']['AnonymousUser']:
-                                if _resource_type == 'dataset' and perm in (
-                                        'change_dataset_data', 'change_dataset_style',
-                                        'add_dataset', 'change_dataset', 'delete_dataset'):
-                                    assign_perm(perm, anonymous_group, _resource.dataset)
-                                    _prev_perm = _perm_spec["groups"].get(anonymous_group, []) if "groups" in _perm_spec else []
-                                    _perm_spec["groups"][anonymous_group] = set.union(perms_as_set(_prev_perm), perms_as_set(perm))
-                                elif assignable_perm_condition(perm, _resource_type):
-                                    assign_perm(perm, anonymous_group, _resource.get_self_resource())
-                                    _prev_perm = _perm_spec["groups"].get(anonymous_group, []) if "groups" in _perm_spec else []
-                                    _perm_spec["groups"][anonymous_group] = set.union(perms_as_set(_prev_perm), perms_as_set(perm))
-
-                        # All the other users
-                        if 'users' in permissions and len(permissions['users']) > 0:
-                            for user, perms in permissions['users'].items():
-                                _user = get_user_model().objects.get(username=user)
-                                if _user != _resource.owner and user != "AnonymousUser":
-                                    for perm in perms:
-                                        if _resource_type == 'dataset' and perm in (
-                                                'change_dataset_data', 'change_dataset_style',
-                                                'add_dataset', 'change_dataset', 'delete_dataset'):
-                                            assign_perm(perm, _user, _resource.dataset)
-                                            _prev_perm = _perm_spec["users"].get(_user, []) if "users" in _perm_spec else []
-                                            _perm_spec["users"][_user] = set.union(perms_as_set(_prev_perm), perms_as_set(perm))
-                                        elif assignable_perm_condition(perm, _resource_type):
-                                            assign_perm(perm, _user, _resource.get_self_resource())
-                                            _prev_perm = _perm_spec["users"].get(_user, []) if "users" in _perm_spec else []
-                                            _perm_spec["users"][_user] = set.union(perms_as_set(_prev_perm), perms_as_set(perm))
-
-                        # All the other groups
-                        if 'groups' in permissions and len(permissions['groups']) > 0:
-                            for group, perms in permissions['groups'].items():
-                                _group = Group.objects.get(name=group)
-                                for perm in perms:
-                                    if _resource_type == 'dataset' and perm in (
-                                            'change_dataset_data', 'change_dataset_style',
-                                            'add_dataset', 'change_dataset', 'delete_dataset'):
-                                        assign_perm(perm, _group, _resource.dataset)
-                                        _prev_perm = _perm_spec["groups"].get(_group, []) if "groups" in _perm_spec else []
-                                        _perm_spec["groups"][_group] = set.union(perms_as_set(_prev_perm), perms_as_set(perm))
-                                    elif assignable_perm_condition(perm, _resource_type):
-                                        assign_perm(perm, _group, _resource.get_self_resource())
-                                        _prev_perm = _perm_spec["groups"].get(_group, []) if "groups" in _perm_spec else []
-                                        _perm_spec["groups"][_group] = set.union(perms_as_set(_prev_perm), perms_as_set(perm))
-
-                        # AnonymousUser
-                        if 'users' in permissions and len(permissions['users']) > 0:
-                            if "AnonymousUser" in permissions['users']:
-                                _user = get_anonymous_user()
-                                perms = permissions['users']["AnonymousUser"]
-                                for perm in perms:
-                                    if _resource_type == 'dataset' and perm in (
-                                            'change_dataset_data', 'change_dataset_style',
-                                            'add_dataset', 'change_dataset', 'delete_dataset'):
-                                        assign_perm(perm, _user, _resource.dataset)
-                                        _prev_perm = _perm_spec["users"].get(_user, []) if "users" in _perm_spec else []
-                                        _perm_spec["users"][_user] = set.union(perms_as_set(_prev_perm), perms_as_set(perm))
-                                    elif assignable_perm_condition(perm, _resource_type):
-                                        assign_perm(perm, _user, _resource.get_self_resource())
-                                        _prev_perm = _perm_spec["users"].get(_user, []) if "users" in _perm_spec else []
-                                        _perm_spec["users"][_user] = set.union(perms_as_set(_prev_perm), perms_as_set(perm))
-                    else:
-                        # default permissions for anonymous users
-                        anonymous_group, created = Group.objects.get_or_create(name='anonymous')
-
-                        if not anonymous_group:
-                            raise Exception("Could not acquire 'anonymous' Group.")
-
-                        # default permissions for resource owner
-                        _perm_spec = set_owner_permissions(_resource, members=get_obj_group_managers(_owner))
-
-                        # Anonymous
-                        anonymous_can_view = settings.DEFAULT_ANONYMOUS_VIEW_PERMISSION
-                        if anonymous_can_view:
-                            assign_perm('view_resourcebase',
-                                        anonymous_group, _resource.get_self_resource())
-                            _prev_perm = _perm_spec["groups"].get(anonymous_group, []) if "groups" in _perm_spec else []
-                            _perm_spec["groups"][anonymous_group] = set.union(perms_as_set(_prev_perm), perms_as_set('view_resourcebase'))
-                        else:
-                            for user_group in get_user_groups(_owner):
-                                if not skip_registered_members_common_group(user_group):
-                                    assign_perm('view_resourcebase',
-                                                user_group, _resource.get_self_resource())
-                                    _prev_perm = _perm_spec["groups"].get(user_group, []) if "groups" in _perm_spec else []
-                                    _perm_spec["groups"][user_group] = set.union(perms_as_set(_prev_perm), perms_as_set('view_resourcebase'))
-
-                        if assignable_perm_condition('download_resourcebase', _resource_type):
-                            anonymous_can_download = settings.DEFAULT_ANONYMOUS_DOWNLOAD_PERMISSION
-                            if anonymous_can_download:
-                                assign_perm('download_resourcebase',
-                                            anonymous_group, _resource.get_self_resource())
-                                _prev_perm = _perm_spec["groups"].get(anonymous_group, []) if "groups" in _perm_spec else []
-                                _perm_spec["groups"][anonymous_group] = set.union(perms_as_set(_prev_perm), perms_as_set('download_resourcebase'))
-                            else:
-                                for user_group in get_user_groups(_owner):
-                                    if not skip_registered_members_common_group(user_group):
-                                        assign_perm('download_resourcebase',
-                                                    user_group, _resource.get_self_resource())
-                                        _prev_perm = _perm_spec["groups"].get(user_group, []) if "groups" in _perm_spec else []
-                                        _perm_spec["groups"][user_group] = set.union(perms_as_set(_prev_perm), perms_as_set('download_resourcebase'))
-
-                        if _resource.__class__.__name__ == 'Dataset':
-                            # only for layer owner
-                            assign_perm('change_dataset_data', _owner, _resource)
-                            assign_perm('change_dataset_style', _owner, _resource)
-                            _prev_perm = _perm_spec["users"].get(_owner, []) if "users" in _perm_spec else []
-                            _perm_spec["users"][_owner] = set.union(perms_as_set(_prev_perm), perms_as_set(['change_dataset_data', 'change_dataset_style']))
-
-                        _resource.handle_moderated_uploads()
+                    _assigner = BulkPermissionsAssigner()
+                    _perm_spec = self._collect_permissions(_resource, _assigner, owner=owner, permissions=permissions)
+                    _assigner.apply()
+                    clear_user_perms_cache()
 
                     # Fixup GIS Backend Security Rules Accordingly
                     if not self._concrete_resource_manager.set_permissions(
@@ -743,6 +593,218 @@ class ResourceManager(ResourceManagerInterface):
                 _resource.set_dirty_state()
         return False
 
+    def set_permissions_bulk(self, resources: typing.Iterable[ResourceBase], /, owner: settings.AUTH_USER_MODEL = None, permissions: dict = {}, created: bool = False) -> dict:
+        """Sets the same permissions on a list of resources.
+
+        The guardian object permissions of all the resources are diffed against the target ones and
+        written with a single bulk delete and bulk create in one transaction.
+
+        Returns a dictionary with the seconds spent on every resource uuid, or None if it failed.
+        """
+        _timings = {}
+        _resources = []
+        _assigner = BulkPermissionsAssigner()
+        with transaction.atomic():
+            for _resource in resources:
+                _start = time.perf_counter()
+                _resource = _resource.get_real_instance()
+                _resource.set_processing_state(enumerations.STATE_RUNNING)
+                _resource_assigner = BulkPermissionsAssigner()
+                try:
+                    with transaction.atomic():
+                        _perm_spec = self._collect_permissions(_resource, _resource_assigner, owner=owner, permissions=permissions)
+                    _assigner.update(_resource_assigner)
+                    _resources.append((_resource, _perm_spec))
+                    _timings[_resource.uuid] = time.perf_counter() - _start
+                except Exception as e:
+                    logger.exception(e)
+                    _resource.set_processing_state(enumerations.STATE_INVALID)
+                    _resource.set_dirty_state()
+                    _timings[_resource.uuid] = None
+
+            _start = time.perf_counter()
+            _added, _removed = _assigner.apply()
+            clear_user_perms_cache()
+            logger.debug(f'Added {_added} and removed {_removed} object permissions in {time.perf_counter() - _start:.3f} secs')
+
+        for _resource, _perm_spec in _resources:
+            _start = time.perf_counter()
+            try:
+                # Fixup GIS Backend Security Rules Accordingly
+                if not self._concrete_resource_manager.set_permissions(
+                        _resource.uuid, instance=_resource, owner=owner, permissions=_perm_spec, created=created):
+                    logger.error(Exception("Could not complete concrete manager operation successfully!"))
+                _resource.set_processing_state(enumerations.STATE_PROCESSED)
+            except Exception as e:
+                logger.exception(e)
+                _resource.set_processing_state(enumerations.STATE_INVALID)
+                _resource.set_dirty_state()
+            _timings[_resource.uuid] += time.perf_counter() - _start
+            logger.debug(f'Set permissions on {_resource} in {_timings[_resource.uuid]:.3f} secs')
+        return _timings
+
+    def _collect_permissions(self, _resource: ResourceBase, assigner: BulkPermissionsAssigner, owner: settings.AUTH_USER_MODEL = None, permissions: dict = {}) -> dict:
+        """Collects on the 'assigner' the object permissions of the resource accordingly to the 'perm_spec'.
+        Returns the 'perm_spec' to be synced with the GIS Backend.
+        """
+        def assignable_perm_condition(perm, resource_type):
+            _assignable_perm_policy_condition = (perm in DOWNLOAD_PERMISSIONS and resource_type in DOWNLOADABLE_RESOURCES) or \
+                (perm in DATASET_EDIT_DATA_PERMISSIONS and resource_type in DATA_EDITABLE_RESOURCES_SUBTYPES) or \
+                (perm not in (DOWNLOAD_PERMISSIONS + DATASET_EDIT_DATA_PERMISSIONS))
+            logger.debug(f" perm: {perm} - resource_type: {resource_type} --> assignable: {_assignable_perm_policy_condition}")
+            return _assignable_perm_policy_condition
+
+        # default permissions for owner
+        if owner and owner != _resource.owner:
+            _resource.owner = owner
+            ResourceBase.objects.filter(uuid=_resource.uuid).update(owner=owner)
+        _owner = _resource.owner
+        _resource_type = _resource.resource_type or _resource.polymorphic_ctype.name
+
+        """
+        Replace all the permissions except for the owner and assign the
+        view permission to the anonymous group
+        """
+        assigner.track(_resource.get_self_resource())
+        if isinstance(_resource, Dataset):
+            assigner.track(_resource)
+        if not self._concrete_resource_manager.remove_permissions(_resource.uuid, instance=_resource):
+            logger.warning(f"Could not remove the GIS Backend Security Rules of {_resource}")
+
+        if permissions is not None and len(permissions):
+            """
+            Sets an object's the permission levels based on the perm_spec JSON.
+
+            the mapping looks like:
+            {
+                'users': {
+                    'AnonymousUser': ['view'],
+                    <username>: ['perm1','perm2','perm3'],
+                    <username2>: ['perm1','perm2','perm3']
+                    ...
+                },
+                'groups': [
+                    <groupname>: ['perm1','perm2','perm3'],
+                    <groupname2>: ['perm1','perm2','perm3'],
+                    ...
+                ]
+            }
+            """
+
+            # default permissions for resource owner
+            _perm_spec = set_owner_permissions(_resource, members=get_obj_group_managers(_owner), assigner=assigner)
+
+            # Anonymous User group
+            if 'users' in permissions and "AnonymousUser" in permissions['users']:
+                anonymous_group = Group.objects.get(name='anonymous')
+                for perm in permissions['users']['AnonymousUser']:
+                    if _resource_type == 'dataset' and perm in (
+                            'change_dataset_data', 'change_dataset_style',
+                            'add_dataset', 'change_dataset', 'delete_dataset'):
+                        assigner.assign(perm, anonymous_group, _resource.dataset)
+                        _prev_perm = _perm_spec["groups"].get(anonymous_group, []) if "groups" in _perm_spec else []
+                        _perm_spec["groups"][anonymous_group] = set.union(perms_as_set(_prev_perm), perms_as_set(perm))
+                    elif assignable_perm_condition(perm, _resource_type):
+                        assigner.assign(perm, anonymous_group, _resource.get_self_resource())
+                        _prev_perm = _perm_spec["groups"].get(anonymous_group, []) if "groups" in _perm_spec else []
+                        _perm_spec["groups"][anonymous_group] = set.union(perms_as_set(_prev_perm), perms_as_set(perm))
+
+            # All the other users
+            if 'users' in permissions and len(permissions['users']) > 0:
+                for user, perms in permissions['users'].items():
+                    _user = get_user_model().objects.get(username=user)
+                    if _user != _resource.owner and user != "AnonymousUser":
+                        for perm in perms:
+                            if _resource_type == 'dataset' and perm in (
+                                    'change_dataset_data', 'change_dataset_style',
+                                    'add_dataset', 'change_dataset', 'delete_dataset'):
+                                assigner.assign(perm, _user, _resource.dataset)
+                                _prev_perm = _perm_spec["users"].get(_user, []) if "users" in _perm_spec else []
+                                _perm_spec["users"][_user] = set.union(perms_as_set(_prev_perm), perms_as_set(perm))
+                            elif assignable_perm_condition(perm, _resource_type):
+                                assigner.assign(perm, _user, _resource.get_self_resource())
+                                _prev_perm = _perm_spec["users"].get(_user, []) if "users" in _perm_spec else []
+                                _perm_spec["users"][_user] = set.union(perms_as_set(_prev_perm), perms_as_set(perm))
+
+            # All the other groups
+            if 'groups' in permissions and len(permissions['groups']) > 0:
+                for group, perms in permissions['groups'].items():
+                    _group = Group.objects.get(name=group)
+                    for perm in perms:
+                        if _resource_type == 'dataset' and perm in (
+                                'change_dataset_data', 'change_dataset_style',
+                                'add_dataset', 'change_dataset', 'delete_dataset'):
+                            assigner.assign(perm, _group, _resource.dataset)
+                            _prev_perm = _perm_spec["groups"].get(_group, []) if "groups" in _perm_spec else []
+                            _perm_spec["groups"][_group] = set.union(perms_as_set(_prev_perm), perms_as_set(perm))
+                        elif assignable_perm_condition(perm, _resource_type):
+                            assigner.assign(perm, _group, _resource.get_self_resource())
+                            _prev_perm = _perm_spec["groups"].get(_group, []) if "groups" in _perm_spec else []
+                            _perm_spec["groups"][_group] = set.union(perms_as_set(_prev_perm), perms_as_set(perm))
+
+            # AnonymousUser
+            if 'users' in permissions and len(permissions['users']) > 0:
+                if "AnonymousUser" in permissions['users']:
+                    _user = get_anonymous_user()
+                    perms = permissions['users']["AnonymousUser"]
+                    for perm in perms:
+                        if _resource_type == 'dataset' and perm in (
+                                'change_dataset_data', 'change_dataset_style',
+                                'add_dataset', 'change_dataset', 'delete_dataset'):
+                            assigner.assign(perm, _user, _resource.dataset)
+                            _prev_perm = _perm_spec["users"].get(_user, []) if "users" in _perm_spec else []
+                            _perm_spec["users"][_user] = set.union(perms_as_set(_prev_perm), perms_as_set(perm))
+                        elif assignable_perm_condition(perm, _resource_type):
+                            assigner.assign(perm, _user, _resource.get_self_resource())
+                            _prev_perm = _perm_spec["users"].get(_user, []) if "users" in _perm_spec else []
+                            _perm_spec["users"][_user] = set.union(perms_as_set(_prev_perm), perms_as_set(perm))
+        else:
+            # default permissions for anonymous users
+            anonymous_group, created = Group.objects.get_or_create(name='anonymous')
+
+            if not anonymous_group:
+                raise Exception("Could not acquire 'anonymous' Group.")
+
+            # default permissions for resource owner
+            _perm_spec = set_owner_permissions(_resource, members=get_obj_group_managers(_owner), assigner=assigner)
+
+            # Anonymous
+            anonymous_can_view = settings.DEFAULT_ANONYMOUS_VIEW_PERMISSION
+            if anonymous_can_view:
+                assigner.assign('view_resourcebase', anonymous_group, _resource.get_self_resource())
+                _prev_perm = _perm_spec["groups"].get(anonymous_group, []) if "groups" in _perm_spec else []
+                _perm_spec["groups"][anonymous_group] = set.union(perms_as_set(_prev_perm), perms_as_set('view_resourcebase'))
+            else:
+                for user_group in get_user_groups(_owner):
+                    if not skip_registered_members_common_group(user_group):
+                        assigner.assign('view_resourcebase', user_group, _resource.get_self_resource())
+                        _prev_perm = _perm_spec["groups"].get(user_group, []) if "groups" in _perm_spec else []
+                        _perm_spec["groups"][user_group] = set.union(perms_as_set(_prev_perm), perms_as_set('view_resourcebase'))
+
+            if assignable_perm_condition('download_resourcebase', _resource_type):
+                anonymous_can_download = settings.DEFAULT_ANONYMOUS_DOWNLOAD_PERMISSION
+                if anonymous_can_download:
+                    assigner.assign('download_resourcebase', anonymous_group, _resource.get_self_resource())
+                    _prev_perm = _perm_spec["groups"].get(anonymous_group, []) if "groups" in _perm_spec else []
+                    _perm_spec["groups"][anonymous_group] = set.union(perms_as_set(_prev_perm), perms_as_set('download_resourcebase'))
+                else:
+                    for user_group in get_user_groups(_owner):
+                        if not skip_registered_members_common_group(user_group):
+                            assigner.assign('download_resourcebase', user_group, _resource.get_self_resource())
+                            _prev_perm = _perm_spec["groups"].get(user_group, []) if "groups" in _perm_spec else []
+                            _perm_spec["groups"][user_group] = set.union(perms_as_set(_prev_perm), perms_as_set('download_resourcebase'))
+
+            if _resource.__class__.__name__ == 'Dataset':
+                # only for layer owner
+                assigner.assign('change_dataset_data', _owner, _resource)
+                assigner.assign('change_dataset_style', _owner, _resource)
+                _prev_perm = _perm_spec["users"].get(_owner, []) if "users" in _perm_spec else []
+                _perm_spec["users"][_owner] = set.union(perms_as_set(_prev_perm), perms_as_set(['change_dataset_data', 'change_dataset_style']))
+
+            _resource.handle_moderated_uploads()
+
+        return _perm_spec
+
     def get_workflow_permissions(self, uuid: str, /, instance: ResourceBase = None, permissions: dict = {}) -> dict:
         """
         Adapts the provided "perm_spec" accordingly to the following schema:
@@ -264,6 +264,39 @@ class TestResourceManager(GeoNodeBaseTestSupport):
         self.assertTrue(self.rm.set_permissions(map.uuid, instance=map, permissions=perm_spec))
         self.assertFalse(norman.has_perm('download_resourcebase', map.get_self_resource()))
 
+    def test_set_permissions_bulk(self):
+        norman = get_user_model().objects.get(username="norman")
+        bobby = get_user_model().objects.get(username="bobby")
+        doc = create_single_doc("test_bulk_doc")
+        map = create_single_map("test_bulk_map")
+        perm_spec = {
+            "users": {
+                "norman": ['view_resourcebase', 'download_resourcebase'],
+            },
+            "groups": {}
+        }
+        timings = self.rm.set_permissions_bulk([doc, map], permissions=perm_spec)
+        self.assertEqual(set(timings.keys()), {doc.uuid, map.uuid})
+        self.assertTrue(all(_t is not None for _t in timings.values()))
+        self.assertTrue(norman.has_perm('view_resourcebase', doc.get_self_resource()))
+        self.assertTrue(norman.has_perm('download_resourcebase', doc.get_self_resource()))
+        self.assertTrue(norman.has_perm('view_resourcebase', map.get_self_resource()))
+        # "download" permissions are NOT allowed on "Maps"
+        self.assertFalse(norman.has_perm('download_resourcebase', map.get_self_resource()))
+
+        # The previous permissions are replaced by the new ones
+        perm_spec = {
+            "users": {
+                "bobby": ['view_resourcebase'],
+            },
+            "groups": {}
+        }
+        self.rm.set_permissions_bulk([doc, map], permissions=perm_spec)
+        for resource in (doc, map):
+            self.assertFalse(norman.has_perm('view_resourcebase', resource.get_self_resource()))
+            self.assertTrue(bobby.has_perm('view_resourcebase', resource.get_self_resource()))
+            self.assertTrue(resource.owner.has_perm('change_resourcebase', resource.get_self_resource()))
+
     def test_set_thumbnail(self):
         doc = create_single_doc("test_thumb_doc")
         dt = create_single_dataset("test_thumb_dataset")
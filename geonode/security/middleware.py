@@ -28,6 +28,7 @@ from django.utils.deprecation import MiddlewareMixin
 from geonode import geoserver
 from geonode.utils import check_ogc_backend
 from geonode.base.auth import get_token_object_from_session, basic_auth_authenticate_user
+from geonode.security.utils import user_perms_cache
 
 from guardian.shortcuts import get_anonymous_user
 
@@ -143,3 +144,17 @@ class SessionControlMiddleware(MiddlewareMixin):
             if not any(path.match(request.path) for path in white_list):
                 return HttpResponseRedirect(
                     f'{self.redirect_to}?next={request.path}')
+
+
+class UserPermsCacheMiddleware:
+    """
+    Middleware enabling the users permissions cache for the whole request, so that
+    the permissions of a user on a resource are computed only once per request.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with user_perms_cache():
+            return self.get_response(request)
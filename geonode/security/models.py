@@ -19,18 +19,18 @@
 
 import copy
 import logging
-import operator
 import traceback
 
-from functools import reduce
+from itertools import chain
+from collections import defaultdict
 
-from django.db.models import Q
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ObjectDoesNotExist
 from django.contrib.auth.models import Group, Permission
 from django.contrib.contenttypes.models import ContentType
 
+from guardian.core import ObjectPermissionChecker
 from guardian.shortcuts import (
     assign_perm,
     get_perms,
@@ -51,12 +51,27 @@ from .permissions import (
 
 from .utils import (
     get_users_with_perms,
+    get_user_perms_cache,
+    get_user_perms_cache_key,
     get_user_obj_perms_model,
     skip_registered_members_common_group)
 
 logger = logging.getLogger(__name__)
 
 
+def get_permissions_to_fetch(subtype):
+    """
+    Returns the permissions which can be granted on a resource with the given subtype.
+    """
+    PERMISSIONS_TO_FETCH = VIEW_PERMISSIONS + DOWNLOAD_PERMISSIONS + ADMIN_PERMISSIONS + SERVICE_PERMISSIONS
+    # include explicit permissions appliable to "subtype == 'vector'"
+    if subtype == 'vector':
+        PERMISSIONS_TO_FETCH += DATASET_ADMIN_PERMISSIONS
+    elif subtype == 'raster':
+        PERMISSIONS_TO_FETCH += DATASET_EDIT_STYLE_PERMISSIONS
+    return PERMISSIONS_TO_FETCH
+
+
 class PermissionLevelError(Exception):
     pass
 
@@ -365,58 +380,81 @@ class PermissionLevelMixin:
 
     def get_user_perms(self, user):
         """
-        Returns a list of permissions a user has on a given resource.
+        Returns the set of permissions a user has on a given resource.
+
+        When a users permissions cache is active (e.g. during a request, see
+        'UserPermsCacheMiddleware') the permissions are computed only once.
+        """
+        _cache = get_user_perms_cache()
+        if _cache is not None:
+            _key = get_user_perms_cache_key(user, self)
+            if _key not in _cache:
+                _cache[_key] = self._get_user_perms(user)
+            return set(_cache[_key])
+        return self._get_user_perms(user)
+
+    def _get_user_perms(self, user, prefetched=None):
+        """
+        Computes the permissions a user has on a given resource.
+
+        'prefetched' is filled by 'get_user_perms_for' in order to share the lookups among many resources:
+         - 'config': the current Configuration
+         - 'checker': a guardian ObjectPermissionChecker with the objects permissions prefetched
+         - 'resource_perms': {(ctype id, subtype): codenames fetchable on that kind of resource}
+         - 'user_perms': {(ctype id, object pk): codenames directly assigned to the user}
+         - 'granted_perms': codenames assigned to any user on any object
         """
         # To avoid circular import
         from geonode.base.models import Configuration
 
-        config = Configuration.load()
+        prefetched = prefetched or {}
+        config = prefetched.get('config') or Configuration.load()
         ctype = ContentType.objects.get_for_model(self)
-        PERMISSIONS_TO_FETCH = VIEW_PERMISSIONS + DOWNLOAD_PERMISSIONS + ADMIN_PERMISSIONS + SERVICE_PERMISSIONS
-        # include explicit permissions appliable to "subtype == 'vector'"
-        if self.subtype == 'vector':
-            PERMISSIONS_TO_FETCH += DATASET_ADMIN_PERMISSIONS
-        elif self.subtype == 'raster':
-            PERMISSIONS_TO_FETCH += DATASET_EDIT_STYLE_PERMISSIONS
-
-        resource_perms = Permission.objects.filter(
-            codename__in=PERMISSIONS_TO_FETCH,
-            content_type_id=ctype.id
-        ).values_list('codename', flat=True)
+        PERMISSIONS_TO_FETCH = get_permissions_to_fetch(self.subtype)
+
+        if (ctype.id, self.subtype) in prefetched.get('resource_perms', {}):
+            resource_perms = prefetched['resource_perms'][(ctype.id, self.subtype)]
+        else:
+            resource_perms = set(Permission.objects.filter(
+                codename__in=PERMISSIONS_TO_FETCH,
+                content_type_id=ctype.id
+            ).values_list('codename', flat=True))
 
         # Don't filter for admin users
         if not user.is_superuser:
             user_model = get_user_obj_perms_model(self)
-            user_resource_perms = user_model.objects.filter(
-                object_pk=self.pk,
-                content_type_id=ctype.id,
-                user__username=str(user),
-                permission__codename__in=resource_perms
-            )
+            if 'user_perms' in prefetched:
+                user_resource_perms = prefetched['user_perms'].get((ctype.id, str(self.pk)), set()) & resource_perms
+            else:
+                user_resource_perms = set(user_model.objects.filter(
+                    object_pk=self.pk,
+                    content_type_id=ctype.id,
+                    user__username=str(user),
+                    permission__codename__in=resource_perms
+                ).values_list('permission__codename', flat=True))
             # get user's implicit perms for anyone flag
-            implicit_perms = get_perms(user, self)
+            implicit_perms = prefetched['checker'].get_perms(self) if 'checker' in prefetched else get_perms(user, self)
             # filter out implicit permissions unappliable to "subtype != 'vector'"
             if self.subtype == 'raster':
                 implicit_perms = list(set(implicit_perms) - set(DATASET_EDIT_DATA_PERMISSIONS))
             elif self.subtype != 'vector':
                 implicit_perms = list(set(implicit_perms) - set(DATASET_ADMIN_PERMISSIONS))
 
-            resource_perms = user_resource_perms.union(
-                user_model.objects.filter(permission__codename__in=implicit_perms)
-            ).values_list('permission__codename', flat=True)
+            if 'granted_perms' in prefetched:
+                granted_perms = prefetched['granted_perms'] & set(implicit_perms)
+            else:
+                granted_perms = set(user_model.objects.filter(
+                    permission__codename__in=implicit_perms
+                ).values_list('permission__codename', flat=True).distinct())
+            resource_perms = user_resource_perms | granted_perms
 
         # filter out permissions for edit, change or publish if readonly mode is active
         perm_prefixes = ['change', 'delete', 'publish']
         if config.read_only:
-            clauses = (Q(codename__contains=prefix) for prefix in perm_prefixes)
-            query = reduce(operator.or_, clauses)
-            if user.is_superuser:
-                resource_perms = resource_perms.exclude(query)
-            else:
-                perm_objects = Permission.objects.filter(codename__in=resource_perms)
-                resource_perms = perm_objects.exclude(query).values_list('codename', flat=True)
+            resource_perms = set(
+                _perm for _perm in resource_perms if not any(prefix in _perm for prefix in perm_prefixes))
 
-        return resource_perms
+        return set(resource_perms)
 
     def user_can(self, user, permission):
         """
@@ -431,3 +469,76 @@ class PermissionLevelMixin:
             return False
 
         return True
+
+
+def get_user_perms_for(user, resources):
+    """
+    Computes the permissions a user has on many resources, e.g. a page of results, with a fixed
+    number of queries. The users permissions cache, when active, is filled too, so that any
+    later 'get_user_perms' and 'user_can' calls on those resources won't hit the DB.
+
+    :return: {resource pk: permissions on both the resource and its self resource}
+    """
+    # To avoid circular import
+    from geonode.base.models import Configuration
+
+    _cache = get_user_perms_cache()
+    _pairs = [(_r, _r.get_self_resource()) for _r in resources]
+    _objects = {}
+    for _resource, _self_resource in _pairs:
+        for _obj in (_resource, _self_resource):
+            _objects[get_user_perms_cache_key(user, _obj)] = _obj
+
+    _perms = {}
+    _missing = {}
+    for _key, _obj in _objects.items():
+        if _cache is not None and _key in _cache:
+            _perms[_key] = _cache[_key]
+        else:
+            _missing[_key] = _obj
+
+    if _missing:
+        _ctypes_ids = set(_key[1] for _key in _missing)
+        _ctypes_perms = defaultdict(set)
+        for _ctype_id, _codename in Permission.objects.filter(
+                content_type_id__in=_ctypes_ids).values_list('content_type_id', 'codename'):
+            _ctypes_perms[_ctype_id].add(_codename)
+
+        prefetched = {
+            'config': Configuration.load(),
+            'resource_perms': {
+                (_key[1], _obj.subtype): _ctypes_perms[_key[1]] & set(get_permissions_to_fetch(_obj.subtype))
+                for _key, _obj in _missing.items()
+            }
+        }
+        if not user.is_superuser:
+            user_model = get_user_obj_perms_model(next(iter(_missing.values())))
+            _user_perms = defaultdict(set)
+            for _ctype_id, _object_pk, _codename in user_model.objects.filter(
+                    content_type_id__in=_ctypes_ids,
+                    object_pk__in=set(str(_key[2]) for _key in _missing),
+                    user__username=str(user)).values_list('content_type_id', 'object_pk', 'permission__codename'):
+                _user_perms[(_ctype_id, _object_pk)].add(_codename)
+            prefetched['user_perms'] = _user_perms
+
+            checker = ObjectPermissionChecker(user)
+            _by_model = defaultdict(list)
+            for _obj in _missing.values():
+                _by_model[_obj.__class__].append(_obj)
+            for _model_objects in _by_model.values():
+                checker.prefetch_perms(_model_objects)
+            prefetched['checker'] = checker
+
+            prefetched['granted_perms'] = set(user_model.objects.filter(
+                permission__codename__in=set(chain.from_iterable(_ctypes_perms.values()))
+            ).values_list('permission__codename', flat=True).distinct())
+
+        for _key, _obj in _missing.items():
+            _perms[_key] = _obj._get_user_perms(user, prefetched=prefetched)
+            if _cache is not None:
+                _cache[_key] = _perms[_key]
+
+    return {
+        _resource.pk: _perms[get_user_perms_cache_key(user, _resource)] | _perms[get_user_perms_cache_key(user, _self_resource)]
+        for _resource, _self_resource in _pairs
+    }
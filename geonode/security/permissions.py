@@ -72,6 +72,9 @@ ADMIN_PERMISSIONS = MANAGE_PERMISSIONS + EDIT_PERMISSIONS
 
 OWNER_PERMISSIONS = ADMIN_PERMISSIONS + VIEW_PERMISSIONS
 
+# Object permissions making a resource visible in the catalogue
+VISIBILITY_PERMISSIONS = VIEW_PERMISSIONS + EDIT_PERMISSIONS
+
 DATASET_EDIT_DATA_PERMISSIONS = ['change_dataset_data', ]
 DATASET_EDIT_STYLE_PERMISSIONS = ['change_dataset_style', ]
 DATASET_ADMIN_PERMISSIONS = DATASET_EDIT_DATA_PERMISSIONS + DATASET_EDIT_STYLE_PERMISSIONS
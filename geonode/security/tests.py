@@ -22,6 +22,7 @@ import logging
 import requests
 import importlib
 
+from unittest.mock import patch
 from requests.auth import HTTPBasicAuth
 from tastypie.test import ResourceTestCaseMixin
 
@@ -33,6 +34,7 @@ from django.test.testcases import TestCase
 from django.contrib.auth import get_user_model
 from django.test.utils import override_settings
 
+from guardian.models import GroupObjectPermission
 from guardian.shortcuts import (
     get_anonymous_user,
     assign_perm,
@@ -56,7 +58,8 @@ from geonode.layers.populate_datasets_data import create_dataset_data
 from geonode.base.models import (
     Configuration,
     UserGeoLimit,
-    GroupGeoLimit
+    GroupGeoLimit,
+    ResourceVisibility
 )
 from geonode.base.populate_test_data import (
     all_public,
@@ -73,12 +76,17 @@ from geonode.geoserver.security import (
     purge_geofence_all,
     sync_geofence_with_guardian,
     sync_resources_with_guardian,
+    get_dirty_resources_chunks,
+    GeoFenceRulesBatch,
     _get_gwc_filters_and_formats
 )
 
+from .models import get_user_perms_for
 from .utils import (
+    user_perms_cache,
     get_users_with_perms,
     get_visible_resources,
+    BulkPermissionsAssigner,
 )
 
 from .permissions import (
@@ -2031,6 +2039,84 @@ class SecurityRulesTests(TestCase):
             # TODO: DELAYED SECURITY MUST BE REVISED
             # self.assertFalse(clean_dataset.dirty_state)
 
+    def test_sync_resources_with_guardian_chunks(self):
+        _datasets = [self._l] + [create_single_dataset(f"test_dataset_{_i}") for _i in range(4)]
+        for _dataset in _datasets:
+            _dataset.set_dirty_state()
+        # The documents are not synced with GeoFence
+        Document.objects.update(dirty_state=True)
+        chunks = get_dirty_resources_chunks(chunk_size=2)
+        self.assertEqual([len(_chunk) for _chunk in chunks], [2, 2, 1])
+        self.assertEqual(
+            sum(chunks, []),
+            list(Dataset.objects.filter(dirty_state=True).order_by('last_updated', 'id').values_list('id', flat=True)))
+
+        synced, failed = sync_resources_with_guardian(resources_ids=chunks[0])
+        self.assertEqual((synced, failed), (2, 0))
+        self.assertEqual(
+            set(Dataset.objects.filter(dirty_state=False, id__in=sum(chunks, [])).values_list('id', flat=True)),
+            set(chunks[0]))
+        self.assertEqual(len(get_dirty_resources_chunks(chunk_size=2)), 2)
+
+    def test_sync_resources_with_guardian_keeps_resources_changed_while_synced_dirty(self):
+        self._l.set_dirty_state()
+
+        def _change_permissions(resource):
+            # a permissions change while the resource is being synced
+            Dataset.objects.filter(id=resource.id).update(dirty_state=True)
+
+        with patch('geonode.geoserver.security._sync_resource_with_guardian', side_effect=_change_permissions):
+            synced, failed = sync_resources_with_guardian(resources_ids=[self._l.id])
+        self.assertEqual((synced, failed), (1, 0))
+        self.assertTrue(Dataset.objects.get(id=self._l.id).dirty_state)
+
+        with patch('geonode.geoserver.security._sync_resource_with_guardian'):
+            sync_resources_with_guardian(resources_ids=[self._l.id])
+        self.assertFalse(Dataset.objects.get(id=self._l.id).dirty_state)
+
+
+class GeoFenceRulesBatchTests(TestCase):
+    """
+    Test the GeoFence rules diff computed by the rules batch
+    """
+
+    def _rule(self, _id, priority, access="ALLOW", **kwargs):
+        return dict(id=_id, priority=priority, layer="san_andres_y_providencia", access=access, **kwargs)
+
+    def test_purged_dataset_rules_are_diffed(self):
+        batch = GeoFenceRulesBatch()
+        batch.purge("geonode", "san_andres_y_providencia")
+        batch.add("geonode", "san_andres_y_providencia", "*", user="bobby")
+        batch.add("geonode", "san_andres_y_providencia", "WMS", group="registered-members")
+        batch.add("geonode", "san_andres_y_providencia", "WMS", group="registered-members")
+        existing = [
+            self._rule(2, 11, userName="bobby"),
+            self._rule(3, 12, roleName="ROLE_REGISTERED-MEMBERS", service="wms"),
+        ]
+        # Nothing changed
+        self.assertEqual(batch.diff(existing, "geonode", "san_andres_y_providencia"), ([], []))
+
+        # Only the rules after the first mismatch are replaced
+        existing[0]['access'] = "DENY"
+        to_delete, to_add = batch.diff(existing, "geonode", "san_andres_y_providencia")
+        self.assertEqual(to_delete, [2, 3])
+        self.assertEqual([_rule['user'] for _, _rule in to_add], ["bobby", None])
+
+        existing = [self._rule(2, 11, userName="bobby"), self._rule(4, 13, roleName="ROLE_ADMIN")]
+        to_delete, to_add = batch.diff(existing, "geonode", "san_andres_y_providencia")
+        self.assertEqual(to_delete, [4])
+        self.assertEqual([_rule['group'] for _, _rule in to_add], ["registered-members"])
+
+    def test_not_purged_dataset_rules_are_appended(self):
+        batch = GeoFenceRulesBatch()
+        batch.add("geonode", "san_andres_y_providencia", "*", user="bobby")
+        batch.add("geonode", "san_andres_y_providencia", "WFS", request="transaction", user="bobby", allow=False)
+        existing = [self._rule(2, 11, userName="bobby"), self._rule(4, 13, roleName="ROLE_ADMIN")]
+        to_delete, to_add = batch.diff(existing, "geonode", "san_andres_y_providencia")
+        self.assertEqual(to_delete, [])
+        self.assertEqual(len(to_add), 1)
+        self.assertEqual(to_add[0][0], ("bobby", None, "WFS", "TRANSACTION", "DENY", None))
+
 
 class TestGetUserGeolimits(TestCase):
 
@@ -2387,3 +2473,108 @@ class SetPermissionsTestCase(GeoNodeBaseTestSupport):
         for authorized_subject, expected_perms in expected.items():
             perms_got = [x for x in self.resource.get_self_resource().get_user_perms(authorized_subject)]
             self.assertSetEqual(set(expected_perms), set(perms_got), msg=f"user: {authorized_subject.username}")
+
+
+class ResourceVisibilityTestCase(GeoNodeBaseTestSupport):
+
+    def setUp(self):
+        self.owner, _ = get_user_model().objects.get_or_create(username="visibility_owner")
+        self.viewer, _ = get_user_model().objects.get_or_create(username="visibility_viewer")
+        self.group_profile, _ = GroupProfile.objects.get_or_create(slug="visibility_group")
+        self.resource = create_single_dataset(name="visibility_layer", owner=self.owner)
+        self.queryset = Dataset.objects.filter(id=self.resource.id)
+        # drop the default permissions granted to the anonymous and registered members groups
+        GroupObjectPermission.objects.filter(object_pk=str(self.resource.id)).delete()
+
+    def test_visibility_index_follows_user_permissions(self):
+        self.assertFalse(get_visible_resources(self.queryset, self.viewer).exists())
+
+        assign_perm("view_resourcebase", self.viewer, self.resource.get_self_resource())
+        self.assertTrue(
+            ResourceVisibility.objects.filter(resource_id=self.resource.id, user=self.viewer).exists())
+        self.assertTrue(get_visible_resources(self.queryset, self.viewer).exists())
+
+        # the resource is still visible with the change permission only
+        assign_perm("change_resourcebase", self.viewer, self.resource.get_self_resource())
+        remove_perm("view_resourcebase", self.viewer, self.resource.get_self_resource())
+        self.assertTrue(get_visible_resources(self.queryset, self.viewer).exists())
+
+        remove_perm("change_resourcebase", self.viewer, self.resource.get_self_resource())
+        self.assertFalse(
+            ResourceVisibility.objects.filter(resource_id=self.resource.id, user=self.viewer).exists())
+        self.assertFalse(get_visible_resources(self.queryset, self.viewer).exists())
+
+    def test_visibility_index_follows_group_permissions(self):
+        GroupMember.objects.get_or_create(group=self.group_profile, user=self.viewer, role="member")
+        assign_perm("view_resourcebase", self.group_profile.group, self.resource.get_self_resource())
+        self.assertTrue(get_visible_resources(self.queryset, self.viewer).exists())
+
+        remove_perm("view_resourcebase", self.group_profile.group, self.resource.get_self_resource())
+        self.assertFalse(get_visible_resources(self.queryset, self.viewer).exists())
+
+    def test_visibility_index_refresh(self):
+        assign_perm("view_resourcebase", self.viewer, self.resource.get_self_resource())
+        ResourceVisibility.objects.filter(resource_id=self.resource.id).delete()
+        self.assertFalse(get_visible_resources(self.queryset, self.viewer).exists())
+
+        ResourceVisibility.objects.refresh([self.resource.id])
+        self.assertTrue(get_visible_resources(self.queryset, self.viewer).exists())
+
+    def test_visibility_index_follows_bulk_permissions(self):
+        assigner = BulkPermissionsAssigner()
+        assigner.track(self.resource.get_self_resource())
+        assigner.assign("view_resourcebase", self.viewer, self.resource.get_self_resource())
+        assigner.apply()
+        self.assertTrue(
+            ResourceVisibility.objects.filter(resource_id=self.resource.id, user=self.viewer).exists())
+        self.assertTrue(get_visible_resources(self.queryset, self.viewer).exists())
+
+        # the tracked resource permissions are replaced, so the viewer ones are removed
+        assigner = BulkPermissionsAssigner()
+        assigner.track(self.resource.get_self_resource())
+        _, removed = assigner.apply()
+        self.assertEqual(removed, 1)
+        self.assertFalse(
+            ResourceVisibility.objects.filter(resource_id=self.resource.id, user=self.viewer).exists())
+        self.assertFalse(get_visible_resources(self.queryset, self.viewer).exists())
+
+
+class UserPermsCacheTestCase(GeoNodeBaseTestSupport):
+
+    def setUp(self):
+        self.owner, _ = get_user_model().objects.get_or_create(username="perms_cache_owner")
+        self.viewer, _ = get_user_model().objects.get_or_create(username="perms_cache_viewer")
+        self.resources = [
+            create_single_dataset(name=f"perms_cache_layer_{_i}", owner=self.owner) for _i in range(3)]
+
+    def test_user_perms_are_computed_once_per_request(self):
+        resource = self.resources[0]
+        with user_perms_cache():
+            expected = resource.get_user_perms(self.owner)
+            self.assertTrue(resource.user_can(self.owner, "view_resourcebase"))
+            with self.assertNumQueries(0):
+                self.assertSetEqual(resource.get_user_perms(self.owner), expected)
+                self.assertTrue(resource.user_can(self.owner, "view_resourcebase"))
+
+    def test_user_perms_cache_is_cleared_on_permissions_change(self):
+        resource = self.resources[0]
+        with user_perms_cache():
+            self.assertNotIn("change_resourcebase", resource.get_self_resource().get_user_perms(self.viewer))
+            resource_manager.set_permissions(
+                resource.uuid,
+                instance=resource,
+                permissions={"users": {self.viewer.username: ["view_resourcebase", "change_resourcebase"]}})
+            self.assertIn("change_resourcebase", resource.get_self_resource().get_user_perms(self.viewer))
+
+    def test_get_user_perms_for(self):
+        for user in (self.owner, self.viewer, get_user_model().objects.get(username="admin")):
+            expected = {
+                _r.pk: _r.get_user_perms(user) | _r.get_self_resource().get_user_perms(user) for _r in self.resources
+            }
+            self.assertDictEqual(get_user_perms_for(user, self.resources), expected)
+
+        with user_perms_cache():
+            get_user_perms_for(self.viewer, self.resources)
+            with self.assertNumQueries(0):
+                for resource in self.resources:
+                    resource.user_can(self.viewer, "view_resourcebase")
@@ -17,25 +17,79 @@
 #
 #########################################################################
 import logging
+from uuid import uuid4
+from hashlib import md5
 from itertools import chain
+from threading import local
+from contextlib import contextmanager
 
 from django.apps import apps
-from django.db.models import Q
+from django.db import connection, transaction
+from django.db.models import Q, Count
+from django.core.cache import cache
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.auth.models import Group, Permission
-from guardian.utils import get_user_obj_perms_model
+from guardian.models import UserObjectPermission, GroupObjectPermission
+from guardian.utils import get_identity, get_user_obj_perms_model
 from guardian.shortcuts import (
-    assign_perm,
+    assign_perm as _assign_perm,
+    get_anonymous_user,
     get_objects_for_user)
 
 from geonode.groups.models import GroupProfile
 from geonode.groups.conf import settings as groups_settings
-from geonode.security.permissions import DATASET_EDIT_DATA_PERMISSIONS
+from geonode.security.permissions import DATASET_EDIT_DATA_PERMISSIONS, VISIBILITY_PERMISSIONS
 
 logger = logging.getLogger(__name__)
 
+# Per-request cache of the users permissions on the resources; see 'PermissionLevelMixin.get_user_perms'
+_user_perms_cache = local()
+
+# Key of the token renewed every time the cached resources counts are invalidated; see 'get_resources_counts'
+RESOURCES_COUNTS_GENERATION_KEY = 'resources_counts_generation'
+
+
+@contextmanager
+def user_perms_cache():
+    """
+    Enables the users permissions cache for the enclosed block, e.g. a request or a task.
+    Nested blocks share the outer cache.
+    """
+    _owner = getattr(_user_perms_cache, 'perms', None) is None
+    if _owner:
+        _user_perms_cache.perms = {}
+    try:
+        yield _user_perms_cache.perms
+    finally:
+        if _owner:
+            _user_perms_cache.perms = None
+
+
+def get_user_perms_cache():
+    """
+    Returns the active users permissions cache, or None if no cache is active.
+    """
+    return getattr(_user_perms_cache, 'perms', None)
+
+
+def clear_user_perms_cache():
+    """
+    Empties the active users permissions cache; to be called whenever the permissions change.
+    """
+    _cache = get_user_perms_cache()
+    if _cache is not None:
+        _cache.clear()
+
+
+def get_user_perms_cache_key(user, resource):
+    return (
+        getattr(user, 'pk', None) if user and not user.is_anonymous else None,
+        ContentType.objects.get_for_model(resource).id,
+        resource.pk
+    )
+
 
 def get_visible_resources(queryset,
                           user,
@@ -68,11 +122,7 @@ def get_visible_resources(queryset,
 
     if not is_admin:
         if user:
-            _allowed_resources = get_objects_for_user(
-                user,
-                ['base.view_resourcebase', 'base.change_resourcebase'],
-                any_perm=True)
-            filter_set = filter_set.filter(id__in=_allowed_resources.values('id'))
+            filter_set = filter_set.filter(get_visibility_filter(user))
 
         if admin_approval_required:
             if not user or not user.is_authenticated or user.is_anonymous:
@@ -101,6 +151,23 @@ def get_visible_resources(queryset,
     return filter_set
 
 
+def get_visibility_filter(user):
+    """
+    Returns the filter matching the resources on which the user has any of the VISIBILITY_PERMISSIONS,
+    either directly or through its groups, by looking them up into the 'ResourceVisibility' index.
+    Equivalent to 'get_objects_for_user(user, VISIBILITY_PERMISSIONS, any_perm=True)'.
+    """
+    from geonode.base.models import ResourceVisibility
+
+    if user.is_anonymous:
+        user = get_anonymous_user()
+    # Global permissions beat the object ones
+    if any(user.has_perm(f'base.{_perm}') for _perm in VISIBILITY_PERMISSIONS):
+        return Q()
+    return Q(id__in=ResourceVisibility.objects.filter(
+        Q(user=user) | Q(group_id__in=user.groups.values('id'))).values('resource_id'))
+
+
 def get_users_with_perms(obj):
     """
     Override of the Guardian get_users_with_perms
@@ -151,8 +218,13 @@ def perms_as_set(perm) -> set:
     return perm if isinstance(perm, set) else set(perm if isinstance(perm, list) else [perm])
 
 
-def set_owner_permissions(resource, members=None):
-    """assign all admin permissions to the owner"""
+def set_owner_permissions(resource, members=None, assigner=None):
+    """assign all admin permissions to the owner
+
+    When an 'assigner' (see BulkPermissionsAssigner) is given the permissions are collected
+    on it instead of being written one by one.
+    """
+    assign_perm = assigner.assign if assigner else _assign_perm
     from .permissions import (
         VIEW_PERMISSIONS,
         DOWNLOAD_PERMISSIONS,
@@ -215,6 +287,132 @@ def set_owner_permissions(resource, members=None):
     return _perm_spec
 
 
+class BulkPermissionsAssigner:
+    """
+    Collects guardian object permissions and writes them in bulk as a diff against the current ones.
+
+    'assign' has the same signature as guardian 'assign_perm'. The object permissions of the
+    'track'ed objects are fully replaced by the assigned ones, while the permissions assigned to
+    any other object are only added.
+
+    Notice that the rows are written without sending the model signals; the 'ResourceVisibility'
+    index of the touched resources is refreshed by 'apply', while the callers are in charge of
+    clearing the users permissions cache.
+    """
+
+    def __init__(self):
+        self._tracked = set()
+        self._targets = {
+            UserObjectPermission: set(),
+            GroupObjectPermission: set()
+        }
+        self._objects = set()
+        self._permissions = {}
+
+    @staticmethod
+    def _get_object_key(obj):
+        return ContentType.objects.get_for_model(obj).id, str(obj.pk)
+
+    def _get_permission_id(self, perm, content_type_id):
+        if isinstance(perm, Permission):
+            return perm.id
+        if '.' in perm:
+            app_label, codename = perm.split('.', 1)
+            return Permission.objects.get(content_type__app_label=app_label, codename=codename).id
+        if content_type_id not in self._permissions:
+            self._permissions[content_type_id] = dict(
+                Permission.objects.filter(content_type_id=content_type_id).values_list('codename', 'id'))
+        try:
+            return self._permissions[content_type_id][perm]
+        except KeyError:
+            raise Permission.DoesNotExist(f"Permission '{perm}' does not exist for content type {content_type_id}")
+
+    def track(self, obj):
+        """
+        Marks the object permissions of 'obj' as managed by this assigner.
+        """
+        if obj is not None:
+            self._tracked.add(self._get_object_key(obj))
+
+    def assign(self, perm, user_or_group, obj):
+        user, group = get_identity(user_or_group)
+        content_type_id, object_pk = self._get_object_key(obj)
+        permission_id = self._get_permission_id(perm, content_type_id)
+        if user:
+            self._targets[UserObjectPermission].add((user.pk, permission_id, content_type_id, object_pk))
+        else:
+            self._targets[GroupObjectPermission].add((group.pk, permission_id, content_type_id, object_pk))
+        self._objects.add((content_type_id, object_pk))
+
+    def update(self, other):
+        """
+        Merges into this assigner the permissions collected by 'other'.
+        """
+        self._tracked |= other._tracked
+        self._objects |= other._objects
+        for model, targets in other._targets.items():
+            self._targets[model] |= targets
+        self._permissions.update(other._permissions)
+
+    @staticmethod
+    def _delete_object_permissions(model, ids, batch_size=1000):
+        """
+        Deletes the object permissions rows by id with plain DELETE statements, so that the guardian
+        models signals are not sent for every row. Returns the number of deleted rows.
+        """
+        deleted = 0
+        table = connection.ops.quote_name(model._meta.db_table)
+        with connection.cursor() as cursor:
+            for index in range(0, len(ids), batch_size):
+                _ids = ids[index:index + batch_size]
+                cursor.execute(f"DELETE FROM {table} WHERE id IN ({', '.join(['%s'] * len(_ids))})", _ids)
+                deleted += cursor.rowcount
+        return deleted
+
+    def apply(self):
+        """
+        Writes the collected permissions with a bulk delete and a bulk create on the guardian tables,
+        then refreshes the 'ResourceVisibility' index of the touched resources.
+        Returns the number of added and removed object permissions.
+        """
+        from geonode.base.models import ResourceBase, ResourceVisibility
+
+        _added = _removed = 0
+        _objects = self._tracked | self._objects
+        if not _objects:
+            return _added, _removed
+        _object_pks = {}
+        for content_type_id, object_pk in _objects:
+            _object_pks.setdefault(content_type_id, set()).add(object_pk)
+        _filter = Q()
+        for content_type_id, object_pks in _object_pks.items():
+            _filter |= Q(content_type_id=content_type_id, object_pk__in=object_pks)
+        try:
+            with transaction.atomic():
+                for model, subject in ((UserObjectPermission, 'user_id'), (GroupObjectPermission, 'group_id')):
+                    _targets = self._targets[model]
+                    _current = {}
+                    for _id, *_key in model.objects.filter(_filter).values_list(
+                            'id', subject, 'permission_id', 'content_type_id', 'object_pk'):
+                        _current[tuple(_key)] = _id
+                    _stale = [
+                        _id for _key, _id in _current.items() if _key not in _targets and (_key[2], _key[3]) in self._tracked
+                    ]
+                    _removed += self._delete_object_permissions(model, _stale)
+                    _missing = [
+                        model(**{subject: _subject_id}, permission_id=_permission_id, content_type_id=_content_type_id, object_pk=_object_pk)
+                        for _subject_id, _permission_id, _content_type_id, _object_pk in _targets if
+                        (_subject_id, _permission_id, _content_type_id, _object_pk) not in _current
+                    ]
+                    model.objects.bulk_create(_missing, ignore_conflicts=True)
+                    _added += len(_missing)
+        finally:
+            # the guardian signals keeping the index aligned are not sent by the bulk operations
+            ResourceVisibility.objects.refresh(
+                _object_pks.get(ContentType.objects.get_for_model(ResourceBase).id, []))
+        return _added, _removed
+
+
 def get_resources_with_perms(user, filter_options={}, shortcut_kwargs={}):
     """
     Returns resources a user has access to.
@@ -262,6 +460,65 @@ def get_resources_with_perms(user, filter_options={}, shortcut_kwargs={}):
     return resources_with_perms
 
 
+def get_visibility_class(user):
+    """
+    Returns the label of the class of users sharing the same visible resources as the given user.
+    """
+    if not user or user.is_anonymous:
+        return 'anonymous'
+    if user.is_superuser:
+        return 'admin'
+    return f'user:{user.pk}'
+
+
+def invalidate_resources_counts():
+    """
+    Invalidates the cached resources counts; to be called whenever resources are created or
+    deleted, or their visibility changes.
+    """
+    if getattr(settings, 'RESOURCES_COUNTS_CACHE_TIMEOUT', 0):
+        cache.set(RESOURCES_COUNTS_GENERATION_KEY, uuid4().hex, None)
+
+
+def get_resources_counts(resources, count_type, values=None, user=None):
+    """
+    Returns the number of resources for each value of the 'count_type' field (e.g. 'keywords', 'regions',
+    'category', 'owner'), with a single GROUP BY query over the given, already permission-filtered, resources.
+
+    :param values: restricts the counts to those values, e.g. the ones of the current page
+    :param user: the user the resources have been filtered for; the counts are cached for
+                 RESOURCES_COUNTS_CACHE_TIMEOUT seconds for all the users of the same visibility class
+    :return: {value: count}
+    """
+    values = sorted(set(values)) if values is not None else None
+    timeout = getattr(settings, 'RESOURCES_COUNTS_CACHE_TIMEOUT', 0)
+    cache_key = None
+    if timeout:
+        try:
+            sql, params = resources.query.sql_with_params()
+            generation = cache.get(RESOURCES_COUNTS_GENERATION_KEY)
+            cache_key = 'resources_counts:' + md5(
+                repr((generation, get_visibility_class(user), count_type, values, sql, params)).encode()).hexdigest()
+        except Exception as e:
+            logger.debug(f"Cannot build the counts cache key: {e}")
+        if cache_key:
+            counts = cache.get(cache_key)
+            if counts is not None:
+                return counts
+
+    qs = resources
+    if values is not None:
+        qs = qs.filter(**{f'{count_type}__in': values})
+    counts = {
+        _value: _count for _value, _count in qs.order_by().values(count_type).annotate(
+            count=Count('pk', distinct=True)).values_list(count_type, 'count')
+        if _value is not None and _count
+    }
+    if cache_key:
+        cache.set(cache_key, counts, timeout)
+    return counts
+
+
 def get_geoapp_subtypes():
     """
     Returns a list of geoapp subtypes.
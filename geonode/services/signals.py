@@ -24,6 +24,8 @@ import logging
 from django.dispatch import receiver
 from django.db.models import signals
 
+from geonode.proxy.utils import proxy_allowed_hosts
+
 from .models import Service
 
 logger = logging.getLogger(__name__)
@@ -40,3 +42,10 @@ def remove_harvesters(instance, **kwargs):
 def post_save_service(instance, sender, created, **kwargs):
     if created:
         instance.set_default_permissions()
+
+
+@receiver(signals.post_save, sender=Service)
+@receiver(signals.post_delete, sender=Service)
+def refresh_proxy_allowed_hosts(instance, **kwargs):
+    """Rebuild the proxy allowed hosts index with the current Services base_urls."""
+    proxy_allowed_hosts.invalidate()
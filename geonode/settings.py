@@ -772,6 +772,7 @@ MIDDLEWARE = (
     'django.middleware.locale.LocaleMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'geonode.security.middleware.UserPermsCacheMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'oauth2_provider.middleware.OAuth2TokenMiddleware',
@@ -863,6 +864,9 @@ OAUTH2_API_KEY = os.environ.get('OAUTH2_API_KEY', None)
 # 1 day expiration time by default
 ACCESS_TOKEN_EXPIRE_SECONDS = int(os.getenv('ACCESS_TOKEN_EXPIRE_SECONDS', '86400'))
 
+# Max seconds an access token is kept in the in-process cache used for outbound OGC requests
+ACCESS_TOKEN_CACHE_TTL = int(os.getenv('ACCESS_TOKEN_CACHE_TTL', '300'))
+
 # Require users to authenticate before using Geonode
 LOCKDOWN_GEONODE = ast.literal_eval(os.getenv('LOCKDOWN_GEONODE', 'False'))
 
@@ -1045,6 +1049,7 @@ OGC_SERVER = {
         'BACKOFF_FACTOR': float(os.getenv('OGC_REQUEST_BACKOFF_FACTOR', '0.3')),
         'POOL_MAXSIZE': int(os.getenv('OGC_REQUEST_POOL_MAXSIZE', '10')),
         'POOL_CONNECTIONS': int(os.getenv('OGC_REQUEST_POOL_CONNECTIONS', '10')),
+        'POOL_BLOCK': ast.literal_eval(os.getenv('OGC_REQUEST_POOL_BLOCK', 'False')),
     }
 }
 
@@ -1269,9 +1274,18 @@ except ValueError:
         if os.getenv('PROXY_ALLOWED_HOSTS') is None \
         else re.split(r' *[,|:|;] *', os.getenv('PROXY_ALLOWED_HOSTS'))
 
+# Max seconds the Remote Services hosts allowed by the proxy are cached in memory
+# before being reloaded; changes made by the current process are applied immediately.
+PROXY_ALLOWED_HOSTS_CACHE_TTL = int(os.getenv('PROXY_ALLOWED_HOSTS_CACHE_TTL', '60'))
+
 # The proxy to use when making cross origin requests.
 PROXY_URL = os.environ.get('PROXY_URL', '/proxy/?url=')
 
+# Stream the upstream responses through the proxy instead of buffering them in memory.
+# Responses handled by a 'response_callback' are always buffered.
+PROXY_STREAMING_ENABLED = ast.literal_eval(os.getenv('PROXY_STREAMING_ENABLED', 'False'))
+PROXY_STREAMING_CHUNK_SIZE = int(os.getenv('PROXY_STREAMING_CHUNK_SIZE', '65536'))
+
 # Haystack Search Backend Configuration. To enable,
 # first install the following:
 # - pip install django-haystack
@@ -1281,6 +1295,8 @@ PROXY_URL = os.environ.get('PROXY_URL', '/proxy/?url=')
 HAYSTACK_SEARCH = ast.literal_eval(os.getenv('HAYSTACK_SEARCH', 'False'))
 # Avoid permissions prefiltering
 SKIP_PERMS_FILTER = ast.literal_eval(os.getenv('SKIP_PERMS_FILTER', 'False'))
+# Seconds the resources counts of keywords, regions, categories and owners are cached (0 disables it)
+RESOURCES_COUNTS_CACHE_TIMEOUT = int(os.getenv('RESOURCES_COUNTS_CACHE_TIMEOUT', 60))
 # Update facet counts from Haystack
 HAYSTACK_FACET_COUNTS = ast.literal_eval(os.getenv('HAYSTACK_FACET_COUNTS', 'True'))
 if HAYSTACK_SEARCH:
@@ -1735,6 +1751,10 @@ CELERY_BEAT_SCHEDULER = os.environ.get(
 CELERY_BEAT_SCHEDULE = {}
 
 DELAYED_SECURITY_SIGNALS = ast.literal_eval(os.environ.get('DELAYED_SECURITY_SIGNALS', 'False'))
+# Number of dirty resources synced with GeoFence by each parallel 'synch_guardian' chunk task
+SECURITY_SYNC_CHUNK_SIZE = int(os.environ.get('SECURITY_SYNC_CHUNK_SIZE', 100))
+# Max seconds a 'synch_guardian' drain is considered running, before a new one can be dispatched
+SECURITY_SYNC_TIMEOUT = int(os.environ.get('SECURITY_SYNC_TIMEOUT', 3600))
 CELERY_ENABLE_UTC = ast.literal_eval(os.environ.get('CELERY_ENABLE_UTC', 'True'))
 CELERY_TIMEZONE = TIME_ZONE
 
@@ -1967,6 +1987,8 @@ THUMBNAIL_BACKGROUND = {
         # 'url': URL for the generic xyz / tms service
         # 'tms': False by default. Set to True if the service is TMS
         # 'tile_size': tile size for the generic xyz service, default is 256
+        # 'max_workers': maximum number of tiles fetched concurrently, default is 8
+        # 'max_connections_per_host': maximum number of concurrent requests towards the tiles host, default is 4
     },
     # example options for a TMS service
     # 'class': 'geonode.thumbs.background.GenericXYZBackground',
@@ -1976,6 +1998,19 @@ THUMBNAIL_BACKGROUND = {
     # },
 }
 
+# Local on-disk cache of the tiles fetched by the thumbnails XYZ backgrounds
+THUMBNAIL_TILE_CACHE = {
+    'ENABLED': ast.literal_eval(os.getenv('THUMBNAIL_TILE_CACHE_ENABLED', 'False')),
+    # folder storing the tiles, created accessible by the GeoNode user only; an existing folder must be
+    # owned by the GeoNode user and not accessible by the others. Defaults to a 'geonode_tiles_cache_<uid>'
+    # folder in the system temp dir
+    'LOCATION': os.getenv('THUMBNAIL_TILE_CACHE_LOCATION', None),
+    # maximum size of the cache in bytes; least recently used tiles are evicted first
+    'MAX_SIZE': int(os.getenv('THUMBNAIL_TILE_CACHE_MAX_SIZE', 256 * 1024 * 1024)),
+    # number of seconds a tile is valid after being downloaded
+    'TTL': int(os.getenv('THUMBNAIL_TILE_CACHE_TTL', 7 * 24 * 3600)),
+}
+
 # define the urls after the settings are overridden
 if USE_GEOSERVER:
     LOCAL_GXP_PTYPE = 'gxp_wmscsource'
@@ -2010,11 +2045,39 @@ MONITORING_SERVICE_NAME = os.getenv("MONITORING_SERVICE_NAME", 'geonode')
 
 # how long monitoring data should be stored
 MONITORING_DATA_TTL = timedelta(days=int(os.getenv("MONITORING_DATA_TTL", 365)))
+# number of future monthly partitions kept ready when the metric values table has been
+# partitioned through the "partition_metric_values" management command
+MONITORING_DATA_PARTITIONS_AHEAD = int(os.getenv("MONITORING_DATA_PARTITIONS_AHEAD", 2))
 
 # this will disable csrf check for notification config views,
 # use with caution - for dev purpose only
 MONITORING_DISABLE_CSRF = ast.literal_eval(os.environ.get('MONITORING_DISABLE_CSRF', 'False'))
 
+# write the requests monitoring events from a background thread, in batches;
+# when the queue is full the new events are dropped
+MONITORING_ASYNC_WRITES = ast.literal_eval(os.getenv('MONITORING_ASYNC_WRITES', 'True'))
+MONITORING_WRITER_QUEUE_SIZE = int(os.getenv('MONITORING_WRITER_QUEUE_SIZE', 10000))
+MONITORING_WRITER_BATCH_SIZE = int(os.getenv('MONITORING_WRITER_BATCH_SIZE', 500))
+MONITORING_WRITER_FLUSH_INTERVAL = float(os.getenv('MONITORING_WRITER_FLUSH_INTERVAL', 1.0))
+# how long to wait for the pending events to be written at shutdown (seconds)
+MONITORING_WRITER_SHUTDOWN_TIMEOUT = int(os.getenv('MONITORING_WRITER_SHUTDOWN_TIMEOUT', 10))
+
+# size of the in-memory caches of the resolved client locations and user agent families (0 disables them)
+MONITORING_GEOIP_CACHE_SIZE = int(os.getenv('MONITORING_GEOIP_CACHE_SIZE', 10000))
+MONITORING_USER_AGENT_CACHE_SIZE = int(os.getenv('MONITORING_USER_AGENT_CACHE_SIZE', 5000))
+# number of the most recent request events used to warm those caches on first use (0 disables it)
+MONITORING_USER_DATA_CACHE_WARMUP = int(os.getenv('MONITORING_USER_DATA_CACHE_WARMUP', 0))
+
+# cache of the monitoring dashboard metrics queries, invalidated when new metric values are written;
+# set MONITORING_DATA_CACHE to an empty string to disable it.
+# It must name a cache shared by all the GeoNode processes, e.g. a memcached or redis one added to CACHES:
+# the 'default' cache above is a DummyCache, with which the metrics queries are not cached at all
+MONITORING_DATA_CACHE = os.getenv('MONITORING_DATA_CACHE', 'default')
+MONITORING_DATA_CACHE_TIMEOUT = int(os.getenv('MONITORING_DATA_CACHE_TIMEOUT', 300))
+
+# download the GeoServer monitor requests with a single CSV export, instead of one call for each request
+MONITORING_GEOSERVER_BULK_EXPORT = ast.literal_eval(os.getenv('MONITORING_GEOSERVER_BULK_EXPORT', 'True'))
+
 if MONITORING_ENABLED:
     if 'geonode.monitoring.middleware.MonitoringMiddleware' not in MIDDLEWARE:
         MIDDLEWARE += \
@@ -35,7 +35,7 @@ from geonode.layers.models import Attribute
 from geonode.geoserver.helpers import set_attributes
 from geonode.tests.base import GeoNodeBaseTestSupport
 from geonode.br.management.commands.utils.utils import ignore_time
-from geonode.utils import copy_tree, fixup_shp_columnnames, unzip_file
+from geonode.utils import copy_tree, fixup_shp_columnnames, unzip_file, HttpSessionPool
 
 
 class TestCopyTree(GeoNodeBaseTestSupport):
@@ -219,3 +219,24 @@ class TestSetAttributes(GeoNodeBaseTestSupport):
         # The name and type should be set as provided by attribute map
         for a in _l.attributes:
             self.assertIn([a.attribute, a.attribute_type], expected_results)
+
+
+class TestHttpSessionPool(GeoNodeBaseTestSupport):
+
+    def test_sessions_are_reused_per_host(self):
+        pool = HttpSessionPool(retries=1)
+        session = pool.get_session('http://localhost:8080/geoserver/ows')
+        self.assertIs(session, pool.get_session('http://LOCALHOST:8080/geoserver/rest'))
+        self.assertIsNot(session, pool.get_session('https://localhost:8080/geoserver/ows'))
+        self.assertIsNot(session, pool.get_session('http://localhost:8080/geoserver/ows', retries=3))
+        stats = pool.stats()
+        self.assertEqual(stats['sessions'], 3)
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 3)
+        pool.clear()
+        self.assertEqual(pool.stats()['sessions'], 0)
+
+    def test_sessions_do_not_store_cookies(self):
+        pool = HttpSessionPool()
+        session = pool.get_session('http://localhost:8080/geoserver/ows')
+        self.assertEqual(session.cookies.get_policy().allowed_domains(), [])
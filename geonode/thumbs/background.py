@@ -25,6 +25,9 @@ import mercantile
 
 from io import BytesIO
 from pyproj import Transformer
+from threading import Lock, BoundedSemaphore
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
 from abc import ABC, abstractmethod
 from math import ceil, floor, copysign
 from PIL import Image, UnidentifiedImageError
@@ -33,11 +36,24 @@ from django.conf import settings
 from django.utils.html import strip_tags
 
 from geonode.thumbs import utils
+from geonode.thumbs.cache import get_tile_cache
 from geonode.utils import http_client
 from geonode.thumbs.exceptions import ThumbnailError
 
 logger = logging.getLogger(__name__)
 
+# Concurrent tile requests allowed towards the same host, shared by all the backgrounds of the process
+_host_semaphores = {}
+_host_semaphores_lock = Lock()
+
+
+def get_host_semaphore(url: str, max_connections: int) -> BoundedSemaphore:
+    host = urlsplit(url).netloc.lower()
+    with _host_semaphores_lock:
+        if host not in _host_semaphores:
+            _host_semaphores[host] = BoundedSemaphore(max_connections)
+        return _host_semaphores[host]
+
 
 class BaseThumbBackground(ABC):
 
@@ -174,6 +190,8 @@ class GenericXYZBackground(BaseThumbBackground):
         Initialization options (valid in settings.THUMBNAIL_BACKGROUND['options']):
         :key url: XYZ url template with '{x}', '{y}' and '{z}' placeholders for x, y coordinates and zoom respectively
         :key tile_size: tile size in pixels (default 256)
+        :key max_workers: maximum number of tiles fetched concurrently (default 8)
+        :key max_connections_per_host: maximum number of concurrent requests towards the tiles host (default 4)
         """
 
         super().__init__(thumbnail_width, thumbnail_height, max_retries, retry_delay)
@@ -188,6 +206,8 @@ class GenericXYZBackground(BaseThumbBackground):
             self.tms = ast.literal_eval(str(options.get('tms')))
         except Exception:
             pass
+        self.max_workers = int(options.get("max_workers", 8))
+        self.max_connections_per_host = int(options.get("max_connections_per_host", 4))
         # ---
 
         # class's internal attributes
@@ -342,34 +362,20 @@ class GenericXYZBackground(BaseThumbBackground):
             (250, 250, 250),
         )
 
+        tiles = []
         for offset_x, x in enumerate(tiles_rows):
             for offset_y, y in enumerate(tiles_cols):
                 if self.tms:
                     y = (2 ** zoom) - y - 1
-                imgurl = self.url.format(x=x, y=y, z=zoom)
-
-                im = None
-                for retries in range(self.max_retries):
-                    try:
-                        resp, content = http_client.request(imgurl)
-                        if resp.status_code > 400:
-                            retries = self.max_retries - 1
-                            raise Exception(f"{strip_tags(content)}")
-                        im = BytesIO(content)
-                        Image.open(im).verify()  # verify that it is, in fact an image
-                        break
-                    except Exception as e:
-                        logger.error(f"Thumbnail background fetching from {imgurl} failed {retries} time(s) with: {e}")
-                        if retries + 1 == self.max_retries:
-                            raise e
-                        time.sleep(self.retry_delay)
-                        continue
-
-                if im:
-                    image = Image.open(im)  # "re-open" the file (required after running verify method)
-
-                    # add the fetched tile to the background image, placing it under proper coordinates
-                    background.paste(image, (offset_x * self.tile_size, offset_y * self.tile_size + fixed_top_offset))
+                tiles.append((offset_x, offset_y, self.url.format(x=x, y=y, z=zoom), (zoom, x, y)))
+
+        tiles_content = self.fetch_tiles([_t[2] for _t in tiles], [_t[3] for _t in tiles])
+        for (offset_x, offset_y, imgurl, _), im in zip(tiles, tiles_content):
+            if im:
+                image = Image.open(im)  # "re-open" the file (required after running verify method)
+
+                # add the fetched tile to the background image, placing it under proper coordinates
+                background.paste(image, (offset_x * self.tile_size, offset_y * self.tile_size + fixed_top_offset))
 
         # get BBOX of the tiles
         top_left_bounds = mercantile.bounds(top_left_tile)
@@ -419,6 +425,65 @@ class GenericXYZBackground(BaseThumbBackground):
             raise ThumbnailError("Thumbnail background outside the allowed area.")
         return background
 
+    def fetch_tile(self, imgurl: str, tile: typing.Optional[typing.Tuple[int, int, int]] = None) -> typing.Optional[BytesIO]:
+        """
+        Fetches a single tile, repeating the request self.max_retries times and waiting self.retry_delay
+        seconds between consecutive requests. Tiles are looked up and stored in the local tiles cache, if enabled.
+
+        :param imgurl: URL of the tile
+        :param tile: (z, x, y) coordinates of the tile, used as the tiles cache key along with self.url
+        :return: the verified tile image content
+        """
+        tile_cache = get_tile_cache() if tile else None
+        if tile_cache:
+            content = tile_cache.get(self.url, *tile)
+            if content:
+                return BytesIO(content)
+
+        im = None
+        for retries in range(self.max_retries):
+            try:
+                with get_host_semaphore(imgurl, self.max_connections_per_host):
+                    resp, content = http_client.request(imgurl)
+                if resp.status_code > 400:
+                    retries = self.max_retries - 1
+                    raise Exception(f"{strip_tags(content)}")
+                im = BytesIO(content)
+                Image.open(im).verify()  # verify that it is, in fact an image
+                if tile_cache:
+                    tile_cache.set(self.url, *tile, content)
+                break
+            except Exception as e:
+                logger.error(f"Thumbnail background fetching from {imgurl} failed {retries} time(s) with: {e}")
+                if retries + 1 == self.max_retries:
+                    raise e
+                time.sleep(self.retry_delay)
+                continue
+        return im
+
+    def fetch_tiles(
+        self, urls: typing.List[str], tiles: typing.Optional[typing.List[typing.Tuple[int, int, int]]] = None
+    ) -> typing.List[typing.Optional[BytesIO]]:
+        """
+        Fetches the tiles concurrently, with at most self.max_workers requests in flight.
+
+        :param urls: URLs of the tiles
+        :param tiles: (z, x, y) coordinates of the tiles, in the same order of the URLs
+        :return: the tiles contents, in the same order of the URLs
+        """
+        tiles = tiles or [None] * len(urls)
+        if len(urls) < 2 or self.max_workers < 2:
+            return [self.fetch_tile(url, tile) for url, tile in zip(urls, tiles)]
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(urls))) as executor:
+            futures = [executor.submit(self.fetch_tile, url, tile) for url, tile in zip(urls, tiles)]
+            try:
+                return [future.result() for future in futures]
+            except Exception:
+                for future in futures:
+                    future.cancel()
+                raise
+
     def calculate_zoom(self):
         # maximum number of needed tiles for thumbnail of given width and height
         max_tiles = (ceil(self.thumbnail_width / self.tile_size) + 1) * (
@@ -0,0 +1,187 @@
+#########################################################################
+#
+# Copyright (C) 2021 OSGeo
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#########################################################################
+
+import os
+import time
+import typing
+import hashlib
+import logging
+import tempfile
+
+from threading import Lock
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class TileCache:
+    """
+    Size-bounded, content-addressed on-disk cache of the thumbnail background tiles.
+
+    Tiles are keyed by (url template, z, x, y). Every file modification time is the
+    tile download time, used for the TTL; the access time is explicitly bumped on
+    every hit and used for the LRU eviction.
+    """
+
+    def __init__(self, location: str, max_size: int = 256 * 1024 * 1024, ttl: int = 7 * 24 * 3600):
+        """
+        :param location: folder storing the tiles
+        :param max_size: maximum size of the cache in bytes
+        :param ttl: number of seconds a tile is considered valid after being downloaded
+        """
+        self.location = location
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = Lock()
+        self._size = None
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.writes = 0
+        self.evictions = 0
+
+    def _path(self, template: str, z: int, x: int, y: int) -> str:
+        key = hashlib.sha1(f"{template}|{z}|{x}|{y}".encode()).hexdigest()
+        return os.path.join(self.location, key[:2], key)
+
+    def _scan(self) -> typing.List[typing.Tuple[float, int, str]]:
+        entries = []
+        for root, _, files in os.walk(self.location):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_atime, stat.st_size, path))
+        return entries
+
+    def get(self, template: str, z: int, x: int, y: int) -> typing.Optional[bytes]:
+        path = self._path(template, z, x, y)
+        try:
+            stat = os.stat(path)
+            if time.time() - stat.st_mtime > self.ttl:
+                with self._lock:
+                    self.expired += 1
+                    self.misses += 1
+                return None
+            with open(path, "rb") as f:
+                content = f.read()
+            os.utime(path, (time.time(), stat.st_mtime))
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return content
+
+    def set(self, template: str, z: int, x: int, y: int, content: bytes):
+        path = self._path(template, z, x, y)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.debug(f"Could not cache the thumbnail background tile {path}: {e}")
+            return
+        with self._lock:
+            self.writes += 1
+            if self._size is None:
+                self._size = sum(_e[1] for _e in self._scan())
+            else:
+                self._size += len(content)
+            if self._size > self.max_size:
+                self._evict()
+
+    def _evict(self):
+        """
+        Deletes the least recently used tiles, until the cache is at 90% of its maximum size.
+        """
+        entries = sorted(self._scan())
+        self._size = sum(_e[1] for _e in entries)
+        target_size = self.max_size * 0.9
+        for _, size, path in entries:
+            if self._size <= target_size:
+                break
+            try:
+                os.remove(path)
+                self._size -= size
+                self.evictions += 1
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "writes": self.writes,
+                "evictions": self.evictions,
+                "size": self._size,
+            }
+
+
+_tile_cache = None
+_tile_cache_lock = Lock()
+
+
+def _is_private_folder(location: str) -> bool:
+    """
+    Creates the tiles cache folder accessible by the current user only. An existing folder is
+    accepted only if owned by the current user and not accessible by the others, since its tiles
+    end up in the thumbnails.
+    """
+    try:
+        os.makedirs(location, mode=0o700, exist_ok=True)
+        st = os.lstat(location)
+    except OSError as e:
+        logger.warning(f"Could not create the thumbnail tiles cache folder {location}: {e}")
+        return False
+    if os.path.islink(location) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        logger.warning(
+            f"The thumbnail tiles cache is disabled: {location} must be a folder owned by the "
+            f"current user and not accessible by the others")
+        return False
+    return True
+
+
+def get_tile_cache() -> typing.Optional[TileCache]:
+    """
+    Returns the process-wide tiles cache configured by settings.THUMBNAIL_TILE_CACHE, or None if disabled.
+    """
+    global _tile_cache
+    options = getattr(settings, "THUMBNAIL_TILE_CACHE", {})
+    if not options.get("ENABLED", False):
+        return None
+    location = options.get("LOCATION") or os.path.join(tempfile.gettempdir(), f"geonode_tiles_cache_{os.getuid()}")
+    with _tile_cache_lock:
+        if _tile_cache is None or _tile_cache.location != location:
+            if not _is_private_folder(location):
+                return None
+            _tile_cache = TileCache(
+                location,
+                max_size=int(options.get("MAX_SIZE", 256 * 1024 * 1024)),
+                ttl=int(options.get("TTL", 7 * 24 * 3600)),
+            )
+        return _tile_cache
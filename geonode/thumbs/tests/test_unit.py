@@ -17,14 +17,21 @@
 #
 #########################################################################
 
+import os
 import re
+import time
 import uuid
+import shutil
+import tempfile
 
 from unittest.mock import patch, PropertyMock
 from django.conf import settings
+from django.test import override_settings
 
 from geonode.thumbs import utils
 from geonode.thumbs import thumbnails
+from geonode.thumbs.cache import TileCache, get_tile_cache
+from geonode.thumbs.background import GenericXYZBackground
 from geonode.layers.models import Dataset
 from geonode.utils import DisableDjangoSignals
 from geonode.maps.models import Map, MapLayer
@@ -76,6 +83,105 @@ class ThumbnailsUtilsUnitTest(GeoNodeBaseSimpleTestSupport):
         self.assertEqual(center, new_center, "Expected center to be preserved after transformation")
 
 
+class ThumbnailsTileBackgroundUnitTest(GeoNodeBaseSimpleTestSupport):
+
+    @override_settings(
+        THUMBNAIL_BACKGROUND={
+            "options": {
+                "url": "http://some_fancy_url/{z}/{x}/{y}.png",
+                "max_workers": 4,
+            }
+        }
+    )
+    def test_fetch_tiles_concurrently(self):
+        urls = [f"http://some_fancy_url/1/{x}/0.png" for x in range(8)]
+
+        def _fetch_tile(url, tile=None):
+            time.sleep(0.2)
+            return url
+
+        background = GenericXYZBackground(thumbnail_width=240, thumbnail_height=200)
+        with patch.object(background, "fetch_tile", side_effect=_fetch_tile) as fetch_tile_mock:
+            start = time.time()
+            tiles = background.fetch_tiles(urls)
+            elapsed = time.time() - start
+
+        self.assertEqual(tiles, urls, "Expected tiles to be returned in the requested order")
+        self.assertEqual(fetch_tile_mock.call_count, len(urls))
+        self.assertLess(elapsed, 0.2 * len(urls) / 2, "Expected tiles to be fetched concurrently")
+
+    @override_settings(
+        THUMBNAIL_BACKGROUND={
+            "options": {
+                "url": "http://some_fancy_url/{z}/{x}/{y}.png",
+            }
+        }
+    )
+    def test_fetch_tiles_failure(self):
+        background = GenericXYZBackground(thumbnail_width=240, thumbnail_height=200)
+        with patch.object(background, "fetch_tile", side_effect=ValueError("Broken tile")):
+            with self.assertRaises(ValueError):
+                background.fetch_tiles(["http://some_fancy_url/1/0/0.png", "http://some_fancy_url/1/1/0.png"])
+
+
+class ThumbnailsTileCacheUnitTest(GeoNodeBaseSimpleTestSupport):
+
+    def setUp(self):
+        super().setUp()
+        self.location = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.location, ignore_errors=True)
+        super().tearDown()
+
+    def test_tile_cache_hit_and_miss(self):
+        cache = TileCache(self.location)
+        template = "http://some_fancy_url/{z}/{x}/{y}.png"
+        self.assertIsNone(cache.get(template, 1, 0, 0))
+        cache.set(template, 1, 0, 0, b"tile")
+        self.assertEqual(cache.get(template, 1, 0, 0), b"tile")
+        self.assertIsNone(cache.get("http://other_url/{z}/{x}/{y}.png", 1, 0, 0))
+        stats = cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 2)
+        self.assertEqual(stats["writes"], 1)
+
+    def test_tile_cache_ttl(self):
+        cache = TileCache(self.location, ttl=-1)
+        cache.set("template", 1, 0, 0, b"tile")
+        self.assertIsNone(cache.get("template", 1, 0, 0))
+        self.assertEqual(cache.stats()["expired"], 1)
+
+    def test_tile_cache_lru_eviction(self):
+        cache = TileCache(self.location, max_size=1000)
+        cache.set("template", 1, 0, 0, b"a" * 400)
+        time.sleep(0.01)
+        cache.set("template", 1, 1, 0, b"b" * 400)
+        time.sleep(0.01)
+        # the first tile is now the most recently used one
+        cache.get("template", 1, 0, 0)
+        time.sleep(0.01)
+        cache.set("template", 1, 2, 0, b"c" * 400)
+
+        self.assertIsNotNone(cache.get("template", 1, 0, 0))
+        self.assertIsNone(cache.get("template", 1, 1, 0))
+        self.assertIsNotNone(cache.get("template", 1, 2, 0))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_tile_cache_location_must_be_private(self):
+        with self.settings(THUMBNAIL_TILE_CACHE={"ENABLED": True, "LOCATION": os.path.join(self.location, "tiles")}):
+            tile_cache = get_tile_cache()
+            self.assertIsNotNone(tile_cache)
+            self.assertEqual(os.stat(tile_cache.location).st_mode & 0o777, 0o700)
+        shared_location = os.path.join(self.location, "shared")
+        os.makedirs(shared_location)
+        os.chmod(shared_location, 0o777)
+        with self.settings(THUMBNAIL_TILE_CACHE={"ENABLED": True, "LOCATION": shared_location}):
+            self.assertIsNone(get_tile_cache())
+        with self.settings(THUMBNAIL_TILE_CACHE={"ENABLED": False}):
+            self.assertIsNone(get_tile_cache())
+
+
 class ThumbnailsUnitTest(GeoNodeBaseTestSupport):
 
     fixtures = GeoNodeBaseTestSupport.fixtures.copy() + [
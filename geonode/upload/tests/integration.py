@@ -728,7 +728,7 @@ class TestUploadDBDataStore(UploaderBase):
         )
         _dataset = Dataset.objects.get(name=dataset_name)
         _user = get_user_model().objects.get(username='AnonymousUser')
-        self.assertEqual(_dataset.get_user_perms(_user).count(), 0)
+        self.assertEqual(len(_dataset.get_user_perms(_user)), 0)
 
         # initial state is no positions or info
         self.assertTrue(get_wms_timepositions() is None)
@@ -39,12 +39,13 @@ from osgeo import ogr
 from PIL import Image
 from io import BytesIO, StringIO
 from decimal import Decimal
-from threading import local
+from threading import local, Lock
 from slugify import slugify
 from contextlib import closing
+from http.cookiejar import DefaultCookiePolicy
 from collections import namedtuple, defaultdict
 from math import atan, exp, log, pi, sin, tan, floor
-from zipfile import ZipFile, is_zipfile, ZIP_DEFLATED
+from zipfile import ZipFile, ZipInfo, is_zipfile, ZIP_DEFLATED, ZIP_STORED
 from requests.packages.urllib3.util.retry import Retry
 
 from django.conf import settings
@@ -55,7 +56,6 @@ from django.apps import apps as django_apps
 from django.middleware.csrf import get_token
 from django.http import HttpResponse
 from django.forms.models import model_to_dict
-from django.contrib.auth import get_user_model
 from django.shortcuts import get_object_or_404
 from django.core.exceptions import PermissionDenied
 from django.core.exceptions import ImproperlyConfigured
@@ -71,6 +71,7 @@ from geonode.storage.manager import storage_manager
 from geonode.base.auth import (
     extend_token,
     get_or_create_token,
+    get_or_create_cached_token,
     get_token_from_auth_header,
     get_token_object_from_session)
 
@@ -1518,6 +1519,103 @@ def check_ogc_backend(backend_package):
     return False
 
 
+class HttpSessionPool:
+    """
+    Process-wide pool of long-lived 'requests.Session' objects.
+
+    Sessions are keyed by (scheme, host, retries) so that every call towards the
+    same backend reuses the same urllib3 connection pool and keep-alive sockets,
+    instead of paying a new TCP/TLS handshake on each request.
+    Sessions never store cookies, since they are shared among all users.
+    """
+
+    def __init__(self, retries=1, backoff_factor=0.3, status_forcelist=(500, 502, 503, 504),
+                 pool_maxsize=10, pool_connections=10, pool_block=False):
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.status_forcelist = status_forcelist
+        self.pool_maxsize = pool_maxsize
+        self.pool_connections = pool_connections
+        self.pool_block = pool_block
+        self._sessions = {}
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _new_session(self, scheme, retries):
+        session = requests.Session()
+        session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        retry = Retry(
+            total=retries,
+            read=retries,
+            connect=retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=self.status_forcelist,
+        )
+        adapter = requests.adapters.HTTPAdapter(
+            max_retries=retry,
+            pool_maxsize=self.pool_maxsize,
+            pool_connections=self.pool_connections,
+            pool_block=self.pool_block
+        )
+        session.mount(f"{scheme}://", adapter)
+        session.verify = False
+        return session
+
+    def get_session(self, url, retries=None):
+        _url = urlsplit(url)
+        scheme = _url.scheme or 'http'
+        retries = retries or self.retries
+        key = (scheme, _url.netloc.lower(), retries)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is not None:
+                self.hits += 1
+                return session
+            self.misses += 1
+            session = self._new_session(scheme, retries)
+            self._sessions[key] = session
+            return session
+
+    def stats(self):
+        """
+        Returns pool counters; 'reused' is the number of requests which have been
+        served through an already open connection.
+        """
+        connections = 0
+        requests_count = 0
+        with self._lock:
+            for session in self._sessions.values():
+                for adapter in session.adapters.values():
+                    pools = getattr(adapter, 'poolmanager', None)
+                    if pools is None:
+                        continue
+                    for key in list(pools.pools.keys()):
+                        pool = pools.pools.get(key)
+                        if pool is not None:
+                            connections += pool.num_connections
+                            requests_count += pool.num_requests
+            return {
+                'sessions': len(self._sessions),
+                'hits': self.hits,
+                'misses': self.misses,
+                'connections': connections,
+                'requests': requests_count,
+                'reused': max(requests_count - connections, 0)
+            }
+
+    def clear(self):
+        with self._lock:
+            for session in self._sessions.values():
+                try:
+                    session.close()
+                except Exception as e:
+                    logger.debug(e)
+            self._sessions.clear()
+            self.hits = 0
+            self.misses = 0
+
+
 class HttpClient:
 
     def __init__(self):
@@ -1526,6 +1624,7 @@ class HttpClient:
         self.pool_maxsize = 10
         self.backoff_factor = 0.3
         self.pool_connections = 10
+        self.pool_block = False
         self.status_forcelist = (500, 502, 503, 504)
         self.username = 'admin'
         self.password = 'admin'
@@ -1536,21 +1635,30 @@ class HttpClient:
             self.backoff_factor = ogc_server_settings.get('BACKOFF_FACTOR', 0.3)
             self.pool_maxsize = ogc_server_settings.get('POOL_MAXSIZE', 10)
             self.pool_connections = ogc_server_settings.get('POOL_CONNECTIONS', 10)
+            self.pool_block = ogc_server_settings.get('POOL_BLOCK', False)
             self.username = ogc_server_settings.get('USER', 'admin')
             self.password = ogc_server_settings.get('PASSWORD', 'geoserver')
+        self.session_pool = HttpSessionPool(
+            retries=self.retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=self.status_forcelist,
+            pool_maxsize=self.pool_maxsize,
+            pool_connections=self.pool_connections,
+            pool_block=self.pool_block)
+
+    def get_session(self, url, retries=None):
+        return self.session_pool.get_session(url, retries=retries)
 
     def request(self, url, method='GET', data=None, headers={}, stream=False,
                 timeout=None, retries=None, user=None, verify=False):
+        headers = dict(headers or {})
         if (user or self.username != 'admin') and \
                 check_ogc_backend(geoserver.BACKEND_PACKAGE) and 'Authorization' not in headers:
-            if connection.cursor().db.vendor not in ('sqlite', 'sqlite3', 'spatialite'):
+            if connection.vendor not in ('sqlite', 'sqlite3', 'spatialite'):
                 try:
-                    if user and isinstance(user, str):
-                        user = get_user_model().objects.get(username=user)
-                    _u = user or get_user_model().objects.get(username=self.username)
-                    access_token = get_or_create_token(_u)
-                    if access_token and not access_token.is_expired():
-                        headers['Authorization'] = f'Bearer {access_token.token}'
+                    access_token = get_or_create_cached_token(user or self.username)
+                    if access_token:
+                        headers['Authorization'] = f'Bearer {access_token}'
                 except Exception:
                     tb = traceback.format_exc()
                     logger.debug(tb)
@@ -1562,22 +1670,7 @@ class HttpClient:
         headers['User-Agent'] = 'GeoNode'
         response = None
         content = None
-        session = requests.Session()
-        retry = Retry(
-            total=retries or self.retries,
-            read=retries or self.retries,
-            connect=retries or self.retries,
-            backoff_factor=self.backoff_factor,
-            status_forcelist=self.status_forcelist,
-        )
-        adapter = requests.adapters.HTTPAdapter(
-            max_retries=retry,
-            pool_maxsize=self.pool_maxsize,
-            pool_connections=self.pool_connections
-        )
-        scheme = urlsplit(url).scheme
-        session.mount(f"{scheme}://", adapter)
-        session.verify = False
+        session = self.get_session(url, retries=retries)
         action = getattr(session, method.lower(), None)
         if action:
             _req_tout = timeout or self.timeout
@@ -1648,6 +1741,69 @@ def zip_dir(basedir, archivename):
                 z.write(absfn, zfn)
 
 
+# Formats already compressed, which are stored as they are in the ZIP archives
+ZIP_STORED_EXTENSIONS = (
+    '.zip', '.gz', '.tgz', '.bz2', '.xz', '.7z', '.rar', '.kmz',
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.jp2', '.ecw', '.sid',
+    '.mp3', '.mp4', '.avi', '.mov', '.docx', '.xlsx', '.pptx', '.odt', '.ods'
+)
+
+
+class _ZipStreamBuffer:
+    """
+    Write-only, non seekable file object collecting the ZIP bytes until they are
+    consumed by 'zip_stream'. ZipFile falls back to data descriptors on it.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def zip_stream(files, open_file=None, chunk_size=65536):
+    """
+    Generates a ZIP archive on the fly, without any temporary file.
+
+    :param files: iterable of (archive name, file path) tuples
+    :param open_file: callable opening a file path in binary mode, defaults to 'storage_manager.open'
+    :param chunk_size: size of the chunks read from the files
+    :return: a generator of the ZIP archive bytes
+    """
+    open_file = open_file or storage_manager.open
+    buffer = _ZipStreamBuffer()
+    with ZipFile(buffer, "w", ZIP_DEFLATED, allowZip64=True) as z:
+        for arcname, file_path in files:
+            zinfo = ZipInfo(arcname, date_time=time.localtime()[0:6])
+            zinfo.external_attr = 0o644 << 16
+            zinfo.compress_type = ZIP_STORED if os.path.splitext(arcname)[1].lower() in ZIP_STORED_EXTENSIONS else ZIP_DEFLATED
+            with closing(open_file(file_path)) as src, z.open(zinfo, mode='w', force_zip64=True) as dest:
+                while True:
+                    data = src.read(chunk_size)
+                    if not data:
+                        break
+                    dest.write(data)
+                    _chunk = buffer.pop()
+                    if _chunk:
+                        yield _chunk
+            _chunk = buffer.pop()
+            if _chunk:
+                yield _chunk
+    _chunk = buffer.pop()
+    if _chunk:
+        yield _chunk
+
+
 def copy_tree(src, dst, symlinks=False, ignore=None):
     try:
         for item in os.listdir(src):
@@ -1758,17 +1914,15 @@ def get_legend_url(
 
 def set_resource_default_links(instance, layer, prune=False, **kwargs):
 
-    from geonode.base.models import Link
     from django.urls import reverse
     from django.utils.translation import ugettext
 
-    # Prune old links
-    if prune:
-        logger.debug(" -- Resource Links[Prune old links]...")
-        _def_link_types = (
-            'data', 'image', 'original', 'html', 'OGC:WMS', 'OGC:WFS', 'OGC:WCS')
-        Link.objects.filter(resource=instance.resourcebase_ptr, link_type__in=_def_link_types).delete()
-        logger.debug(" -- Resource Links[Prune old links]...done!")
+    # The default links are collected first, and synchronized with the existing ones at once;
+    # when pruning, the old links not among the new ones are deleted
+    _def_link_types = (
+        'data', 'image', 'original', 'html', 'OGC:WMS', 'OGC:WFS', 'OGC:WCS')
+    links = []
+    _remote_legend = False
 
     if check_ogc_backend(geoserver.BACKEND_PACKAGE):
         from geonode.geoserver.ows import wcs_links, wfs_links, wms_links
@@ -1860,120 +2014,77 @@ def set_resource_default_links(instance, layer, prune=False, **kwargs):
             logger.debug(" -- Resource Links[Create Raw Data download link]...")
             download_url = urljoin(settings.SITEURL,
                                    reverse('download', args=[instance.id]))
-            while Link.objects.filter(
-                    resource=instance.resourcebase_ptr,
-                    url=download_url).count() > 1:
-                Link.objects.filter(
-                    resource=instance.resourcebase_ptr,
-                    url=download_url).first().delete()
-            Link.objects.update_or_create(
-                resource=instance.resourcebase_ptr,
-                url=download_url,
-                defaults=dict(
+            links.append((
+                dict(url=download_url),
+                dict(
                     extension='zip',
                     name='Original Dataset',
                     mime='application/octet-stream',
                     link_type='original',
-                )
-            )
+                ),
+                True
+            ))
             logger.debug(" -- Resource Links[Create Raw Data download link]...done!")
         else:
-            Link.objects.filter(resource=instance.resourcebase_ptr,
-                                name='Original Dataset').delete()
+            links.append((dict(name='Original Dataset'), None, True))
 
         # Set download links for WMS, WCS or WFS and KML
         logger.debug(" -- Resource Links[Set download links for WMS, WCS or WFS and KML]...")
         instance_ows_url = f"{instance.ows_url}?" if instance.ows_url else f"{ogc_server_settings.public_url}ows?"
-        links = wms_links(instance_ows_url,
-                          instance.alternate,
-                          bbox,
-                          srid,
-                          height,
-                          width)
-
-        for ext, name, mime, wms_url in links:
-            try:
-                Link.objects.update_or_create(
-                    resource=instance.resourcebase_ptr,
-                    name=ugettext(name),
-                    defaults=dict(
-                        extension=ext,
-                        url=wms_url,
-                        mime=mime,
-                        link_type='image',
-                    )
-                )
-            except Link.MultipleObjectsReturned:
-                _d = dict(extension=ext,
-                          url=wms_url,
-                          mime=mime,
-                          link_type='image')
-                Link.objects.filter(resource=instance.resourcebase_ptr,
-                                    name=ugettext(name),
-                                    link_type='image').update(**_d)
+        _links = wms_links(instance_ows_url,
+                           instance.alternate,
+                           bbox,
+                           srid,
+                           height,
+                           width)
+
+        for ext, name, mime, wms_url in _links:
+            links.append((
+                dict(name=ugettext(name)),
+                dict(
+                    extension=ext,
+                    url=wms_url,
+                    mime=mime,
+                    link_type='image',
+                ),
+                True
+            ))
 
         if instance.subtype == "vector":
-            links = wfs_links(instance_ows_url,
-                              instance.alternate,
-                              bbox=None,  # bbox filter should be set at runtime otherwise conflicting with CQL
-                              srid=srid)
-            for ext, name, mime, wfs_url in links:
+            _links = wfs_links(instance_ows_url,
+                               instance.alternate,
+                               bbox=None,  # bbox filter should be set at runtime otherwise conflicting with CQL
+                               srid=srid)
+            for ext, name, mime, wfs_url in _links:
                 if mime == 'SHAPE-ZIP':
                     name = 'Zipped Shapefile'
-                if (Link.objects.filter(resource=instance.resourcebase_ptr,
-                                        url=wfs_url,
-                                        name=name,
-                                        link_type='data').count() < 2):
-                    Link.objects.update_or_create(
-                        resource=instance.resourcebase_ptr,
-                        url=wfs_url,
-                        name=name,
-                        link_type='data',
-                        defaults=dict(
-                            extension=ext,
-                            mime=mime,
-                        )
-                    )
+                links.append((
+                    dict(url=wfs_url, name=name, link_type='data'),
+                    dict(extension=ext, mime=mime),
+                    True
+                ))
 
         elif instance.subtype == 'raster':
-            links = wcs_links(instance_ows_url,
-                              instance.alternate,
-                              bbox,
-                              srid)
-
-        for ext, name, mime, wcs_url in links:
-            if (Link.objects.filter(resource=instance.resourcebase_ptr,
-                                    url=wcs_url,
-                                    name=name,
-                                    link_type='data').count() < 2):
-                Link.objects.update_or_create(
-                    resource=instance.resourcebase_ptr,
-                    url=wcs_url,
-                    name=name,
-                    link_type='data',
-                    defaults=dict(
-                        extension=ext,
-                        mime=mime,
-                    )
-                )
+            _links = wcs_links(instance_ows_url,
+                               instance.alternate,
+                               bbox,
+                               srid)
+
+        for ext, name, mime, wcs_url in _links:
+            links.append((
+                dict(url=wcs_url, name=name, link_type='data'),
+                dict(extension=ext, mime=mime),
+                True
+            ))
 
         site_url = settings.SITEURL.rstrip('/') if settings.SITEURL.startswith('http') else settings.SITEURL
         html_link_url = f'{site_url}{instance.get_absolute_url()}'
 
-        if (Link.objects.filter(resource=instance.resourcebase_ptr,
-                                url=html_link_url,
-                                name=instance.alternate,
-                                link_type='html').count() < 2):
-            Link.objects.update_or_create(
-                resource=instance.resourcebase_ptr,
-                url=html_link_url,
-                name=instance.alternate or instance.name,
-                link_type='html',
-                defaults=dict(
-                    extension='html',
-                    mime='text/html',
-                )
-            )
+        links.append((
+            dict(url=html_link_url, name=instance.alternate or instance.name, link_type='html'),
+            dict(extension='html', mime='text/html'),
+            True
+        ))
         logger.debug(" -- Resource Links[Set download links for WMS, WCS or WFS and KML]...done!")
 
         # Legend link
@@ -1985,24 +2096,14 @@ def set_resource_default_links(instance, layer, prune=False, **kwargs):
                         style_name = os.path.basename(
                             urlparse(style.sld_url).path).split('.')[0]
                         legend_url = get_legend_url(instance, style_name)
-                        if Link.objects.filter(resource=instance.resourcebase_ptr, url=legend_url).count() < 2:
-                            Link.objects.update_or_create(
-                                resource=instance.resourcebase_ptr,
-                                name='Legend',
-                                url=legend_url,
-                                defaults=dict(
-                                    extension='png',
-                                    url=legend_url,
-                                    mime='image/png',
-                                    link_type='image',
-                                )
-                            )
+                        links.append((
+                            dict(name='Legend', url=legend_url),
+                            dict(extension='png', mime='image/png', link_type='image'),
+                            True
+                        ))
             else:
-                from geonode.services.serviceprocessors.handler import get_service_handler
-                handler = get_service_handler(
-                    instance.remote_service.service_url, service_type=instance.remote_service.type)
-                if handler and hasattr(handler, '_create_dataset_legend_link'):
-                    handler._create_dataset_legend_link(instance)
+                # The remote services legends are set by their handlers
+                _remote_legend = True
 
             logger.debug(" -- Resource Links[Legend link]...done!")
         except Exception as e:
@@ -2010,19 +2111,11 @@ def set_resource_default_links(instance, layer, prune=False, **kwargs):
 
         # Thumbnail link
         logger.debug(" -- Resource Links[Thumbnail link]...")
-        if (Link.objects.filter(resource=instance.resourcebase_ptr,
-                                url=instance.get_thumbnail_url(),
-                                name='Thumbnail').count() < 2):
-            Link.objects.update_or_create(
-                resource=instance.resourcebase_ptr,
-                url=instance.get_thumbnail_url(),
-                name='Thumbnail',
-                defaults=dict(
-                    extension='png',
-                    mime='image/png',
-                    link_type='image',
-                )
-            )
+        links.append((
+            dict(url=instance.get_thumbnail_url(), name='Thumbnail'),
+            dict(extension='png', mime='image/png', link_type='image'),
+            True
+        ))
         logger.debug(" -- Resource Links[Thumbnail link]...done!")
 
         logger.debug(" -- Resource Links[OWS Links]...")
@@ -2030,72 +2123,121 @@ def set_resource_default_links(instance, layer, prune=False, **kwargs):
             if not hasattr(instance.get_real_instance(), 'ptype') or instance.get_real_instance().ptype == GXP_PTYPES["WMS"]:
                 ogc_wms_url = instance.ows_url or urljoin(ogc_server_settings.public_url, 'ows')
                 ogc_wms_name = f'OGC WMS: {instance.workspace} Service'
-                if Link.objects.filter(resource=instance.resourcebase_ptr, name=ogc_wms_name, url=ogc_wms_url).count() < 2:
-                    Link.objects.get_or_create(
-                        resource=instance.resourcebase_ptr,
-                        url=ogc_wms_url,
-                        name=ogc_wms_name,
-                        defaults=dict(
-                            extension='html',
-                            url=ogc_wms_url,
-                            mime='text/html',
-                            link_type='OGC:WMS',
-                        )
-                    )
+                links.append((
+                    dict(url=ogc_wms_url, name=ogc_wms_name),
+                    dict(extension='html', mime='text/html', link_type='OGC:WMS'),
+                    False
+                ))
 
                 if instance.subtype == "vector":
                     ogc_wfs_url = instance.ows_url or urljoin(ogc_server_settings.public_url, 'ows')
                     ogc_wfs_name = f'OGC WFS: {instance.workspace} Service'
-                    if Link.objects.filter(resource=instance.resourcebase_ptr, name=ogc_wfs_name, url=ogc_wfs_url).count() < 2:
-                        Link.objects.get_or_create(
-                            resource=instance.resourcebase_ptr,
-                            url=ogc_wfs_url,
-                            name=ogc_wfs_name,
-                            defaults=dict(
-                                extension='html',
-                                url=ogc_wfs_url,
-                                mime='text/html',
-                                link_type='OGC:WFS',
-                            )
-                        )
+                    links.append((
+                        dict(url=ogc_wfs_url, name=ogc_wfs_name),
+                        dict(extension='html', mime='text/html', link_type='OGC:WFS'),
+                        False
+                    ))
 
                 if instance.subtype == "raster":
                     ogc_wcs_url = instance.ows_url or urljoin(ogc_server_settings.public_url, 'ows')
                     ogc_wcs_name = f'OGC WCS: {instance.workspace} Service'
-                    if Link.objects.filter(resource=instance.resourcebase_ptr, name=ogc_wcs_name, url=ogc_wcs_url).count() < 2:
-                        Link.objects.get_or_create(
-                            resource=instance.resourcebase_ptr,
-                            url=ogc_wcs_url,
-                            name=ogc_wcs_name,
-                            defaults=dict(
-                                extension='html',
-                                url=ogc_wcs_url,
-                                mime='text/html',
-                                link_type='OGC:WCS',
-                            )
-                        )
+                    links.append((
+                        dict(url=ogc_wcs_url, name=ogc_wcs_name),
+                        dict(extension='html', mime='text/html', link_type='OGC:WCS'),
+                        False
+                    ))
 
             elif hasattr(instance.get_real_instance(), 'ptype') and instance.get_real_instance().ptype:
                 ptype_link = dict((v, k) for k, v in GXP_PTYPES.items()).get(instance.get_real_instance().ptype)
                 ptype_link_name = dict(SERVICE_TYPES).get(ptype_link)
                 ptype_link_url = instance.ows_url
-                if Link.objects.filter(resource=instance.resourcebase_ptr, name=ptype_link_name, url=ptype_link_url).count() < 2:
-                    Link.objects.get_or_create(
-                        resource=instance.resourcebase_ptr,
-                        url=ptype_link_url,
-                        name=ptype_link_name,
-                        defaults=dict(
-                            extension='html',
-                            url=ptype_link_url,
-                            mime='text/html',
-                            link_type='image',
-                        )
-                    )
+                links.append((
+                    dict(url=ptype_link_url, name=ptype_link_name),
+                    dict(extension='html', mime='text/html', link_type='image'),
+                    False
+                ))
             logger.debug(" -- Resource Links[OWS Links]...done!")
         except Exception as e:
             logger.error(" -- Resource Links[OWS Links]...error!")
             logger.exception(e)
 
+    logger.debug(" -- Resource Links[Sync links]...")
+    sync_resource_links(instance.resourcebase_ptr, links, prune_types=_def_link_types if prune else None)
+    logger.debug(" -- Resource Links[Sync links]...done!")
+
+    if _remote_legend:
+        try:
+            from geonode.services.serviceprocessors.handler import get_service_handler
+            handler = get_service_handler(
+                instance.remote_service.service_url, service_type=instance.remote_service.type)
+            if handler and hasattr(handler, '_create_dataset_legend_link'):
+                handler._create_dataset_legend_link(instance)
+        except Exception as e:
+            logger.debug(f" -- Resource Links[Legend link]...error: {e}")
+
+
+def sync_resource_links(resource, links, prune_types=None):
+    """
+    Synchronizes the links of a resource with the given ones, by fetching the existing links with
+    a single query and applying the differences with one bulk create, one bulk update and one delete.
+
+    :param links: list of (lookup, defaults, update) tuples; as for 'update_or_create' ('update' True)
+        or 'get_or_create' ('update' False), the first existing link matching all the 'lookup' fields
+        is kept, and updated with the 'defaults' if needed, while the duplicated ones are deleted.
+        When 'defaults' is None, all the links matching the 'lookup' fields are deleted.
+    :param prune_types: the existing links of these types not matching any of the given links are deleted.
+    :return (tuple): the number of created, updated and deleted links.
+    """
+    from geonode.base.models import Link
+
+    def _values(fields):
+        return {_k: str(_v) if _v is not None else _v for _k, _v in fields.items()}
+
+    existing = list(Link.objects.filter(resource=resource).order_by('id'))
+    _kept = set()
+    _deleted = set()
+    _to_create = {}
+    _to_update = {}
+    _updated_fields = set()
+    for lookup, defaults, update in links:
+        lookup = _values(lookup)
+        _matches = [
+            _l for _l in existing
+            if _l.id not in _deleted and all(getattr(_l, _k) == _v for _k, _v in lookup.items())]
+        if defaults is None:
+            _deleted.update(_l.id for _l in _matches if _l.id not in _kept)
+            continue
+        defaults = _values(defaults)
+        _key = tuple(sorted(lookup.items()))
+        if not _matches:
+            if _key not in _to_create:
+                _to_create[_key] = Link(resource=resource, **lookup, **defaults)
+            elif update:
+                for _k, _v in defaults.items():
+                    setattr(_to_create[_key], _k, _v)
+            continue
+        _link = next((_l for _l in _matches if _l.id in _kept), _matches[0])
+        _kept.add(_link.id)
+        _deleted.update(_l.id for _l in _matches if _l.id not in _kept)
+        if update:
+            for _k, _v in defaults.items():
+                if getattr(_link, _k) != _v:
+                    setattr(_link, _k, _v)
+                    _updated_fields.add(_k)
+                    _to_update[_link.id] = _link
+
+    if prune_types:
+        _deleted.update(_l.id for _l in existing if _l.id not in _kept and _l.link_type in prune_types)
+    _to_update = [_l for _l in _to_update.values() if _l.id not in _deleted]
+
+    if _deleted:
+        Link.objects.filter(id__in=_deleted).delete()
+    if _to_update:
+        Link.objects.bulk_update(_to_update, sorted(_updated_fields))
+    if _to_create:
+        Link.objects.bulk_create(list(_to_create.values()))
+    return len(_to_create), len(_to_update), len(_deleted)
+
 
 def add_url_params(url, params):
     """ Add GET params to provided URL being aware of existing.